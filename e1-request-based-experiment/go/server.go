@@ -42,27 +42,40 @@ func initTracer() *trace.TracerProvider {
 	log.Println(collectorEndpoint)
 	log.Println(serviceName)
 
-	exporter, err := otlptrace.New(
-		ctx,
-		otlptracehttp.NewClient(
-			otlptracehttp.WithEndpoint(collectorEndpoint),
-			otlptracehttp.WithInsecure(),
-		),
-	)
-	if err != nil {
-		fmt.Fprintf(os.Stderr, "failed to create exporter: %v", err)
-		os.Exit(1)
-	}
-
-	tp := trace.NewTracerProvider(
-		trace.WithBatcher(exporter),
+	options := []trace.TracerProviderOption{
 		trace.WithResource(
 			resource.NewWithAttributes(
 				semconv.SchemaURL,
 				semconv.ServiceNameKey.String(serviceName),
 			),
 		),
-	)
+	}
+
+	// With OTEL_TRACES_EXPORTER=none spans are still recorded, but no exporter is registered
+	if os.Getenv("OTEL_TRACES_EXPORTER") != "none" {
+		exporter, err := otlptrace.New(
+			ctx,
+			otlptracehttp.NewClient(
+				otlptracehttp.WithEndpoint(collectorEndpoint),
+				otlptracehttp.WithInsecure(),
+			),
+		)
+		if err != nil {
+			fmt.Fprintf(os.Stderr, "failed to create exporter: %v", err)
+			os.Exit(1)
+		}
+		// OTEL_SPAN_PROCESSOR=simple exports every span synchronously when it ends,
+		// the batch processor is configured through the OTEL_BSP_* variables
+		if os.Getenv("OTEL_SPAN_PROCESSOR") == "simple" {
+			options = append(options, trace.WithSyncer(exporter))
+		} else {
+			options = append(options, trace.WithBatcher(exporter))
+		}
+	} else {
+		log.Println("OpenTelemetry trace export disabled")
+	}
+
+	tp := trace.NewTracerProvider(options...)
 	otel.SetTracerProvider(tp)
 
 	return tp
@@ -71,7 +84,10 @@ func initTracer() *trace.TracerProvider {
 func main() {
 	opentelemetryEnabled := os.Getenv("OPENTELEMETRY_ENABLED") == "true"
 	log.Println("OpenTelemetry enabled:", opentelemetryEnabled)
-	if opentelemetryEnabled {
+	// With OTEL_SDK_DISABLED=true the handlers stay instrumented, but the global
+	// tracer provider remains the no-op provider of the API
+	sdkDisabled := os.Getenv("OTEL_SDK_DISABLED") == "true"
+	if opentelemetryEnabled && !sdkDisabled {
 		initTracer()
 	}
 
@@ -1,6 +1,7 @@
 import flask
 from flask_sqlalchemy import SQLAlchemy
 import random
+from sqlalchemy import case, update
 from sqlalchemy.sql.expression import func
 import os
 
@@ -15,6 +16,27 @@ if ELASTIC_APM_ENABLED == "True" or ELASTIC_APM_ENABLED == "true":
     apm = ElasticAPM(app)
 
 
+# opentelemetry-instrument always exports through a batch span processor. For the synchronous
+# pipeline the service runs with OTEL_TRACES_EXPORTER=none and the simple processor is added here.
+OTEL_SPAN_PROCESSOR = os.getenv("OTEL_SPAN_PROCESSOR", "batch")
+
+if OTEL_SPAN_PROCESSOR == "simple":
+    from opentelemetry import trace
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+    trace.get_tracer_provider().add_span_processor(SimpleSpanProcessor(OTLPSpanExporter()))
+
+
+# Per-request phases (handler, span and export time) in a Server-Timing header, read by the native load generator
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false")
+
+if SERVER_TIMING == "True" or SERVER_TIMING == "true":
+    import server_timing
+    server_timing.instrument_sdk()
+    # Outermost, so the end of the server span is part of the measured request
+    app.wsgi_app = server_timing.ServerTimingMiddleware(app.wsgi_app)
+
+
 DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_USER = os.getenv("DB_USER", "postgres")
 DB_PWD = os.getenv("DB_PWD", "postgres")
@@ -94,5 +116,30 @@ def updates():
     return flask.jsonify(worlds)
 
 
+@app.route('/updates-bulk', methods=['GET'])
+def updates_bulk():
+    # /updates with two statements instead of one or two per row:
+    # one SELECT ... IN for all ids and one UPDATE ... CASE for all new numbers
+    query_count = flask.request.args.get('queries', 1, type=int)
+    query_count = min(max(query_count, 1), 500)  # Query count should be between 1 and 500
+
+    random_ids = [random.randint(1, 10000) for _ in range(query_count)]
+    found_ids = {world.id for world in World.query.filter(World.id.in_(random_ids))}
+
+    # An id drawn twice is updated once
+    random_numbers = {world_id: random.randint(1, 10000) for world_id in found_ids}
+    if random_numbers:
+        db.session.execute(
+            update(World)
+            .where(World.id.in_(random_numbers))
+            .values(randomnumber=case(random_numbers, value=World.id))
+            .execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+
+    return flask.jsonify([{'id': world_id, 'randomNumber': random_numbers[world_id]}
+                          for world_id in random_ids if world_id in random_numbers])
+
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", debug=True)
@@ -1,10 +1,13 @@
 #!/bin/sh
 
+# Gunicorn configuration, e.g. gunicorn_conf_gthread.py for threaded workers
+GUNICORN_CONFIG=${GUNICORN_CONFIG:-gunicorn_conf.py}
+
 # Check if OpenTelemetry instrumentation is enabled
 if [ "$OPENTELEMETRY" = "true" ]; then
   # Run the application with OpenTelemetry instrumentation
-  exec opentelemetry-instrument gunicorn app:app -c gunicorn_conf.py
+  exec opentelemetry-instrument gunicorn app:app -c "$GUNICORN_CONFIG"
 else
   # Run the application without OpenTelemetry instrumentation
-  exec gunicorn app:app -c gunicorn_conf.py
+  exec gunicorn app:app -c "$GUNICORN_CONFIG"
 fi
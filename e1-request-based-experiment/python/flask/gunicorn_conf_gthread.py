@@ -0,0 +1,8 @@
+import os
+
+# Threaded workers: every worker process serves `threads` requests concurrently
+workers = 4
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+bind = "0.0.0.0:8080"
+keepalive = 120
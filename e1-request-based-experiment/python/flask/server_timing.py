@@ -0,0 +1,110 @@
+import threading
+import time
+
+# Breaks every request into phases and reports them in a Server-Timing header (durations in ms):
+#   span:    time inside span start/end and the span attribute, event and status calls of the OpenTelemetry SDK
+#   export:  time inside synchronous exports (the simple span processor), on the request's thread
+#   handler: the rest of the request, i.e. the application, the framework and the instrumentation around the spans
+#   total:   the whole request
+# The middleware wraps the instrumented app, so the end of the server span (which the Flask instrumentation
+# ends after the response headers are produced) and its export are part of the request they belong to.
+
+PHASES = ["handler", "span", "export", "total"]
+
+_state = threading.local()
+
+
+def _timings():
+    # Per thread, so gthread workers do not mix up their requests
+    timings = getattr(_state, "timings", None)
+    if timings is None:
+        timings = _state.timings = {"span": 0, "export": 0, "depth": 0, "active": False}
+    return timings
+
+
+def _timed_span_call(function):
+    # Only the outermost call is timed (e.g. start_span calls the span processors), exports within it
+    # are counted as export time instead
+    def wrapper(*args, **kwargs):
+        timings = _timings()
+        if not timings["active"] or timings["depth"]:
+            return function(*args, **kwargs)
+        timings["depth"] += 1
+        export_before = timings["export"]
+        start = time.perf_counter_ns()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter_ns() - start
+            timings["depth"] -= 1
+            timings["span"] += elapsed - (timings["export"] - export_before)
+
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+def _timed_export(function):
+    def wrapper(*args, **kwargs):
+        timings = _timings()
+        if not timings["active"]:
+            return function(*args, **kwargs)
+        start = time.perf_counter_ns()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            timings["export"] += time.perf_counter_ns() - start
+
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+def instrument_sdk():
+    # Wraps the SDK classes, so spans of every tracer provider and instrumentation are covered.
+    # Returns False for services without the OpenTelemetry SDK, which only report handler and total.
+    try:
+        from opentelemetry.sdk.trace import Span, Tracer
+        from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    except ImportError:
+        return False
+
+    Tracer.start_span = _timed_span_call(Tracer.start_span)
+    for method in ["end", "set_attribute", "set_attributes", "add_event", "set_status", "update_name",
+                   "record_exception"]:
+        setattr(Span, method, _timed_span_call(getattr(Span, method)))
+    SimpleSpanProcessor.on_end = _timed_export(SimpleSpanProcessor.on_end)
+    return True
+
+
+def format_header(durations_ns):
+    return ", ".join(f"{phase};dur={durations_ns[phase] / 1_000_000:.3f}" for phase in PHASES)
+
+
+class ServerTimingMiddleware:
+    # WSGI middleware. The response is started only once the wrapped app returned, so the header can
+    # include the time of everything the app did for the request.
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        timings = _timings()
+        timings.update(span=0, export=0, depth=0, active=True)
+        captured = {}
+
+        def capture_start_response(status, headers, exc_info=None):
+            captured["response"] = (status, headers, exc_info)
+            # Flask does not use the write callable, which would require the headers to be sent already
+            return lambda data: None
+
+        start = time.perf_counter_ns()
+        try:
+            body = self.app(environ, capture_start_response)
+        finally:
+            total = time.perf_counter_ns() - start
+            timings["active"] = False
+
+        status, headers, exc_info = captured["response"]
+        durations = {"span": timings["span"], "export": timings["export"], "total": total}
+        durations["handler"] = max(0, total - durations["span"] - durations["export"])
+        start_response(status, list(headers) + [("Server-Timing", format_header(durations))], exc_info)
+        return body
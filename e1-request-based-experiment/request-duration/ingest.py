@@ -0,0 +1,302 @@
+import argparse
+import csv
+import gzip
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+from histogram import LatencyHistogram
+
+# Reads the `k6 run --out json=<file>` stream line by line and keeps one latency histogram per
+# scenario, language, configuration and endpoint, so memory stays bounded however long the test runs.
+# Only the summaries and the (mergeable) histograms are written, not the points themselves.
+
+DURATION_METRIC = "http_req_duration"
+FAILED_METRIC = "http_req_failed"
+DROPPED_METRIC = "dropped_iterations"
+METRICS = (DURATION_METRIC, FAILED_METRIC, DROPPED_METRIC)
+
+PERCENTILES = (50, 90, 99, 99.9)
+KEY_FIELDS = ["scenario", "language", "configuration", "endpoint"]
+SUMMARY_FIELDS = KEY_FIELDS + ["requests", "errors", "error_rate", "dropped_iterations", "start", "end", "rps"] + \
+                 [f"p{p}" for p in PERCENTILES] + ["mean", "max"]
+WINDOW_FIELDS = ["window_start"] + KEY_FIELDS + ["requests", "errors"] + [f"p{p}" for p in PERCENTILES] + ["mean",
+                                                                                                          "max"]
+
+CHECKPOINT_INTERVAL = 60  # Seconds
+FOLLOW_POLL_INTERVAL = 0.5  # Seconds
+
+
+class Aggregate:
+    # Everything kept about one key: the request durations and the error and drop counts
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.errors = 0
+        self.dropped = 0
+        self.start = None
+        self.end = None
+
+    def add_time(self, timestamp):
+        self.start = timestamp if self.start is None else min(self.start, timestamp)
+        self.end = timestamp if self.end is None else max(self.end, timestamp)
+
+    def merge(self, other):
+        self.latency.merge(other.latency)
+        self.errors += other.errors
+        self.dropped += other.dropped
+        for timestamp in (other.start, other.end):
+            if timestamp is not None:
+                self.add_time(timestamp)
+        return self
+
+    def summary(self):
+        requests = self.latency.total_count
+        duration = (self.end - self.start) if self.start is not None else 0
+        latency = self.latency.summary(PERCENTILES)
+        return {
+            "requests": requests,
+            "errors": self.errors,
+            "error_rate": self.errors / requests if requests else 0,
+            "dropped_iterations": self.dropped,
+            "start": self.start,
+            "end": self.end,
+            "rps": requests / duration if duration > 0 else 0,
+            **{f"p{p}": latency[f"p{p}"] for p in PERCENTILES},
+            "mean": latency["mean"],
+            "max": latency["max"],
+        }
+
+    def to_dict(self):
+        return {"latency": self.latency.to_dict(), "errors": self.errors, "dropped": self.dropped,
+                "start": self.start, "end": self.end}
+
+    @staticmethod
+    def from_dict(data):
+        aggregate = Aggregate()
+        aggregate.latency = LatencyHistogram.from_dict(data["latency"])
+        aggregate.errors = data["errors"]
+        aggregate.dropped = data["dropped"]
+        aggregate.start = data["start"]
+        aggregate.end = data["end"]
+        return aggregate
+
+
+class TimeParser:
+    # k6 writes RFC 3339 times with nanoseconds, which datetime.fromisoformat cannot read before Python 3.11.
+    # The whole seconds are parsed once per second of the test, the fraction is added to them.
+
+    def __init__(self):
+        self._second = None
+        self._base = None
+
+    def parse(self, value):
+        # e.g. 2024-05-09T14:34:45.625742514+02:00 or 2024-05-09T14:34:45Z
+        second, zone = value[:19], value[19:]
+        fraction = 0.0
+        if zone.startswith("."):
+            end = 1
+            while end < len(zone) and zone[end].isdigit():
+                end += 1
+            fraction = float(zone[:end])
+            zone = zone[end:]
+        if (second, zone) != self._second:
+            self._second = (second, zone)
+            self._base = datetime.fromisoformat(second + ("+00:00" if zone == "Z" else zone)).timestamp()
+        return self._base + fraction
+
+
+def point_key(tags):
+    # The tags of the scenarios in tests/tests.js, e.g. appName "python-otel" and language "python"
+    language = tags.get("language", "")
+    app_name = tags.get("appName", "")
+    configuration = app_name[len(language) + 1:] if language and app_name.startswith(f"{language}-") else app_name
+    return tags.get("scenario", ""), language, configuration, tags.get("endpoint", "")
+
+
+def write_atomic(path, write):
+    # Write to a temporary file first, so a checkpoint that is interrupted does not leave a broken file
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w", newline="") as file:
+        write(file)
+    os.replace(temporary_path, path)
+
+
+def write_summary(aggregates, output):
+    def write_csv(file):
+        writer = csv.DictWriter(file, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        for key in sorted(aggregates):
+            writer.writerow({**dict(zip(KEY_FIELDS, key)), **aggregates[key].summary()})
+
+    def write_histograms(file):
+        json.dump([{**dict(zip(KEY_FIELDS, key)), **aggregate.to_dict()} for key, aggregate in
+                   sorted(aggregates.items())], file)
+
+    write_atomic(f"{output}_summary.csv", write_csv)
+    write_atomic(f"{output}_histograms.json", write_histograms)
+
+
+def read_histograms(path):
+    with open(path) as file:
+        return {tuple(entry[field] for field in KEY_FIELDS): Aggregate.from_dict(entry) for entry in json.load(file)}
+
+
+class Windows:
+    # Per-window summaries of every key, e.g. one row per minute, to see how the latency develops during a
+    # long test. A window is written once points of two windows later arrive, points are roughly in time order.
+
+    def __init__(self, path, length):
+        self.length = length
+        self.open = {}
+        self.latest = None
+        self.file = open(path, "w", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=WINDOW_FIELDS)
+        self.writer.writeheader()
+
+    def get(self, key, timestamp):
+        window_start = int(timestamp // self.length * self.length)
+        if self.latest is None or window_start > self.latest:
+            self.latest = window_start
+            self.flush(before=window_start - self.length)
+        return self.open.setdefault((window_start, key), Aggregate())
+
+    def flush(self, before=None):
+        for window_start, key in sorted(self.open):
+            if before is not None and window_start >= before:
+                continue
+            aggregate = self.open.pop((window_start, key))
+            summary = aggregate.summary()
+            self.writer.writerow({"window_start": window_start, **dict(zip(KEY_FIELDS, key)),
+                                  **{field: summary[field] for field in WINDOW_FIELDS[len(KEY_FIELDS) + 1:]}})
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def read_lines(path, follow=False, idle_timeout=30):
+    # `path` can be a named pipe k6 writes into, a finished (optionally gzipped) file or "-" for stdin.
+    # With `follow`, a growing file is read like `tail -f` until it did not grow for `idle_timeout` seconds.
+    if path == "-":
+        yield from sys.stdin
+        return
+
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt") as file:
+        if not follow:
+            yield from file
+            return
+
+        partial = ""
+        idle_since = time.time()
+        while True:
+            line = file.readline()
+            if not line:
+                if time.time() - idle_since > idle_timeout:
+                    break
+                time.sleep(FOLLOW_POLL_INTERVAL)
+                continue
+            idle_since = time.time()
+            # A line k6 has not finished writing yet
+            if not line.endswith("\n"):
+                partial += line
+                continue
+            yield partial + line
+            partial = ""
+
+
+def ingest(lines, output, window=0, checkpoint_interval=CHECKPOINT_INTERVAL):
+    aggregates = {}
+    windows = Windows(f"{output}_windows.csv", window) if window else None
+    parser = TimeParser()
+    last_checkpoint = time.time()
+    points = 0
+
+    for line in lines:
+        # Skip the metric definitions and unrelated metrics before paying for the JSON decoding
+        if '"type":"Point"' not in line or not any(f'"metric":"{metric}"' in line for metric in METRICS):
+            continue
+        try:
+            point = json.loads(line)
+        except ValueError:
+            print(f"Skipping malformed line: {line[:100]}")
+            continue
+
+        data = point["data"]
+        key = point_key(data.get("tags") or {})
+        timestamp = parser.parse(data["time"])
+        targets = [aggregates.setdefault(key, Aggregate())]
+        if windows is not None:
+            targets.append(windows.get(key, timestamp))
+
+        metric = point["metric"]
+        for aggregate in targets:
+            if metric == DURATION_METRIC:
+                # Milliseconds in k6, microseconds in the histogram
+                aggregate.latency.record(round(data["value"] * 1000))
+                aggregate.add_time(timestamp)
+            elif metric == FAILED_METRIC:
+                aggregate.errors += int(data["value"])
+            else:
+                aggregate.dropped += int(data["value"])
+
+        points += 1
+        if time.time() - last_checkpoint > checkpoint_interval:
+            write_summary(aggregates, output)
+            last_checkpoint = time.time()
+
+    if windows is not None:
+        windows.close()
+    write_summary(aggregates, output)
+    print(f"Ingested {points} points into {len(aggregates)} summaries, written to {output}_summary.csv")
+    return aggregates
+
+
+def merge(paths, output):
+    # Combine the histograms of several runs, e.g. repetitions of the same test
+    aggregates = {}
+    for path in paths:
+        for key, aggregate in read_histograms(path).items():
+            if key in aggregates:
+                aggregates[key].merge(aggregate)
+            else:
+                aggregates[key] = aggregate
+    write_summary(aggregates, output)
+    print(f"Merged {len(paths)} files into {len(aggregates)} summaries, written to {output}_summary.csv")
+    return aggregates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize k6 JSON output into latency histograms")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    stream_parser = subparsers.add_parser("stream", help="Ingest `k6 --out json` output")
+    stream_parser.add_argument("input", help="Named pipe, file (.json or .json.gz) or - for stdin")
+    stream_parser.add_argument("--output", required=True, help="Prefix of the output files")
+    stream_parser.add_argument("--window", type=int, default=0,
+                               help="Also write a summary per window of this many seconds")
+    stream_parser.add_argument("--follow", action="store_true", help="Keep reading a file that is still written")
+    stream_parser.add_argument("--idle-timeout", type=int, default=30,
+                               help="Seconds without new lines after which --follow stops")
+
+    merge_parser = subparsers.add_parser("merge", help="Merge the histograms of several runs")
+    merge_parser.add_argument("inputs", nargs="+", help="*_histograms.json files")
+    merge_parser.add_argument("--output", required=True, help="Prefix of the output files")
+
+    args = parser.parse_args()
+    output_dir = os.path.dirname(args.output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    if args.command == "stream":
+        ingest(read_lines(args.input, args.follow, args.idle_timeout), args.output, args.window)
+    else:
+        merge(args.inputs, args.output)
+
+
+if __name__ == "__main__":
+    main()
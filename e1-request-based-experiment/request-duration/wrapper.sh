@@ -5,11 +5,26 @@ DATETIME=$(date +'%Y-%m-%d_%H-%M')
 
 MONITOR_SCRIPT="./cpu.sh"
 RESULTS_DIR="results/$DATE"
+# Seconds per row of the windowed summary, 0 disables it
+SUMMARY_WINDOW=${SUMMARY_WINDOW:-60}
+# Also keep every request in a CSV file, which grows by gigabytes in long tests
+K6_RAW_OUTPUT=${K6_RAW_OUTPUT:-false}
 
 K6_TEST_NAME=$1
 
 mkdir -p $RESULTS_DIR
-K6_TEST="k6 run --out csv=$RESULTS_DIR/$DATETIME.csv $K6_TEST_NAME"
+
+# k6 streams its points into a named pipe, the ingester keeps only the histograms
+K6_STREAM="$RESULTS_DIR/$DATETIME.k6.pipe"
+rm -f $K6_STREAM
+mkfifo $K6_STREAM
+python ingest.py stream $K6_STREAM --output $RESULTS_DIR/$DATETIME --window $SUMMARY_WINDOW &
+INGEST_PID=$!
+
+K6_TEST="k6 run --out json=$K6_STREAM $K6_TEST_NAME"
+if [ "$K6_RAW_OUTPUT" = "true" ]; then
+    K6_TEST="k6 run --out json=$K6_STREAM --out csv=$RESULTS_DIR/$DATETIME.csv $K6_TEST_NAME"
+fi
 
 # Start the monitoring script in the background
 bash $MONITOR_SCRIPT &
@@ -18,9 +33,19 @@ MONITOR_PID=$!
 
 # Start k6 test
 $K6_TEST
+K6_STATUS=$?
+
+# The ingester writes the final summaries once k6 closed the pipe. When k6 failed before opening it, the ingester
+# still waits for a writer; opening the pipe read-write does not block and hands it an empty stream instead.
+exec 3<>$K6_STREAM
+exec 3>&-
+wait $INGEST_PID
+rm -f $K6_STREAM
 
 # Once k6 test completes, kill the monitoring script if it's still running
 if kill -0 $MONITOR_PID > /dev/null 2>&1; then
     echo "Stopping the CPU monitoring script."
     kill $MONITOR_PID
 fi
+
+exit $K6_STATUS
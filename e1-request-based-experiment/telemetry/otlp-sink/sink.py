@@ -0,0 +1,333 @@
+import gzip
+import json
+import os
+import random
+import signal
+import socket
+import threading
+import time
+from concurrent import futures
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import grpc
+from opentelemetry.proto.collector.trace.v1.trace_service_pb2 import (ExportTraceServiceRequest,
+                                                                     ExportTraceServiceResponse)
+
+# Stand-in for the OpenTelemetry collector: accepts OTLP trace exports over gRPC and HTTP/protobuf,
+# acknowledges them after a configurable delay and records every export.
+# The backend can be made slow, lossy or unreachable at runtime through the control port.
+GRPC_PORT = int(os.getenv("SINK_GRPC_PORT", "4317"))
+HTTP_PORT = int(os.getenv("SINK_HTTP_PORT", "4318"))
+CONTROL_PORT = int(os.getenv("SINK_CONTROL_PORT", "4319"))
+GRPC_WORKERS = int(os.getenv("SINK_GRPC_WORKERS", "16"))
+LOG_FILE = os.getenv("SINK_LOG_FILE", "/logs/exports.csv")
+FLUSH_INTERVAL = 1  # Seconds
+
+LOG_HEADER = "receive_time_ns,protocol,service,spans,payload_bytes,wire_bytes,decode_us,ack_delay_ms,status\n"
+
+GRPC_SERVICE = "opentelemetry.proto.collector.trace.v1.TraceService"
+EMPTY_RESPONSE = ExportTraceServiceResponse().SerializeToString()
+
+
+class ExportLog:
+    # One CSV line per export. Lines are buffered and written once per FLUSH_INTERVAL,
+    # so recording does not add file I/O to the acknowledgement path.
+
+    def __init__(self, path):
+        self.path = path
+        self._lines = []
+        self._lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            if not os.path.isfile(path):
+                with open(path, "w") as file:
+                    file.write(LOG_HEADER)
+
+    def append(self, line):
+        with self._lock:
+            self._lines.append(line)
+
+    def flush(self):
+        with self._lock:
+            lines, self._lines = self._lines, []
+        if lines and self.path:
+            with open(self.path, "a") as file:
+                file.writelines(lines)
+
+
+class Mode:
+    # How the sink answers exports: after delay_ms +- jitter_ms, rejecting a share of error_rate of them
+    # as unavailable (which the exporters retry), or not at all with refuse set, which closes the OTLP ports
+
+    FIELDS = {"delay_ms": float, "jitter_ms": float, "error_rate": float, "refuse": bool}
+
+    def __init__(self):
+        self.delay_ms = float(os.getenv("SINK_ACK_DELAY_MS", "0"))
+        self.jitter_ms = float(os.getenv("SINK_ACK_JITTER_MS", "0"))
+        self.error_rate = float(os.getenv("SINK_ERROR_RATE", "0"))
+        self.refuse = os.getenv("SINK_REFUSE", "false").lower() == "true"
+
+    def update(self, values):
+        for field, value in values.items():
+            if field not in self.FIELDS:
+                raise ValueError(f"Unknown mode field {field}")
+            setattr(self, field, self.FIELDS[field](value))
+
+    def describe(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def ack_delay_ms(self):
+        return max(0.0, random.uniform(self.delay_ms - self.jitter_ms, self.delay_ms + self.jitter_ms))
+
+    def reject(self):
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+
+class Stats:
+    # Running totals per service name, read by the harnesses through GET /stats. "spans" and "bytes" count
+    # every export received, including the retries of rejected ones; "acked_spans" and "acked_bytes" only
+    # the acknowledged exports, i.e. what the backend accepted.
+
+    def __init__(self):
+        self._services = {}
+        self._lock = threading.Lock()
+
+    def add(self, service, spans, payload_bytes, decode_ns, rejected):
+        with self._lock:
+            totals = self._services.setdefault(service, {"exports": 0, "spans": 0, "bytes": 0, "decode_ns": 0,
+                                                         "rejected": 0, "acked_spans": 0, "acked_bytes": 0})
+            totals["exports"] += 1
+            totals["spans"] += spans
+            totals["bytes"] += payload_bytes
+            totals["decode_ns"] += decode_ns
+            totals["rejected"] += rejected
+            if not rejected:
+                totals["acked_spans"] += spans
+                totals["acked_bytes"] += payload_bytes
+
+    def snapshot(self):
+        with self._lock:
+            return {service: dict(totals) for service, totals in self._services.items()}
+
+    def reset(self):
+        with self._lock:
+            self._services.clear()
+
+
+export_log = ExportLog(LOG_FILE)
+stats = Stats()
+mode = Mode()
+
+
+def service_name(resource_spans):
+    for attribute in resource_spans.resource.attributes:
+        if attribute.key == "service.name":
+            return attribute.value.string_value
+    return "unknown"
+
+
+def record_export(protocol, payload, wire_bytes):
+    # Decode the request like a collector would and attribute spans and bytes to the exporting services.
+    # Returns whether the export is acknowledged, after the delay of the current mode.
+    receive_time_ns = time.time_ns()
+    decode_start = time.perf_counter_ns()
+    request = ExportTraceServiceRequest.FromString(payload)
+    decode_ns = time.perf_counter_ns() - decode_start
+
+    services = {}
+    for resource_spans in request.resource_spans:
+        spans = sum(len(scope_spans.spans) for scope_spans in resource_spans.scope_spans)
+        counts = services.setdefault(service_name(resource_spans), [0, 0])
+        counts[0] += spans
+        counts[1] += resource_spans.ByteSize()
+
+    ack_delay_ms = mode.ack_delay_ms()
+    rejected = mode.reject()
+
+    # Requests with several resources are split by the size of each resource's spans
+    total_size = sum(size for _, size in services.values()) or 1
+    for service, (spans, size) in services.items():
+        share = size / total_size if len(services) > 1 else 1
+        stats.add(service, spans, round(len(payload) * share), round(decode_ns * share), rejected)
+
+    export_log.append(f"{receive_time_ns},{protocol},{'+'.join(services) or 'unknown'},"
+                      f"{sum(spans for spans, _ in services.values())},{len(payload)},{wire_bytes},"
+                      f"{decode_ns / 1000:.1f},{ack_delay_ms:.1f},{'rejected' if rejected else 'ok'}\n")
+
+    if ack_delay_ms > 0:
+        time.sleep(ack_delay_ms / 1000)
+    return not rejected
+
+
+def grpc_export(payload, context):
+    # The request is not deserialized by gRPC, so the payload size and decode cost can be measured
+    if not record_export("grpc", payload, len(payload)):
+        context.abort(grpc.StatusCode.UNAVAILABLE, "Rejected by the sink")
+    return EMPTY_RESPONSE
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def respond(self, status, body, content_type="text/plain"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Every export is in the export log already
+        pass
+
+
+class OtlpHandler(Handler):
+
+    def do_POST(self):
+        if self.path != "/v1/traces":
+            self.respond(404, b"")
+            return
+
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        wire_bytes = len(body)
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            # Only the binary protobuf encoding is decoded
+            self.respond(415, b"")
+            return
+
+        if record_export("http", body, wire_bytes):
+            self.respond(200, EMPTY_RESPONSE, "application/x-protobuf")
+        else:
+            self.respond(503, b"Rejected by the sink")
+
+
+class ControlHandler(Handler):
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self.respond(200, json.dumps(stats.snapshot()).encode(), "application/json")
+        elif self.path == "/mode":
+            self.respond(200, json.dumps(mode.describe()).encode(), "application/json")
+        elif self.path == "/health":
+            self.respond(200, b"OK")
+        else:
+            self.respond(404, b"")
+
+    def do_PUT(self):
+        # Fields that are left out keep their current value
+        if self.path != "/mode":
+            self.respond(404, b"")
+            return
+        try:
+            mode.update(json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}"))
+        except ValueError as e:
+            self.respond(400, str(e).encode())
+            return
+        receivers.apply(mode.refuse)
+        print(f"Mode: {mode.describe()}")
+        self.respond(200, json.dumps(mode.describe()).encode(), "application/json")
+
+    def do_DELETE(self):
+        if self.path == "/stats":
+            stats.reset()
+            self.respond(200, b"")
+        else:
+            self.respond(404, b"")
+
+
+class ConnectionTrackingServer(ThreadingHTTPServer):
+    # Keeps the open connections, which outlive the listening socket: a keep-alive connection is served by
+    # its handler thread until the client or the server closes it.
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._connections = set()
+        self._connections_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        with self._connections_lock:
+            self._connections.add(request)
+        super().process_request(request, client_address)
+
+    def shutdown_request(self, request):
+        with self._connections_lock:
+            self._connections.discard(request)
+        super().shutdown_request(request)
+
+    def close_connections(self):
+        # The handler threads see the end of the stream and finish
+        with self._connections_lock:
+            for connection in self._connections:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+
+def start_http_server(port, handler, server_class=ThreadingHTTPServer):
+    server = server_class(("0.0.0.0", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class Receivers:
+    # The OTLP listeners. They and their open connections are closed while the mode refuses connections,
+    # so the exporters see an unreachable backend rather than a slow one.
+
+    def __init__(self):
+        self._grpc_server = None
+        self._http_server = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        self._grpc_server = grpc.server(futures.ThreadPoolExecutor(max_workers=GRPC_WORKERS))
+        self._grpc_server.add_generic_rpc_handlers([grpc.method_handlers_generic_handler(GRPC_SERVICE, {
+            "Export": grpc.unary_unary_rpc_method_handler(grpc_export),
+        })])
+        self._grpc_server.add_insecure_port(f"0.0.0.0:{GRPC_PORT}")
+        self._grpc_server.start()
+        self._http_server = start_http_server(HTTP_PORT, OtlpHandler, ConnectionTrackingServer)
+
+    def _stop(self):
+        self._http_server.shutdown()
+        self._http_server.server_close()
+        # Exporters keep their connections open, they must not reach the backend through them either
+        self._http_server.close_connections()
+        self._grpc_server.stop(grace=None).wait()
+        self._grpc_server = self._http_server = None
+
+    def apply(self, refuse):
+        with self._lock:
+            if refuse and self._grpc_server is not None:
+                self._stop()
+            elif not refuse and self._grpc_server is None:
+                self._start()
+
+
+receivers = Receivers()
+
+
+def main():
+    receivers.apply(mode.refuse)
+    control_server = start_http_server(CONTROL_PORT, ControlHandler)
+
+    print(f"OTLP sink listening on {GRPC_PORT} (gRPC) and {HTTP_PORT} (HTTP), control on {CONTROL_PORT}, "
+          f"mode {mode.describe()}")
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    while not stop.wait(FLUSH_INTERVAL):
+        export_log.flush()
+
+    control_server.shutdown()
+    receivers.apply(True)
+    export_log.flush()
+
+
+if __name__ == "__main__":
+    main()
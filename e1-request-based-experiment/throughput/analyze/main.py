@@ -1,27 +1,91 @@
+import argparse
+import os
+
 import pandas as pd
+import matplotlib
 import matplotlib.pyplot as plt
 
+import report
+import results_store
+
+# Figures are rendered in worker processes without a display
+matplotlib.use('Agg')
+
 PLOT_DIR = "plots"
+MANIFEST_FILE = f"{PLOT_DIR}/.manifest.json"
 
 plt.rcParams.update({'font.size': 18})
 
+# Configurations in plotting order, with their labels and colors
+CONFIGURATION_ORDER = ['standard', 'otel-noop', 'otel-noexport', 'otel', 'otel-simple', 'otel-batch-tuned', 'elastic',
+                       'gthread', 'gthread-otel']
+LABEL_MAPPING = {
+    'standard': 'Standard',
+    'otel-noop': 'OTel API (no-op)',
+    'otel-noexport': 'OTel SDK (no export)',
+    'otel': 'OpenTelemetry',
+    'otel-simple': 'OTel (simple processor)',
+    'otel-batch-tuned': 'OTel (tuned batch)',
+    'elastic': 'Elastic APM',
+    'gthread': 'Standard (gthread)',
+    'gthread-otel': 'OpenTelemetry (gthread)'
+}
+ERROR_COLORS = {
+    'standard': 'lightblue',
+    'otel-noop': 'thistle',
+    'otel-noexport': 'navajowhite',
+    'otel': 'lightcoral',
+    'otel-simple': 'indianred',
+    'otel-batch-tuned': 'peachpuff',
+    'elastic': 'lightgreen',
+    'gthread': 'lightsteelblue',
+    'gthread-otel': 'salmon'
+}
+
+# Tracing tiers and the layer each tier adds, see utils.TRACING_TIERS of the calibrator
+TRACING_TIERS = ['standard', 'otel-noop', 'otel-noexport', 'otel']
+TRACING_LAYERS = {'otel-noop': 'API', 'otel-noexport': 'SDK', 'otel': 'Export'}
+
+# Phases of the Server-Timing header that add up to the request time, with their colors
+TIMING_PHASES = {'handler': 'lightblue', 'span': 'lightcoral', 'export': 'indianred'}
+
 
 def main():
+    args = parse_args()
     file_path = "../results/rps_calibration_results.csv"
 
     stats = calculate_targetRPS_stats(file_path)
     print(stats)
-    plot_targetRPS_stats_error_bars(file_path)
-    plot_targetRPS_per_language(file_path)
+    sampling_stats = calculate_sampling_stats(file_path)
+    collector_mode_stats = calculate_collector_mode_stats(file_path)
+    timing_stats = calculate_timing_stats(file_path)
 
-    plot_aggregated_RPS_across_variations(file_path)
-    plot_aggregated_RPS_across_variations_horizontal(file_path)
-    plot_aggregated_RPS_across_endpoints(file_path)
+    # Figures are rendered in parallel and only when their data or plotting code changed
+    os.makedirs(PLOT_DIR, exist_ok=True)
+    rendered, skipped = report.build(figures(stats, sampling_stats, collector_mode_stats, timing_stats), MANIFEST_FILE,
+                                     max_workers=args.workers, force=args.force)
+    print(f"Rendered {len(rendered)} figures, {len(skipped)} up to date")
 
     table, overall = calculate_differences(file_path)
     print(table)
     print(overall)
 
+    # Throughput lost by the instrumentation API, the SDK and the export
+    tier_losses = calculate_tier_losses(stats)
+    if not tier_losses.empty:
+        print(tier_losses)
+
+    if not sampling_stats.empty:
+        print(sampling_stats)
+
+    # Throughput and latency of the span processors against a slow, lossy or unreachable collector
+    if not collector_mode_stats.empty:
+        print(collector_mode_stats)
+
+    # Time per request in the handler, in span calls and in synchronous exports, from the Server-Timing headers
+    if not timing_stats.empty:
+        print(timing_stats)
+
     # Compare the Throughput vs Standard, Otel and Elastic APM.
 
     # Calculate the Average of the five runs
@@ -29,40 +93,244 @@ def main():
     # Also Max
 
 
-def plot_aggregated_RPS_across_endpoints(file_path):
-    # Calculate statistics
-    stats_df = calculate_targetRPS_stats(file_path)
+def parse_args():
+    parser = argparse.ArgumentParser(description="Plot the throughput calibration results")
+    parser.add_argument("--force", action="store_true", help="Render all figures, also those that are up to date")
+    parser.add_argument("--workers", type=int, default=None, help="Number of rendering processes")
+    return parser.parse_args()
+
+
+def figures(stats_df, sampling_stats, collector_mode_stats, timing_stats):
+    # Every figure with the slice of the statistics it is drawn from.
+    # Sampling-ratio variants and collector modes only appear in their own figures.
+    sweep_figures = sampling_figures(stats_df, sampling_stats) + collector_mode_figures(collector_mode_stats) + \
+        timing_figures(timing_stats)
+    stats_df = stats_df[stats_df['Configuration'].isin(CONFIGURATION_ORDER)]
+
+    figure_list = [
+        report.Figure('aggregated_RPS_across_variations_boxplot.png', plot_aggregated_RPS_across_variations,
+                      stats_df),
+        report.Figure('aggregated_RPS_across_variations_horizontal.png',
+                      plot_aggregated_RPS_across_variations_horizontal, stats_df),
+        report.Figure('aggregated_RPS_across_endpoints.png', plot_aggregated_RPS_across_endpoints, stats_df),
+    ]
+
+    for lang in stats_df['Language'].unique():
+        language_df = stats_df[stats_df['Language'] == lang]
+        # Not every language serves every endpoint (e.g. updates-bulk)
+        endpoints = list(language_df['Endpoint'].unique())
+        figure_list.append(report.Figure(f'{PLOT_DIR}/{lang}_All_targetRPS.png', plot_targetRPS_language,
+                                         language_df, endpoints=endpoints))
+        for endpoint in endpoints:
+            subset = language_df[language_df['Endpoint'] == endpoint]
+            if subset.empty:
+                continue
+            figure_list.append(report.Figure(f'{PLOT_DIR}/{lang}_{endpoint}_targetRPS.png',
+                                             plot_targetRPS_error_bars, subset))
+
+    tier_losses = calculate_tier_losses(stats_df)
+    if not tier_losses.empty:
+        figure_list.append(report.Figure('tracing_tier_losses.png', plot_tier_losses, tier_losses))
+
+    return figure_list + sweep_figures
+
+
+def sampling_figures(stats_df, sampling_stats):
+    figure_list = []
+    for lang in sampling_stats['language'].unique() if not sampling_stats.empty else []:
+        # The uninstrumented throughput of every endpoint as a reference line
+        standard = stats_df[(stats_df['Language'] == lang) & (stats_df['Configuration'] == 'standard')]
+        standard_rps = dict(zip(standard['Endpoint'], standard['Average Target RPS']))
+        figure_list.append(report.Figure(f'{PLOT_DIR}/{lang}_sampling_sweep.png', plot_sampling_sweep,
+                                         sampling_stats[sampling_stats['language'] == lang],
+                                         standard_rps=standard_rps))
+    return figure_list
+
+
+def collector_mode_figures(collector_mode_stats):
+    figure_list = []
+    for lang in collector_mode_stats['language'].unique() if not collector_mode_stats.empty else []:
+        figure_list.append(report.Figure(f'{PLOT_DIR}/{lang}_collector_modes.png', plot_collector_modes,
+                                         collector_mode_stats[collector_mode_stats['language'] == lang]))
+    return figure_list
+
+
+def timing_figures(timing_stats):
+    figure_list = []
+    for lang in timing_stats['language'].unique() if not timing_stats.empty else []:
+        figure_list.append(report.Figure(f'{PLOT_DIR}/{lang}_server_timing.png', plot_server_timing,
+                                         timing_stats[timing_stats['language'] == lang]))
+    return figure_list
+
+
+def endpoint_subplots(count, figsize):
+    # Two subplots per row, `figsize` is the size of one row. Returns the axes as a flat list,
+    # axes without an endpoint are hidden.
+    rows = max((count + 1) // 2, 1)
+    fig, axs = plt.subplots(rows, 2, figsize=(figsize[0], figsize[1] * rows), squeeze=False)
+    axs = axs.flatten()
+    for ax in axs[count:]:
+        ax.axis('off')
+    return fig, axs
+
+
+def configuration_order(stats_df):
+    # The configurations present in the statistics, in plotting order
+    present = set(stats_df['Configuration'])
+    return [config for config in CONFIGURATION_ORDER if config in present]
+
+
+def plot_sampling_sweep(sampling_stats, plot_filename, standard_rps=None):
+    # Target RPS and CPU cost per request against the head-sampling ratio, one subplot per endpoint
+    if standard_rps is None:
+        standard_rps = {}
+    endpoints = list(sampling_stats['endpoint'].unique())
+
+    fig, axs = endpoint_subplots(len(endpoints), figsize=(16, 6))
+
+    for ax, endpoint in zip(axs, endpoints):
+        subset = sampling_stats[sampling_stats['endpoint'] == endpoint].sort_values('samplingRatio')
+
+        ax.errorbar(subset['samplingRatio'], subset['Average Target RPS'],
+                    yerr=[subset['Average Target RPS'] - subset['Min Target RPS'],
+                          subset['Max Target RPS'] - subset['Average Target RPS']],
+                    fmt='o-', capsize=5, color='black', ecolor=ERROR_COLORS['otel'], elinewidth=2,
+                    label='Target RPS')
+        if endpoint in standard_rps:
+            ax.axhline(standard_rps[endpoint], linestyle='--', color=ERROR_COLORS['standard'],
+                       label=LABEL_MAPPING['standard'])
+
+        # A ratio of 0 is still shown on the otherwise logarithmic axis
+        ax.set_xscale('symlog', linthresh=0.01)
+        ax.set_title(f'{endpoint.title()} Endpoint')
+        ax.set_xlabel('Sampling Ratio')
+        ax.set_ylabel('Requests per Second')
+        ax.grid(True, linestyle='--', alpha=0.6)
+
+        cpu_ax = ax.twinx()
+        cpu_ax.plot(subset['samplingRatio'], subset['CPU per 1k RPS'], 's:', color='grey', label='CPU per 1k RPS')
+        cpu_ax.set_ylabel('CPU (%) per 1k RPS')
+
+        lines, labels = ax.get_legend_handles_labels()
+        cpu_lines, cpu_labels = cpu_ax.get_legend_handles_labels()
+        ax.legend(lines + cpu_lines, labels + cpu_labels, loc='lower left', fontsize=12)
+
+    plt.tight_layout()
+
+    # Save plot as PNG file
+    plt.savefig(plot_filename)
+    plt.close(fig)
+
+
+def plot_collector_modes(collector_mode_stats, plot_filename):
+    # Target RPS (top) and p99 latency at the target RPS (bottom) per collector mode, one column per endpoint
+    # and one bar per span processor configuration
+    endpoints = list(collector_mode_stats['endpoint'].unique())
+    modes = list(dict.fromkeys(collector_mode_stats.sort_values('Mode Order')['collectorMode']))
+    configurations = [config for config in CONFIGURATION_ORDER
+                      if config in set(collector_mode_stats['configuration'])]
+    width = 0.8 / max(len(configurations), 1)
+
+    fig, axs = plt.subplots(2, len(endpoints), figsize=(6 * len(endpoints), 10), squeeze=False)
+
+    for column, endpoint in enumerate(endpoints):
+        subset = collector_mode_stats[collector_mode_stats['endpoint'] == endpoint]
+        for row, (metric, label) in enumerate([('Average Target RPS', 'Requests per Second'),
+                                               ('Average p99 (ms)', 'p99 Latency (ms)')]):
+            ax = axs[row][column]
+            for index, config in enumerate(configurations):
+                values = subset[subset['configuration'] == config].set_index('collectorMode')[metric]
+                positions = [position + (index - (len(configurations) - 1) / 2) * width
+                             for position in range(len(modes))]
+                ax.bar(positions, [values.get(mode, 0) for mode in modes], width,
+                       color=ERROR_COLORS[config], label=LABEL_MAPPING[config])
+            ax.set_xticks(range(len(modes)))
+            ax.set_xticklabels(modes, rotation=20)
+            ax.set_ylabel(label)
+            ax.grid(True, axis='y', linestyle='--', alpha=0.6)
+            if row == 0:
+                ax.set_title(f'{endpoint.title()} Endpoint')
+        axs[0][column].legend(fontsize=10)
+
+    plt.tight_layout()
+
+    # Save plot as PNG file
+    plt.savefig(plot_filename)
+    plt.close(fig)
+
+
+def plot_server_timing(timing_stats, plot_filename):
+    # Mean time per request at the target RPS, stacked by phase, one bar per configuration and one subplot
+    # per endpoint
+    endpoints = list(timing_stats['endpoint'].unique())
+
+    fig, axs = endpoint_subplots(len(endpoints), figsize=(16, 6))
+
+    for ax, endpoint in zip(axs, endpoints):
+        subset = timing_stats[timing_stats['endpoint'] == endpoint].set_index('configuration')
+        configurations = [config for config in CONFIGURATION_ORDER if config in subset.index]
+        bottom = [0] * len(configurations)
+        for phase, color in TIMING_PHASES.items():
+            values = [subset.loc[config, f'{phase.title()} (ms)'] for config in configurations]
+            ax.bar(range(len(configurations)), values, bottom=bottom, color=color, label=phase.title())
+            bottom = [total + value for total, value in zip(bottom, values)]
+        ax.set_xticks(range(len(configurations)))
+        ax.set_xticklabels([LABEL_MAPPING[config] for config in configurations], rotation=20, ha='right',
+                           fontsize=12)
+        ax.set_title(f'{endpoint.title()} Endpoint')
+        ax.set_ylabel('Time per Request (ms)')
+        ax.grid(True, axis='y', linestyle='--', alpha=0.6)
+        ax.legend(fontsize=12)
+
+    plt.tight_layout()
+
+    # Save plot as PNG file
+    plt.savefig(plot_filename)
+    plt.close(fig)
+
+
+def plot_tier_losses(tier_losses, plot_filename='tracing_tier_losses.png'):
+    # Stacked bars of the throughput lost per tracing layer, for every language and endpoint
+    layers = list(TRACING_LAYERS.values())
+    layer_colors = [ERROR_COLORS[tier] for tier in TRACING_LAYERS]
+    labels = [f'{lang.title()} {endpoint}' for lang, endpoint in zip(tier_losses['language'], tier_losses['endpoint'])]
+    positions = range(len(labels))
+
+    fig, ax = plt.subplots(figsize=(12, max(6, len(labels) * 0.6)))
+
+    left = [0] * len(labels)
+    for layer, color in zip(layers, layer_colors):
+        values = tier_losses[f'{layer} Loss (%)'].tolist()
+        ax.barh(positions, values, left=left, color=color, edgecolor='black', label=layer)
+        left = [offset + value for offset, value in zip(left, values)]
+
+    ax.set_yticks(positions)
+    ax.set_yticklabels(labels)
+    ax.set_xlabel('Throughput Loss (% of Standard)')
+    ax.legend(loc='lower right')
+    ax.grid(True, axis='x', linestyle='--', alpha=0.6)
+
+    plt.tight_layout()
+
+    # Save plot as PNG file
+    plt.savefig(plot_filename)
+    plt.close(fig)
+
+
+def plot_aggregated_RPS_across_endpoints(stats_df, plot_filename='aggregated_RPS_across_endpoints.png'):
 
     # Ensure the configurations are in the desired order
-    order = ['standard', 'otel', 'elastic']
+    order = configuration_order(stats_df)
+    stats_df = stats_df.copy()
     stats_df['Configuration'] = pd.Categorical(stats_df['Configuration'], categories=order, ordered=True)
     stats_df = stats_df.sort_values('Configuration')
 
-    # Define colors for each variation and error bars
-    error_colors = {
-        'standard': 'lightblue',  # blue
-        'otel': 'lightcoral',  # orange
-        'elastic': 'lightgreen'  # green
-    }
-    error_colors = {
-        'standard': 'lightblue',  # blue
-        'otel': 'lightcoral',  # orange
-        'elastic': 'lightgreen'  # green
-    }
-
-    # Define label mapping
-    label_mapping = {
-        'standard': 'Standard',
-        'otel': 'OpenTelemetry',
-        'elastic': 'Elastic APM'
-    }
 
     # Get unique endpoints
     endpoints = stats_df['Endpoint'].unique()
 
-    # Create a figure with 4 subplots
-    fig, axs = plt.subplots(2, 2, figsize=(16, 12))
-    axs = axs.flatten()
+    # Create a figure with one subplot per endpoint
+    fig, axs = endpoint_subplots(len(endpoints), figsize=(16, 6))
 
     # Iterate over each endpoint to create subplots
     for ax, endpoint in zip(axs, endpoints):
@@ -86,12 +354,12 @@ def plot_aggregated_RPS_across_endpoints(file_path):
         # Plot the error bars horizontally
         for pos, avg, min_val, max_val, var in zip(positions, avg_rps, min_rps, max_rps, variations):
             ax.errorbar(avg, pos, xerr=[[avg - min_val], [max_val - avg]], fmt='o', capsize=5,
-                        color='black', ecolor=error_colors[var], elinewidth=2, markeredgewidth=2)
+                        color='black', ecolor=ERROR_COLORS[var], elinewidth=2, markeredgewidth=2)
 
         # Labeling
         ax.set_title(f'{endpoint.title()} Endpoint')
         ax.set_yticks(positions)
-        ax.set_yticklabels([label_mapping[var] for var in variations])
+        ax.set_yticklabels([LABEL_MAPPING[var] for var in variations])
         ax.set_ylabel('Configuration')
         ax.set_xlabel('Requests per Second')
 
@@ -101,42 +369,31 @@ def plot_aggregated_RPS_across_endpoints(file_path):
     plt.tight_layout()
 
     # Save plot as PNG file
-    plot_filename = 'aggregated_RPS_across_endpoints.png'
     plt.savefig(plot_filename)
     plt.close(fig)
 
 
-def plot_aggregated_RPS_across_variations(file_path):
-    # Calculate statistics
-    stats_df = calculate_targetRPS_stats(file_path)
+def plot_aggregated_RPS_across_variations(stats_df, plot_filename='aggregated_RPS_across_variations_boxplot.png'):
 
     # Ensure the configurations are in the desired order
-    order = ['standard', 'otel', 'elastic']
+    order = configuration_order(stats_df)
+    stats_df = stats_df.copy()
     stats_df['Configuration'] = pd.Categorical(stats_df['Configuration'], categories=order, ordered=True)
     stats_df = stats_df.sort_values('Configuration')
 
-    # Define label mapping
-    label_mapping = {
-        'standard': 'Standard',
-        'otel': 'OpenTelemetry',
-        'elastic': 'Elastic APM'
-    }
 
-    # Define colors for each configuration
-    colors = ['lightblue', 'lightcoral', 'lightgreen']
-    color_mapping = dict(zip(order, colors))
 
     # Create a figure for the boxplot
     fig, ax = plt.subplots(figsize=(10, 6))
 
     # Create the boxplot
     box_data = [stats_df[stats_df['Configuration'] == config]['Average Target RPS'] for config in order]
-    box = ax.boxplot(box_data, labels=[label_mapping[config] for config in order], patch_artist=True, showfliers=True,
+    box = ax.boxplot(box_data, labels=[LABEL_MAPPING[config] for config in order], patch_artist=True, showfliers=True,
                      widths=(0.2))
 
     # Color the boxes
     for patch, config in zip(box['boxes'], order):
-        patch.set_facecolor(color_mapping[config])
+        patch.set_facecolor(ERROR_COLORS[config])
         patch.set_edgecolor('black')
 
     # Color the median lines
@@ -188,17 +445,16 @@ def plot_aggregated_RPS_across_variations(file_path):
 
     # Save plot as PNG file
     plt.tight_layout(rect=[0, 0, 1, 0.96])
-    plot_filename = 'aggregated_RPS_across_variations_boxplot.png'
     plt.savefig(plot_filename)
     plt.close(fig)
 
 
-def plot_aggregated_RPS_across_variations_horizontal(file_path):
-    # Calculate statistics
-    stats_df = calculate_targetRPS_stats(file_path)
+def plot_aggregated_RPS_across_variations_horizontal(stats_df,
+                                                     plot_filename='aggregated_RPS_across_variations_horizontal.png'):
 
     # Ensure the configurations are in the desired order
-    order = ['standard', 'otel', 'elastic']
+    order = configuration_order(stats_df)
+    stats_df = stats_df.copy()
     stats_df['Configuration'] = pd.Categorical(stats_df['Configuration'], categories=order, ordered=True)
     stats_df = stats_df.sort_values('Configuration')
 
@@ -209,24 +465,6 @@ def plot_aggregated_RPS_across_variations_horizontal(file_path):
         'Max Target RPS': 'max'
     }).reset_index()
 
-    # Define colors for each variation and error bars
-    variation_colors = {
-        'standard': '#1f77b4',  # blue
-        'otel': '#ff7f0e',  # orange
-        'elastic': '#2ca02c'  # green
-    }
-    error_colors = {
-        'standard': 'lightblue',  # blue
-        'otel': 'lightcoral',  # orange
-        'elastic': 'lightgreen'  # green
-    }
-
-    # Define label mapping
-    label_mapping = {
-        'standard': 'Standard',
-        'otel': 'OpenTelemetry',
-        'elastic': 'Elastic APM'
-    }
 
     # Create a figure for the aggregated RPS across variations
     fig, ax = plt.subplots(figsize=(10, 6))
@@ -241,12 +479,12 @@ def plot_aggregated_RPS_across_variations_horizontal(file_path):
     # Plot the error bars horizontally
     for pos, avg, min_val, max_val, var in zip(positions, avg_rps, min_rps, max_rps, variations):
         ax.errorbar(avg, pos, xerr=[[avg - min_val], [max_val - avg]], fmt='o', capsize=5,
-                    color='black', ecolor=error_colors[var], elinewidth=2, markeredgewidth=2)
+                    color='black', ecolor=ERROR_COLORS[var], elinewidth=2, markeredgewidth=2)
 
     # Labeling
     # ax.set_title('Aggregated RPS Across Variations')
     ax.set_yticks(positions)
-    ax.set_yticklabels([label_mapping[var] for var in variations])
+    ax.set_yticklabels([LABEL_MAPPING[var] for var in variations])
     ax.set_ylabel('Variations')
     ax.set_xlabel('Requests per Second')
 
@@ -256,180 +494,116 @@ def plot_aggregated_RPS_across_variations_horizontal(file_path):
     plt.tight_layout()
 
     # Save plot as PNG file
-    plot_filename = 'aggregated_RPS_across_variations_horizontal.png'
     plt.savefig(plot_filename)
     plt.close(fig)
 
 
-def plot_targetRPS_stats_error_bars(file_path):
-    # Calculate statistics
-    stats_df = calculate_targetRPS_stats(file_path)
+def plot_targetRPS_error_bars(subset, plot_filename):
+    # Error bars of one language and endpoint
 
     # Ensure the configurations are in the desired order
-    order = ['standard', 'otel', 'elastic']
-    stats_df['Configuration'] = pd.Categorical(stats_df['Configuration'], categories=order, ordered=True)
-    stats_df = stats_df.sort_values('Configuration')
-
-    # Get unique languages and endpoints
-    languages = stats_df['Language'].unique()
-    endpoints = stats_df['Endpoint'].unique()
-
-    # Define colors for each variation and error bars
-    error_colors = {
-        'standard': 'lightblue',  # blue
-        'otel': 'lightcoral',  # orange
-        'elastic': 'lightgreen'  # green
-    }
-    error_colors = {
-        'standard': 'lightblue',  # blue
-        'otel': 'lightcoral',  # orange
-        'elastic': 'lightgreen'  # green
-
-    }
-
-    # Define label mapping
-    label_mapping = {
-        'standard': 'Standard',
-        'otel': 'OpenTelemetry',
-        'elastic': 'Elastic APM'
-    }
-
-    # Iterate over each language and endpoint to create separate plots
-    for lang in languages:
-        for endpoint in endpoints:
-            subset = stats_df[(stats_df['Language'] == lang) & (stats_df['Endpoint'] == endpoint)]
-
-            if subset.empty:
-                continue
+    order = configuration_order(subset)
+    subset = subset.copy()
+    subset['Configuration'] = pd.Categorical(subset['Configuration'], categories=order, ordered=True)
+    subset = subset.sort_values('Configuration')
 
-            # Set up the figure and axis
-            fig, ax = plt.subplots(figsize=(8, 6))
 
-            # Plot the error bars for average, min, and max targetRPS
-            variations = subset['Configuration'].tolist()
-            avg_rps = subset['Average Target RPS'].tolist()
-            min_rps = subset['Min Target RPS'].tolist()
-            max_rps = subset['Max Target RPS'].tolist()
-            positions = range(len(variations))
+    # Set up the figure and axis
+    fig, ax = plt.subplots(figsize=(8, 6))
 
-            # Plot the error bars
-            for pos, avg, min_val, max_val, var in zip(positions, avg_rps, min_rps, max_rps, variations):
-                ax.errorbar(pos, avg, yerr=[[avg - min_val], [max_val - avg]], fmt='o', capsize=5,
-                            color='black', ecolor=error_colors[var], elinewidth=2, markeredgewidth=2)
+    # Plot the error bars for average, min, and max targetRPS
+    variations = subset['Configuration'].tolist()
+    avg_rps = subset['Average Target RPS'].tolist()
+    min_rps = subset['Min Target RPS'].tolist()
+    max_rps = subset['Max Target RPS'].tolist()
+    positions = range(len(variations))
 
-            # Labeling
-            # ax.set_title(f'{lang.title()} - {endpoint.title()}')
-            ax.set_xticks(positions)
-            ax.set_xticklabels([label_mapping[var] for var in variations], rotation=45, ha='right')
-            ax.set_xlabel('Applications')
-            ax.set_ylabel('Requests per Second')
+    # Plot the error bars
+    for pos, avg, min_val, max_val, var in zip(positions, avg_rps, min_rps, max_rps, variations):
+        ax.errorbar(pos, avg, yerr=[[avg - min_val], [max_val - avg]], fmt='o', capsize=5,
+                    color='black', ecolor=ERROR_COLORS[var], elinewidth=2, markeredgewidth=2)
 
-            # Add legend
-            # ax.legend(loc='upper right')
+    # Labeling
+    ax.set_xticks(positions)
+    ax.set_xticklabels([LABEL_MAPPING[var] for var in variations], rotation=45, ha='right')
+    ax.set_xlabel('Applications')
+    ax.set_ylabel('Requests per Second')
 
-            # Improve overall plot aesthetics
-            ax.grid(True, linestyle='--', alpha=0.6)
-            plt.tight_layout()
+    # Improve overall plot aesthetics
+    ax.grid(True, linestyle='--', alpha=0.6)
+    plt.tight_layout()
 
-            # Save plot as PNG file
-            plot_filename = f'{PLOT_DIR}/{lang}_{endpoint}_targetRPS.png'
-            plt.savefig(plot_filename)
-            plt.close(fig)
+    # Save plot as PNG file
+    plt.savefig(plot_filename)
+    plt.close(fig)
 
 
-def plot_targetRPS_per_language(file_path):
-    # Calculate statistics
-    stats_df = calculate_targetRPS_stats(file_path)
+def plot_targetRPS_language(language_df, plot_filename, endpoints):
+    # All endpoints of one language, one subplot per endpoint
 
     # Ensure the configurations are in the desired order
-    order = ['standard', 'otel', 'elastic']
-    stats_df['Configuration'] = pd.Categorical(stats_df['Configuration'], categories=order, ordered=True)
-    stats_df = stats_df.sort_values('Configuration')
-
-    # Get unique endpoints and languages
-    endpoints = stats_df['Endpoint'].unique()
-    languages = stats_df['Language'].unique()
-
-    # Define colors for each variation and error bars
-    error_colors = {
-        'standard': 'lightblue',  # blue
-        'otel': 'lightcoral',  # orange
-        'elastic': 'lightgreen'  # green
-    }
+    order = configuration_order(language_df)
+    language_df = language_df.copy()
+    language_df['Configuration'] = pd.Categorical(language_df['Configuration'], categories=order, ordered=True)
+    language_df = language_df.sort_values('Configuration')
 
-    error_colors = {
-        'standard': 'lightblue',  # blue
-        'otel': 'lightcoral',  # orange
-        'elastic': 'lightgreen'  # green
 
-    }
+    # Set up the figure with two subplots per row
+    fig, axs = endpoint_subplots(len(endpoints), figsize=(15, 6))
 
-    # Define label mapping
-    label_mapping = {
-        'standard': 'Standard',
-        'otel': 'OpenTelemetry',
-        'elastic': 'Elastic APM'
-    }
-
-    # Iterate over each language to create separate figures
-    for lang in languages:
-        # Set up the figure with 2x2 subplots
-        fig, axs = plt.subplots(2, 2, figsize=(15, 12))
-        # fig.suptitle(f'Target RPS by Endpoint and Configuration for {lang.title()}')
-
-        # Iterate over each endpoint and subplot position
-        for idx, endpoint in enumerate(endpoints):
-            ax = axs[idx // 2, idx % 2]
-
-            subset = stats_df[(stats_df['Language'] == lang) & (stats_df['Endpoint'] == endpoint)]
+    # Iterate over each endpoint and subplot position
+    for ax, endpoint in zip(axs, endpoints):
 
-            if subset.empty:
-                continue
+        subset = language_df[language_df['Endpoint'] == endpoint]
 
-            # Plot the error bars for average, min, and max targetRPS
-            variations = subset['Configuration'].tolist()
-            avg_rps = subset['Average Target RPS'].tolist()
-            min_rps = subset['Min Target RPS'].tolist()
-            max_rps = subset['Max Target RPS'].tolist()
-            positions = range(len(variations))
+        if subset.empty:
+            continue
 
-            # Plot the error bars
-            for pos, avg, min_val, max_val, var in zip(positions, avg_rps, min_rps, max_rps, variations):
-                ax.errorbar(pos, avg, yerr=[[avg - min_val], [max_val - avg]], fmt='o', capsize=5,
-                            color='black', ecolor=error_colors[var], elinewidth=2, markeredgewidth=2)
+        # Plot the error bars for average, min, and max targetRPS
+        variations = subset['Configuration'].tolist()
+        avg_rps = subset['Average Target RPS'].tolist()
+        min_rps = subset['Min Target RPS'].tolist()
+        max_rps = subset['Max Target RPS'].tolist()
+        positions = range(len(variations))
 
-            # Labeling
-            # ax.set_title(f'{endpoint.title()} Endpoint')
-            ax.set_xticks(positions)
-            ax.set_xticklabels([label_mapping[var] for var in variations], rotation=45, ha='right')
-            ax.set_xlabel('Applications')
-            ax.set_ylabel('Requests per Second')
+        # Plot the error bars
+        for pos, avg, min_val, max_val, var in zip(positions, avg_rps, min_rps, max_rps, variations):
+            ax.errorbar(pos, avg, yerr=[[avg - min_val], [max_val - avg]], fmt='o', capsize=5,
+                        color='black', ecolor=ERROR_COLORS[var], elinewidth=2, markeredgewidth=2)
 
-            # Add legend
-            # ax.legend(loc='upper right')
+        # Labeling
+        ax.set_xticks(positions)
+        ax.set_xticklabels([LABEL_MAPPING[var] for var in variations], rotation=45, ha='right')
+        ax.set_xlabel('Applications')
+        ax.set_ylabel('Requests per Second')
 
-            # Improve overall plot aesthetics
-            ax.grid(True, linestyle='--', alpha=0.6)
+        # Improve overall plot aesthetics
+        ax.grid(True, linestyle='--', alpha=0.6)
 
-        plt.tight_layout(rect=[0, 0.03, 1, 0.95])
+    plt.tight_layout(rect=[0, 0.03, 1, 0.95])
 
-        # Save plot as PNG file
-        plot_filename = f'{PLOT_DIR}/{lang}_All_targetRPS.png'
-        plt.savefig(plot_filename)
-        plt.close(fig)
+    # Save plot as PNG file
+    plt.savefig(plot_filename)
+    plt.close(fig)
 
 
 def calculate_targetRPS_stats(file_path):
-    # Read the data from the CSV file
-    data = pd.read_csv(file_path)
+    # Aggregated once per results file, every caller gets its own copy to sort and modify
+    return results_store.cached(file_path, 'targetRPS_stats', aggregate_targetRPS_stats).copy()
 
+
+def aggregate_targetRPS_stats(data):
     # Ensure the necessary columns are present
     required_columns = ['language', 'configuration', 'endpoint', 'targetRPS']
     if not all(column in data.columns for column in required_columns):
         raise ValueError(f"Input file must contain the following columns: {', '.join(required_columns)}")
 
+    # Runs against a degraded collector are only part of the collector-mode statistics
+    if 'collectorMode' in data.columns:
+        data = data[data['collectorMode'].isna()]
+
     # Group by language, configuration, and endpoint
-    grouped_data = data.groupby(['language', 'configuration', 'endpoint'])
+    grouped_data = data.groupby(['language', 'configuration', 'endpoint'], observed=True)
 
     # Calculate the average, min, and max targetRPS for each group
     stats = grouped_data['targetRPS'].agg(['mean', 'min', 'max']).reset_index()
@@ -437,15 +611,126 @@ def calculate_targetRPS_stats(file_path):
     # Rename the columns for better readability
     stats.columns = ['Language', 'Configuration', 'Endpoint', 'Average Target RPS', 'Min Target RPS', 'Max Target RPS']
 
+    # Plain strings, the plots set their own category order
+    for column in ['Language', 'Configuration', 'Endpoint']:
+        stats[column] = stats[column].astype(str)
+
     return stats
 
 
-def calculate_differences(file_path):
-    # Load the data
-    data = pd.read_csv(file_path)
+def calculate_sampling_stats(file_path):
+    return results_store.cached(file_path, 'sampling_stats', aggregate_sampling_stats).copy()
+
+
+def aggregate_sampling_stats(data):
+    # Target RPS and CPU usage per language, endpoint and head-sampling ratio
+    if 'samplingRatio' not in data.columns:
+        return pd.DataFrame()
+    data = data[data['samplingRatio'].notna() & (data['targetRPS'] > 0)].copy()
+    if data.empty:
+        return pd.DataFrame()
+
+    # CPU usage is close to the calibration threshold at every target, so the cost per request
+    # is what changes with the sampling ratio
+    data['CPU per 1k RPS'] = data['avgCPUUsage'] / data['targetRPS'] * 1000
+
+    stats = data.groupby(['language', 'endpoint', 'samplingRatio'], observed=True).agg(**{
+        'Average Target RPS': ('targetRPS', 'mean'),
+        'Min Target RPS': ('targetRPS', 'min'),
+        'Max Target RPS': ('targetRPS', 'max'),
+        'Average CPU Usage': ('avgCPUUsage', 'mean'),
+        'CPU per 1k RPS': ('CPU per 1k RPS', 'mean'),
+    }).reset_index()
+    for column in ['language', 'endpoint']:
+        stats[column] = stats[column].astype(str)
+
+    return stats
+
+
+def calculate_collector_mode_stats(file_path):
+    return results_store.cached(file_path, 'collector_mode_stats', aggregate_collector_mode_stats).copy()
+
+
+def aggregate_collector_mode_stats(data):
+    # Target RPS and latency per language, endpoint, configuration and collector mode. The runs with a
+    # healthy collector are included as the mode "normal".
+    if 'collectorMode' not in data.columns or data['collectorMode'].isna().all():
+        return pd.DataFrame()
+    data = data.copy()
+    mode_configurations = set(data.loc[data['collectorMode'].notna(), 'configuration'].astype(str))
+    data = data[data['configuration'].astype(str).isin(mode_configurations)]
+    data['collectorMode'] = data['collectorMode'].astype(object).fillna('normal')
+
+    # The modes in the order they were configured, which is the order they were run in
+    order = {mode: index for index, mode in enumerate(dict.fromkeys(['normal'] + list(data['collectorMode'])))}
+
+    stats = data.groupby(['language', 'endpoint', 'configuration', 'collectorMode'], observed=True).agg(**{
+        'Average Target RPS': ('targetRPS', 'mean'),
+        'Min Target RPS': ('targetRPS', 'min'),
+        'Max Target RPS': ('targetRPS', 'max'),
+        'Average p50 (ms)': ('targetP50', 'mean'),
+        'Average p99 (ms)': ('targetP99', 'mean'),
+        'Average Error Rate': ('targetErrorRate', 'mean'),
+    }).reset_index()
+    for column in ['language', 'endpoint', 'configuration', 'collectorMode']:
+        stats[column] = stats[column].astype(str)
+    stats['Mode Order'] = stats['collectorMode'].map(order)
 
-    # Calculate the average RPS for each configuration and endpoint
-    average_rps = data.groupby(['language', 'configuration', 'endpoint']).targetRPS.mean().reset_index()
+    return stats
+
+
+def calculate_timing_stats(file_path):
+    return results_store.cached(file_path, 'timing_stats', aggregate_timing_stats).copy()
+
+
+def aggregate_timing_stats(data):
+    # Mean phase durations at the target RPS per language, endpoint and configuration, for the services
+    # that sent a Server-Timing header. Runs against a degraded collector are left out.
+    if 'timingTotalMs' not in data.columns or data['timingTotalMs'].isna().all():
+        return pd.DataFrame()
+    data = data[data['timingTotalMs'].notna()]
+    if 'collectorMode' in data.columns:
+        data = data[data['collectorMode'].isna()]
+
+    stats = data.groupby(['language', 'endpoint', 'configuration'], observed=True).agg(**{
+        f'{phase.title()} (ms)': (f'timing{phase.title()}Ms', 'mean') for phase in list(TIMING_PHASES) + ['total']
+    }).reset_index()
+    for column in ['language', 'endpoint', 'configuration']:
+        stats[column] = stats[column].astype(str)
+    stats = stats[stats['configuration'].isin(CONFIGURATION_ORDER)]
+
+    return stats
+
+
+def calculate_tier_losses(stats_df):
+    # Throughput lost by each tracing layer in percent of the standard target RPS,
+    # only for languages and endpoints that were calibrated with all tracing tiers
+    pivot_table = stats_df.pivot_table(index=['Language', 'Endpoint'], columns='Configuration',
+                                       values='Average Target RPS')
+    if not all(tier in pivot_table.columns for tier in TRACING_TIERS):
+        return pd.DataFrame()
+    pivot_table = pivot_table.dropna(subset=TRACING_TIERS)
+    # A target RPS of 0 means the tier never reached its target, there is no loss to compute
+    pivot_table = pivot_table[(pivot_table[TRACING_TIERS] != 0).all(axis=1)]
+
+    tier_losses = pd.DataFrame({
+        'language': pivot_table.index.get_level_values('Language'),
+        'endpoint': pivot_table.index.get_level_values('Endpoint'),
+        'standard': pivot_table['standard'].values,
+    })
+    for previous, tier in zip(TRACING_TIERS, TRACING_TIERS[1:]):
+        tier_losses[f'{TRACING_LAYERS[tier]} Loss (%)'] = (
+            (pivot_table[previous] - pivot_table[tier]) / pivot_table['standard'] * 100).values
+    tier_losses['Total Loss (%)'] = ((pivot_table['standard'] - pivot_table['otel']) / pivot_table['standard'] * 100).values
+
+    return tier_losses
+
+
+def calculate_differences(file_path):
+    # The average RPS for each configuration and endpoint comes from the cached statistics
+    average_rps = calculate_targetRPS_stats(file_path).rename(columns={
+        'Language': 'language', 'Configuration': 'configuration', 'Endpoint': 'endpoint',
+        'Average Target RPS': 'targetRPS'})
 
     # Pivot the data to have configurations as columns
     pivot_table = average_rps.pivot_table(index=['language', 'endpoint'], columns='configuration',
@@ -457,6 +742,17 @@ def calculate_differences(file_path):
         'standard']) * 100
     pivot_table['otel_vs_elastic'] = ((pivot_table['otel'] - pivot_table['elastic']) / pivot_table['elastic']) * 100
 
+    # Span processor pipelines compared to the default batch processor
+    for processor in ['otel-simple', 'otel-batch-tuned']:
+        if processor in pivot_table.columns:
+            pivot_table[f"{processor.replace('-', '_')}_vs_otel"] = ((pivot_table[processor] - pivot_table['otel']) /
+                                                                    pivot_table['otel']) * 100
+
+    # The same OpenTelemetry overhead with threaded workers, to compare the concurrency models
+    if 'gthread' in pivot_table.columns and 'gthread-otel' in pivot_table.columns:
+        pivot_table['gthread_otel_vs_gthread'] = ((pivot_table['gthread-otel'] - pivot_table['gthread']) /
+                                                  pivot_table['gthread']) * 100
+
     # Calculate the overall differences across all endpoints
     overall = pivot_table.groupby('language')[['otel', 'elastic', 'standard']].mean().reset_index()
     overall['otel_vs_standard'] = ((overall['otel'] - overall['standard']) / overall['standard']) * 100
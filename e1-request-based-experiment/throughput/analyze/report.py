@@ -0,0 +1,120 @@
+import hashlib
+import inspect
+import json
+import os
+import types
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+import pandas as pd
+
+# Module-level values a plot reads that are part of its key, e.g. label and color mappings
+STYLE_TYPES = (dict, list, tuple, str, int, float, bool)
+
+
+class Figure:
+    # One output file, drawn by `plot(data, output, **params)`.
+    # The key covers the data slice, the parameters, the source of the plotting function and of the helpers it
+    # calls, the module-level styling they read and the rcParams, so a figure is only rendered again when one
+    # of them changed.
+
+    def __init__(self, output, plot, data, **params):
+        self.output = output
+        self.plot = plot
+        self.data = data
+        self.params = params
+
+    def key(self):
+        sha256 = hashlib.sha256()
+        sha256.update(inspect.getsource(self.plot).encode())
+        sha256.update(json.dumps(dependencies(self.plot), sort_keys=True, default=str).encode())
+        sha256.update(json.dumps(sorted(matplotlib.rcParams.items()), default=str).encode())
+        sha256.update(json.dumps([str(column) for column in self.data.columns]).encode())
+        sha256.update(pd.util.hash_pandas_object(self.data, index=False).values.tobytes())
+        sha256.update(json.dumps(self.params, sort_keys=True, default=str).encode())
+        return sha256.hexdigest()
+
+    def render(self):
+        self.plot(self.data, self.output, **self.params)
+        return self.output
+
+
+def _global_names(code):
+    names = set(code.co_names)
+    for constant in code.co_consts:
+        if isinstance(constant, types.CodeType):
+            names |= _global_names(constant)
+    return names
+
+
+def dependencies(function):
+    # The functions of the same module that `function` calls (by their source) and the module-level styling
+    # values it and they read, by name
+    found, pending = {}, [function]
+    while pending:
+        current = pending.pop()
+        for name in sorted(_global_names(current.__code__)):
+            if name in found or name not in current.__globals__:
+                continue
+            value = current.__globals__[name]
+            if isinstance(value, types.FunctionType) and value.__module__ == function.__module__:
+                found[name] = inspect.getsource(value)
+                pending.append(value)
+            elif isinstance(value, STYLE_TYPES):
+                found[name] = value
+    return found
+
+
+def _render(figure):
+    return figure.render()
+
+
+def load_manifest(manifest_path):
+    if not os.path.isfile(manifest_path):
+        return {}
+    with open(manifest_path) as file:
+        return json.load(file)
+
+
+def save_manifest(manifest_path, manifest):
+    # Write to a temporary file first, so an interrupted run does not leave a broken manifest
+    temporary_path = f"{manifest_path}.tmp"
+    with open(temporary_path, "w") as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(temporary_path, manifest_path)
+
+
+def build(figures, manifest_path, max_workers=None, force=False):
+    # Render the figures that are missing or out of date in a process pool.
+    # Returns the outputs that were rendered and the ones that were skipped.
+    manifest = load_manifest(manifest_path)
+    keys = {figure.output: figure.key() for figure in figures}
+
+    pending, skipped = [], []
+    for figure in figures:
+        if force or manifest.get(figure.output) != keys[figure.output] or not os.path.isfile(figure.output):
+            pending.append(figure)
+        else:
+            skipped.append(figure.output)
+
+    rendered, failed = [], []
+    if pending:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(_render, figure): figure.output for figure in pending}
+            for future in as_completed(futures):
+                output = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Failed to render {output}: {e}")
+                    failed.append(output)
+                    continue
+                manifest[output] = keys[output]
+                rendered.append(output)
+                # Keep the manifest current, so figures rendered before an interruption are not redone
+                save_manifest(manifest_path, manifest)
+
+    if failed:
+        raise RuntimeError(f"Failed to render {len(failed)} figures: {', '.join(failed)}")
+
+    return rendered, skipped
@@ -0,0 +1,64 @@
+import hashlib
+import os
+
+import pandas as pd
+
+CACHE_DIR = ".cache"
+# Bump when an aggregation changes, so frames cached by an older version are not reused
+CACHE_VERSION = 2
+
+# Column types of the calibration results, so the cached frame does not depend on type inference
+CATEGORY_COLUMNS = ['language', 'configuration', 'endpoint']
+
+_hashes = {}
+_frames = {}
+
+
+def file_hash(file_path):
+    # Hashing is skipped when the file did not change since it was last hashed in this process
+    stat = os.stat(file_path)
+    signature = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+    if signature not in _hashes:
+        sha256 = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b''):
+                sha256.update(chunk)
+        _hashes[signature] = sha256.hexdigest()
+    return _hashes[signature]
+
+
+def _read_csv(file_path):
+    data = pd.read_csv(file_path)
+    for column in CATEGORY_COLUMNS:
+        if column in data.columns:
+            data[column] = data[column].astype('category')
+    return data
+
+
+def _memoize(file_path, name, compute):
+    key = (file_hash(file_path), name)
+    if key in _frames:
+        return _frames[key]
+
+    cache_path = os.path.join(CACHE_DIR, f'{name}_v{CACHE_VERSION}_{key[0]}.parquet')
+    if os.path.isfile(cache_path):
+        frame = pd.read_parquet(cache_path)
+    else:
+        frame = compute()
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        frame.to_parquet(cache_path, index=False)
+
+    _frames[key] = frame
+    return frame
+
+
+def load_results(file_path):
+    # The calibration results as a typed columnar frame
+    return _memoize(file_path, 'results', lambda: _read_csv(file_path))
+
+
+def cached(file_path, name, compute):
+    # Memoize `compute(results)` by the hash of the results file, in memory and as a Parquet file
+    # in CACHE_DIR, so every plot and table works from the same frame instead of re-reading the CSV.
+    # Callers that modify the frame must work on a copy.
+    return _memoize(file_path, name, lambda: compute(load_results(file_path)))
@@ -0,0 +1,203 @@
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+
+import docker
+
+import loadgen
+
+# Splits one arrival rate across several native load generators, so the load generator is not the
+# bottleneck at high RPS. Workers run as processes or as containers of the calibrator image, each pinned
+# to its own cores, start together and send interleaved schedules: worker i of n sends at
+# start + (i + k * n) / rate, so the combined stream has the same spacing as a single generator.
+
+WORKER_MODES = ["process", "container"]
+DEFAULT_WORKERS = 1
+DEFAULT_WORKER_MODE = "process"
+DEFAULT_WORKER_IMAGE = "micro-benchmark-calibrator"
+DEFAULT_WORKER_NETWORK = "telemetry"
+BARRIER_TIMEOUT = 60  # Seconds
+# Containers cannot share a barrier, they wait for a start time this far in the future instead
+CONTAINER_START_DELAY = 10  # Seconds
+RESULT_PREFIX = "RESULT "
+
+
+def split_cpus(cpus, workers):
+    # Consecutive cores per worker; with fewer cores than workers, workers share cores round-robin
+    if not cpus:
+        return [None] * workers
+    cpus = sorted(cpus)
+    if len(cpus) < workers:
+        return [[cpus[i % len(cpus)]] for i in range(workers)]
+    size, remainder = divmod(len(cpus), workers)
+    shares, start = [], 0
+    for i in range(workers):
+        end = start + size + (1 if i < remainder else 0)
+        shares.append(cpus[start:end])
+        start = end
+    return shares
+
+
+def worker_schedules(rps, timeunit, workers):
+    # Rate (per second) and offset of every worker
+    rate = rps / loadgen.parse_timeunit(timeunit)
+    return [(rate / workers, i / rate) for i in range(workers)]
+
+
+def _run_worker_process(index, url, rate, duration, offset, connections, timeout, cpus, barrier, stop_event,
+                        results):
+    # Results arrive in the order the workers finish, so each one carries the index of its worker
+    if cpus is not None:
+        os.sched_setaffinity(0, cpus)
+    try:
+        barrier.wait(BARRIER_TIMEOUT)
+    except threading.BrokenBarrierError:
+        results.put((index, None))
+        return
+    result = loadgen.run(url, rate, duration, "1s", connections, timeout, stop_event=stop_event, offset=offset)
+    results.put((index, result.to_dict()))
+
+
+def run_processes(url, schedules, duration, cpu_shares, connections, timeout, stop_event=None):
+    # The workers wait on a barrier until all of them are up, then start their schedules at once
+    barrier = multiprocessing.Barrier(len(schedules))
+    worker_stop = multiprocessing.Event()
+    results = multiprocessing.Queue()
+
+    processes = [multiprocessing.Process(target=_run_worker_process,
+                                         args=(index, url, rate, duration, offset, connections, timeout, cpus,
+                                               barrier, worker_stop, results))
+                 for index, ((rate, offset), cpus) in enumerate(zip(schedules, cpu_shares))]
+    for process in processes:
+        process.start()
+
+    # One slot per worker, a worker that never reports keeps None
+    collected = [None] * len(processes)
+    received = 0
+    while received < len(processes):
+        if stop_event is not None and stop_event.is_set():
+            worker_stop.set()
+        try:
+            index, result = results.get(timeout=1)
+            collected[index] = result
+            received += 1
+        except queue.Empty:
+            # A worker that crashed never puts its result
+            if not any(process.is_alive() for process in processes) and results.empty():
+                break
+    for process in processes:
+        process.join()
+    return collected
+
+
+def run_containers(url, schedules, duration, cpu_shares, connections, timeout, stop_event=None, image=None,
+                   network=None):
+    # One container of the calibrator image per worker, on the same host clock
+    client = docker.from_env()
+    start_at = time.time() + CONTAINER_START_DELAY
+
+    containers = []
+    try:
+        for i, ((rate, offset), cpus) in enumerate(zip(schedules, cpu_shares)):
+            command = ["python", "coordinator.py", "--url", url, "--rate", str(rate), "--duration", str(duration),
+                       "--offset", str(offset), "--connections", str(connections), "--timeout", str(timeout),
+                       "--start-at", str(start_at)]
+            containers.append(client.containers.run(
+                image or DEFAULT_WORKER_IMAGE,
+                command=command,
+                name=f"loadgen-worker-{os.getpid()}-{i}",
+                cpuset_cpus=",".join(str(cpu) for cpu in cpus) if cpus is not None else None,
+                network=network or DEFAULT_WORKER_NETWORK,
+                detach=True,
+            ))
+
+        running = list(containers)
+        stopped = False
+        while running:
+            time.sleep(1)
+            if not stopped and stop_event is not None and stop_event.is_set():
+                # The workers stop their schedules and still print their results
+                for container in running:
+                    container.kill(signal="SIGINT")
+                stopped = True
+            for container in list(running):
+                container.reload()
+                if container.status in ("exited", "dead"):
+                    running.remove(container)
+
+        collected = []
+        for container in containers:
+            lines = container.logs(stdout=True, stderr=False).decode().splitlines()
+            result_lines = [line for line in lines if line.startswith(RESULT_PREFIX)]
+            collected.append(json.loads(result_lines[-1][len(RESULT_PREFIX):]) if result_lines else None)
+        return collected
+    finally:
+        for container in containers:
+            container.remove(force=True)
+
+
+def run(url, rps, duration, timeunit="1s", workers=DEFAULT_WORKERS, mode=DEFAULT_WORKER_MODE, cpus=None,
+        connections=loadgen.DEFAULT_CONNECTIONS, timeout=loadgen.DEFAULT_TIMEOUT, stop_event=None, image=None,
+        network=None):
+    # Same result as loadgen.run, merged from all workers. Connections are divided among the workers.
+    if mode not in WORKER_MODES:
+        raise ValueError(f"Unknown worker mode {mode}, expected one of {WORKER_MODES}")
+    schedules = worker_schedules(rps, timeunit, workers)
+    cpu_shares = split_cpus(cpus, workers)
+    worker_connections = max(1, connections // workers)
+
+    if mode == "process":
+        collected = run_processes(url, schedules, duration, cpu_shares, worker_connections, timeout, stop_event)
+    else:
+        collected = run_containers(url, schedules, duration, cpu_shares, worker_connections, timeout, stop_event,
+                                   image, network)
+
+    result = loadgen.LoadResult()
+    for i, worker_result in enumerate(collected):
+        if worker_result is None:
+            print(f"Load generator worker {i} did not return a result")
+            continue
+        worker_result = loadgen.LoadResult.from_dict(worker_result)
+        print(f"Load generator worker {i}: {worker_result.summary()}")
+        result.merge(worker_result)
+    missing = workers - sum(worker_result is not None for worker_result in collected)
+    if missing:
+        raise RuntimeError(f"{missing} of {workers} load generator workers did not return a result")
+    return result
+
+
+def main():
+    # Entry point of a worker container
+    parser = argparse.ArgumentParser(description="Load generator worker")
+    parser.add_argument("--url", required=True)
+    parser.add_argument("--rate", type=float, required=True, help="Requests per second of this worker")
+    parser.add_argument("--duration", type=float, required=True)
+    parser.add_argument("--offset", type=float, default=0)
+    parser.add_argument("--connections", type=int, default=loadgen.DEFAULT_CONNECTIONS)
+    parser.add_argument("--timeout", type=float, default=loadgen.DEFAULT_TIMEOUT)
+    parser.add_argument("--start-at", type=float, help="Unix time to start at")
+    args = parser.parse_args()
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+
+    if args.start_at is not None:
+        delay = args.start_at - time.time()
+        if delay < 0:
+            print(f"Starting {-delay:.3f}s late")
+        elif stop_event.wait(delay):
+            return
+
+    result = loadgen.run(args.url, args.rate, args.duration, "1s", args.connections, args.timeout,
+                         stop_event=stop_event, offset=args.offset)
+    print(RESULT_PREFIX + json.dumps(result.to_dict()), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import csv
+import os
+import threading
+import time
+
+SAMPLE_FIELDS = ["timestamp", "cpu_percent", "memory_bytes", "memory_limit_bytes", "throttled_periods",
+                 "throttled_time_ns"]
+
+
+def parse_stats(stats, timestamp):
+    cpu_stats = stats.get("cpu_stats", {})
+    precpu_stats = stats.get("precpu_stats", {})
+
+    # The first sample of a stream has no previous sample to compare against
+    if "system_cpu_usage" not in precpu_stats or "system_cpu_usage" not in cpu_stats:
+        return None
+
+    cpu_delta = cpu_stats["cpu_usage"]["total_usage"] - precpu_stats["cpu_usage"]["total_usage"]
+    system_cpu_delta = cpu_stats["system_cpu_usage"] - precpu_stats["system_cpu_usage"]
+    number_cpus = cpu_stats.get("online_cpus", 1)
+    cpu_usage = (cpu_delta / system_cpu_delta) * number_cpus * 100.0 if system_cpu_delta > 0 else 0
+
+    # Same as `docker stats`: exclude the page cache from the memory usage
+    memory_stats = stats.get("memory_stats", {})
+    memory_usage = memory_stats.get("usage", 0)
+    memory_cache = memory_stats.get("stats", {}).get("inactive_file", memory_stats.get("stats", {}).get("cache", 0))
+
+    throttling = cpu_stats.get("throttling_data", {})
+
+    return {
+        "timestamp": timestamp,
+        "cpu_percent": cpu_usage,
+        "memory_bytes": memory_usage - memory_cache,
+        "memory_limit_bytes": memory_stats.get("limit", 0),
+        "throttled_periods": throttling.get("throttled_periods", 0),
+        "throttled_time_ns": throttling.get("throttled_time", 0),
+    }
+
+
+class CpuSampler:
+    # Keeps one `docker stats` stream open for a container and records every sample it delivers
+    # (about one per second), so measurements can be taken over exact time windows
+
+    def __init__(self, client, container_id):
+        self.client = client
+        self.container_id = container_id
+        self.samples = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            # The stream delivers a sample every second, after which the thread notices the stop
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        stream = self.client.api.stats(self.container_id, stream=True, decode=True)
+        try:
+            for stats in stream:
+                if self._stop_event.is_set():
+                    break
+                sample = parse_stats(stats, time.time())
+                if sample is not None:
+                    with self._lock:
+                        self.samples.append(sample)
+        finally:
+            stream.close()
+
+    def window(self, start, end):
+        with self._lock:
+            return [sample for sample in self.samples if start <= sample["timestamp"] <= end]
+
+    def cpu_usage(self, start, end):
+        return [sample["cpu_percent"] for sample in self.window(start, end)]
+
+    def save(self, filename, start, end, extra=None):
+        # Append the samples of a window to a CSV file, optionally tagged with extra columns (e.g. the RPS)
+        if extra is None:
+            extra = {}
+        headers = list(extra.keys()) + SAMPLE_FIELDS
+
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        write_header = not os.path.isfile(filename)
+        with open(filename, "a", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=headers)
+            if write_header:
+                writer.writeheader()
+            for sample in self.window(start, end):
+                writer.writerow({**extra, **sample})
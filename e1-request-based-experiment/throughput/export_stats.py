@@ -0,0 +1,78 @@
+import time
+
+import requests
+
+DEFAULT_URL = "http://otlp-sink:4319"
+# Mode of a healthy backend, restored after the collector-mode scenarios
+NORMAL_MODE = {"delay_ms": 0, "jitter_ms": 0, "error_rate": 0, "refuse": False}
+# Keys of a collector mode in config.json and the fields of the sink's /mode they set
+MODE_FIELDS = {"delay-ms": "delay_ms", "jitter-ms": "jitter_ms", "error-rate": "error_rate", "refuse": "refuse"}
+# Longer than the 5 second schedule delay of the default batch span processors, so the spans of
+# the last requests of a probe are exported before the totals are read
+DEFAULT_SETTLE = 6  # Seconds
+
+EMPTY_TOTALS = {"exports": 0, "spans": 0, "bytes": 0, "decode_ns": 0, "rejected": 0, "acked_spans": 0,
+                "acked_bytes": 0}
+
+
+def read_totals(url, service):
+    # Totals the OTLP sink received from one service (its OTEL_SERVICE_NAME) since it started
+    try:
+        response = requests.get(f"{url}/stats", timeout=5)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        print(f"Could not read the export statistics from {url}: {e}")
+        return None
+    return {**EMPTY_TOTALS, **response.json().get(service, {})}
+
+
+def exported_per_request(before, after, requests_sent):
+    # Spans and bytes exported during a probe, in total and per request of the load generator. "exported" is
+    # what the sink acknowledged, "received" also counts the exports it rejected, which the exporters retry.
+    if before is None or after is None:
+        return {}
+
+    def per_request(value):
+        return value / requests_sent if requests_sent else 0
+
+    spans = after["acked_spans"] - before["acked_spans"]
+    payload_bytes = after["acked_bytes"] - before["acked_bytes"]
+    received_spans = after["spans"] - before["spans"]
+    received_bytes = after["bytes"] - before["bytes"]
+    exports = after["exports"] - before["exports"]
+    return {
+        "exports": exports,
+        "rejected_exports": after["rejected"] - before["rejected"],
+        "exported_spans": spans,
+        "exported_bytes": payload_bytes,
+        "exported_spans_per_request": per_request(spans),
+        "exported_bytes_per_request": per_request(payload_bytes),
+        "received_spans": received_spans,
+        "received_bytes": received_bytes,
+        "received_spans_per_request": per_request(received_spans),
+        "received_bytes_per_request": per_request(received_bytes),
+        "decode_us_per_export": (after["decode_ns"] - before["decode_ns"]) / exports / 1000 if exports else 0,
+    }
+
+
+def set_mode(url, collector_mode):
+    # Make the sink slow, lossy or unreachable, fields that are not given are reset to a healthy backend
+    mode = {**NORMAL_MODE, **{field: collector_mode[key] for key, field in MODE_FIELDS.items() if key in collector_mode}}
+    response = requests.put(f"{url}/mode", json=mode, timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+
+def measure(url, service, settle=DEFAULT_SETTLE):
+    # Returns a function that finishes the measurement once the probe is done.
+    # Services that never exported anything (e.g. uninstrumented ones) do not wait for the settle time.
+    before = read_totals(url, service)
+
+    def finish(requests_sent):
+        if before is None:
+            return {}
+        if read_totals(url, service) != EMPTY_TOTALS:
+            time.sleep(settle)
+        return exported_per_request(before, read_totals(url, service), requests_sent)
+
+    return finish
@@ -0,0 +1,96 @@
+class LatencyHistogram:
+    # HDR-style log-linear histogram of integer values (microseconds).
+    # Values below 2^significant_bits are stored exactly, larger values keep `significant_bits`
+    # bits of precision, so the relative error is below 2^-(significant_bits - 1).
+    # Buckets are kept sparse, which makes histograms cheap to merge and to serialize.
+
+    def __init__(self, significant_bits=7):
+        self.significant_bits = significant_bits
+        self.counts = {}
+        self.total_count = 0
+        self.total_sum = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        sub_buckets = 1 << self.significant_bits
+        if value < sub_buckets:
+            return value
+        shift = value.bit_length() - self.significant_bits
+        half = sub_buckets >> 1
+        return sub_buckets + (shift - 1) * half + ((value >> shift) - half)
+
+    def _bucket_range(self, index):
+        sub_buckets = 1 << self.significant_bits
+        if index < sub_buckets:
+            return index, index
+        half = sub_buckets >> 1
+        shift = (index - sub_buckets) // half + 1
+        mantissa = (index - sub_buckets) % half + half
+        low = mantissa << shift
+        return low, low + (1 << shift) - 1
+
+    def record(self, value, count=1):
+        value = max(0, int(value))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total_count += count
+        self.total_sum += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        if other.significant_bits != self.significant_bits:
+            raise ValueError("Cannot merge histograms with a different precision")
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total_count += other.total_count
+        self.total_sum += other.total_sum
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def percentile(self, percentile):
+        if self.total_count == 0:
+            return 0
+        target = max(1, int(round(self.total_count * percentile / 100.0)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                low, high = self._bucket_range(index)
+                # Report the middle of the bucket, clamped to the recorded extremes
+                return min(max((low + high) // 2, self.min), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total_sum / self.total_count if self.total_count else 0
+
+    def summary(self, percentiles=(50, 90, 99)):
+        # Summary in milliseconds
+        result = {f"p{p}": self.percentile(p) / 1000.0 for p in percentiles}
+        result["mean"] = self.mean() / 1000.0
+        result["max"] = (self.max or 0) / 1000.0
+        result["count"] = self.total_count
+        return result
+
+    def to_dict(self):
+        return {
+            "significant_bits": self.significant_bits,
+            "counts": {str(index): count for index, count in self.counts.items()},
+            "total_count": self.total_count,
+            "total_sum": self.total_sum,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @staticmethod
+    def from_dict(data):
+        histogram = LatencyHistogram(data["significant_bits"])
+        histogram.counts = {int(index): count for index, count in data["counts"].items()}
+        histogram.total_count = data["total_count"]
+        histogram.total_sum = data["total_sum"]
+        histogram.min = data["min"]
+        histogram.max = data["max"]
+        return histogram
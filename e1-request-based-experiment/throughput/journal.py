@@ -0,0 +1,77 @@
+import json
+import os
+import threading
+import time
+
+
+def scenario_key(scenario):
+    key = f"{scenario['host']}/{scenario['endpoint']}"
+    if scenario.get("collectorMode"):
+        key += f"@{scenario['collectorMode']}"
+    return key
+
+
+class Journal:
+    # Append-only JSON lines file with every probe and every finished scenario.
+    # Each entry is flushed and fsynced before the calibration moves on, so a crash loses at most
+    # the probe that was running.
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _append(self, entry):
+        entry = {"time": time.time(), **entry}
+        with self._lock, open(self.path, "a") as file:
+            file.write(json.dumps(entry) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+    def record_start(self, config):
+        self._append({"type": "start", "config": config})
+
+    def record_probe(self, key, rps, exceeds_usage, avg_cpu_usage, load_summary):
+        self._append({"type": "probe", "key": key, "rps": rps, "exceeds": exceeds_usage, "cpu": avg_cpu_usage,
+                      "latency": load_summary})
+
+    def record_scenario(self, key, scenario):
+        self._append({"type": "scenario", "key": key, "scenario": scenario})
+
+    def load(self):
+        # Returns the config of the last start entry, the finished scenarios by key
+        # and the probes by key and RPS
+        config, finished, probes = None, {}, {}
+        if not os.path.isfile(self.path):
+            return config, finished, probes
+
+        with open(self.path) as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line cut short by a crash
+                    continue
+                if entry["type"] == "start":
+                    config = entry["config"]
+                elif entry["type"] == "probe":
+                    probes.setdefault(entry["key"], {})[entry["rps"]] = (entry["exceeds"], entry["cpu"],
+                                                                         entry["latency"])
+                elif entry["type"] == "scenario":
+                    finished[entry["key"]] = entry["scenario"]
+
+        # Terminate a line cut short by a crash, so new entries start on a line of their own
+        with open(self.path, "rb+") as file:
+            file.seek(0, os.SEEK_END)
+            if file.tell() > 0:
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b"\n":
+                    file.write(b"\n")
+
+        return config, finished, probes
+
+    def archive(self):
+        # Move a previous journal out of the way when starting a fresh campaign
+        if os.path.isfile(self.path):
+            suffix = time.strftime("%Y-%m-%d_%H-%M-%S", time.localtime(os.path.getmtime(self.path)))
+            root, extension = os.path.splitext(self.path)
+            os.rename(self.path, f"{root}_{suffix}{extension}")
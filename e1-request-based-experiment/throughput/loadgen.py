@@ -0,0 +1,181 @@
+import asyncio
+import time
+
+import aiohttp
+
+from histogram import LatencyHistogram
+
+DEFAULT_CONNECTIONS = 1000
+DEFAULT_TIMEOUT = 10  # Seconds
+
+
+def parse_server_timing(header):
+    # e.g. "handler;dur=1.2, span;dur=0.3" -> {"handler": 1200, "span": 300} in microseconds
+    phases = {}
+    for metric in header.split(","):
+        name, _, params = metric.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur" and name:
+                try:
+                    phases[name] = float(value) * 1000
+                except ValueError:
+                    pass
+    return phases
+
+
+def parse_timeunit(timeunit):
+    # k6 style time units, e.g. "1s" or "1m"
+    units = {"ms": 0.001, "s": 1, "m": 60}
+    for suffix in sorted(units, key=len, reverse=True):
+        if timeunit.endswith(suffix):
+            return float(timeunit[:-len(suffix)] or 1) * units[suffix]
+    return float(timeunit)
+
+
+class LoadResult:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.requests = 0
+        self.errors = 0
+        self.status_codes = {}
+        self.per_second = {}
+        # Per-phase durations the service reported in its Server-Timing header
+        self.phases = {}
+        self.start = None
+        self.end = None
+
+    def record_phases(self, phases_us):
+        for phase, duration_us in phases_us.items():
+            self.phases.setdefault(phase, LatencyHistogram()).record(duration_us)
+
+    def record(self, latency_us, status, second=None):
+        self.requests += 1
+        self.latency.record(latency_us)
+        if second is not None:
+            latency_sum, count = self.per_second.get(second, (0, 0))
+            self.per_second[second] = (latency_sum + latency_us, count + 1)
+        self.status_codes[status] = self.status_codes.get(status, 0) + 1
+        if status != 200:
+            self.errors += 1
+
+    def merge(self, other):
+        self.latency.merge(other.latency)
+        self.requests += other.requests
+        self.errors += other.errors
+        for status, count in other.status_codes.items():
+            self.status_codes[status] = self.status_codes.get(status, 0) + count
+        for second, (latency_sum, count) in other.per_second.items():
+            own_sum, own_count = self.per_second.get(second, (0, 0))
+            self.per_second[second] = (own_sum + latency_sum, own_count + count)
+        for phase, histogram in other.phases.items():
+            self.phases.setdefault(phase, LatencyHistogram()).merge(histogram)
+        if other.start is not None:
+            self.start = other.start if self.start is None else min(self.start, other.start)
+            self.end = other.end if self.end is None else max(self.end, other.end)
+        return self
+
+    def to_dict(self):
+        # JSON-serializable, to collect the results of load generator workers in other processes or containers
+        return {
+            "latency": self.latency.to_dict(),
+            "requests": self.requests,
+            "errors": self.errors,
+            "status_codes": {str(status): count for status, count in self.status_codes.items()},
+            "per_second": {str(second): list(values) for second, values in self.per_second.items()},
+            "phases": {phase: histogram.to_dict() for phase, histogram in self.phases.items()},
+            "start": self.start,
+            "end": self.end,
+        }
+
+    @staticmethod
+    def from_dict(data):
+        result = LoadResult()
+        result.latency = LatencyHistogram.from_dict(data["latency"])
+        result.requests = data["requests"]
+        result.errors = data["errors"]
+        result.status_codes = {int(status): count for status, count in data["status_codes"].items()}
+        result.per_second = {int(second): tuple(values) for second, values in data["per_second"].items()}
+        result.phases = {phase: LatencyHistogram.from_dict(histogram)
+                         for phase, histogram in data.get("phases", {}).items()}
+        result.start = data["start"]
+        result.end = data["end"]
+        return result
+
+    def latency_series(self):
+        # Mean latency (ms) per second of the run, by the second the requests were scheduled in
+        per_second = dict(self.per_second)
+        return [per_second[second][0] / per_second[second][1] / 1000.0 for second in sorted(per_second)]
+
+    def error_rate(self):
+        return self.errors / self.requests if self.requests else 0
+
+    def summary(self):
+        duration = (self.end - self.start) if self.start is not None else 0
+        summary = {
+            **self.latency.summary(),
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": self.error_rate(),
+            "achieved_rps": self.requests / duration if duration > 0 else 0,
+        }
+        for phase, histogram in self.phases.items():
+            phase_summary = histogram.summary((50, 99))
+            for statistic in ("p50", "p99", "mean"):
+                summary[f"timing_{phase}_{statistic}"] = phase_summary[statistic]
+        return summary
+
+
+async def _send(session, url, scheduled, second, result):
+    # Latency is measured from the scheduled send time rather than the actual one, so a slow server
+    # cannot hide queueing delay by holding back the generator (coordinated omission)
+    try:
+        async with session.get(url) as response:
+            await response.read()
+            status = response.status
+            server_timing = response.headers.get("Server-Timing")
+        if server_timing:
+            result.record_phases(parse_server_timing(server_timing))
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        status = 0
+    result.record((time.perf_counter() - scheduled) * 1_000_000, status, second)
+
+
+async def _generate(url, rate, duration, connections, timeout, result, stop_event, offset=0):
+    connector = aiohttp.TCPConnector(limit=connections)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as session:
+        in_flight = set()
+        total_requests = int(rate * duration)
+        result.start = time.time()
+        start = time.perf_counter()
+
+        # Open loop: request i is sent at start + offset + i / rate, independently of earlier responses
+        for i in range(total_requests):
+            if stop_event is not None and stop_event.is_set():
+                break
+            scheduled = start + offset + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.ensure_future(_send(session, url, scheduled, int(offset + i / rate), result))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
+        if in_flight:
+            await asyncio.gather(*in_flight)
+        result.end = time.time()
+
+    return result
+
+
+def run(url, rps, duration, timeunit="1s", connections=DEFAULT_CONNECTIONS, timeout=DEFAULT_TIMEOUT, result=None,
+        stop_event=None, offset=0):
+    # `result` can be passed in to follow the run while it is in progress,
+    # `stop_event` ends the run early (in-flight requests still complete),
+    # `offset` (seconds) delays the schedule, so several generators can interleave their requests
+    if result is None:
+        result = LoadResult()
+    rate = rps / parse_timeunit(timeunit)
+    return asyncio.run(_generate(url, rate, duration, connections, timeout, result, stop_event, offset))
@@ -1,4 +1,5 @@
 import os.path
+import argparse
 import subprocess
 import docker
 import time
@@ -7,63 +8,191 @@ import threading
 import utils
 import random
 import json
+import signal
+import tempfile
+import loadgen
+import coordinator
+import steady_state
+import scheduler
+import variants
+import export_stats
+from journal import Journal, scenario_key
+from cpu_sampler import CpuSampler
 
 # Configuration
 client = docker.from_env()
+samplers = {}
+samplers_lock = threading.Lock()
+log_lock = threading.Lock()
 
 QUERIES_ENDPOINT_CONFIG = 10
 UPDATES_ENDPOINT_CONFIG = 5
+# Phases of the Server-Timing header of the services (python/flask/server_timing.py)
+DEFAULT_TIMING_PHASES = ["handler", "span", "export", "total"]
 CONFIG_FILE = "config.json"
 
 
-def get_cpu_usage(container_id):
-    client = docker.from_env()
-    container = client.containers.get(container_id)
-    stats = container.stats(stream=False)  # Fetch a single snapshot of the CPU stats
-    cpu_delta = stats["cpu_stats"]["cpu_usage"]["total_usage"] - \
-                stats["precpu_stats"]["cpu_usage"]["total_usage"]
-    system_cpu_delta = stats["cpu_stats"]["system_cpu_usage"] - \
-                       stats["precpu_stats"]["system_cpu_usage"]
-    number_cpus = stats["cpu_stats"]["online_cpus"]
+def get_sampler(container_id):
+    # One stats stream per container, kept open for the whole calibration
+    with samplers_lock:
+        if container_id not in samplers:
+            samplers[container_id] = CpuSampler(client, container_id).start()
+        return samplers[container_id]
 
-    cpu_usage = (cpu_delta / system_cpu_delta) * number_cpus * 100.0 if system_cpu_delta > 0 else 0
-    return cpu_usage
+
+def stop_samplers():
+    for sampler in samplers.values():
+        sampler.stop()
+    samplers.clear()
 
 
 def log_to_file(message):
-    with open(log_file_path, "a") as log_file:
+    with log_lock, open(log_file_path, "a") as log_file:
         log_file.write(f"{message}\n")
 
 
-def run_test(rps, duration, url, timeunit="1s"):
-    k6_command_template = f"k6 run --vus {rps} -e RPS={rps} -e DURATION={duration} -e TIMEUNIT={timeunit} -e URL={url} script.js"
-    subprocess.run(k6_command_template, shell=True)
-
+def run_test(rps, duration, url, timeunit="1s", load_generator=None, stop_event=None, load_result=None):
+    if load_generator is None:
+        load_generator = {}
+
+    # With parallel calibration the load generator is pinned to the cores of its slot
+    cpus = load_generator.get("cpus")
+    if isinstance(cpus, str):
+        cpus = scheduler.parse_cpuset(cpus)
+
+    if load_generator.get("type", "k6") == "native" and load_generator.get("workers", 1) > 1:
+        # The rate is split across worker processes or containers, each on its own cores
+        result = coordinator.run(url, rps, duration, timeunit,
+                                 workers=load_generator["workers"],
+                                 mode=load_generator.get("worker-mode", coordinator.DEFAULT_WORKER_MODE),
+                                 cpus=cpus,
+                                 connections=load_generator.get("connections", loadgen.DEFAULT_CONNECTIONS),
+                                 timeout=load_generator.get("timeout", loadgen.DEFAULT_TIMEOUT),
+                                 stop_event=stop_event,
+                                 image=load_generator.get("worker-image"),
+                                 network=load_generator.get("worker-network"))
+        return result.summary()
+
+    if load_generator.get("type", "k6") == "native":
+        if cpus is not None:
+            # Runs in the probe's load thread, on Linux this only pins that thread
+            os.sched_setaffinity(0, cpus)
+        result = loadgen.run(url, rps, duration, timeunit,
+                             connections=load_generator.get("connections", loadgen.DEFAULT_CONNECTIONS),
+                             timeout=load_generator.get("timeout", loadgen.DEFAULT_TIMEOUT),
+                             result=load_result, stop_event=stop_event)
+        return result.summary()
+
+    with tempfile.TemporaryDirectory() as summary_dir:
+        summary_path = os.path.join(summary_dir, "summary.json")
+        k6_command = ["k6", "run", "--vus", str(rps), "-e", f"RPS={rps}", "-e", f"DURATION={duration}",
+                      "-e", f"TIMEUNIT={timeunit}", "-e", f"URL={url}",
+                      "--summary-trend-stats", "avg,med,p(90),p(99),max", "--summary-export", summary_path,
+                      "script.js"]
+        if cpus is not None:
+            k6_command = ["taskset", "-c", scheduler.format_cpuset(cpus)] + k6_command
+        k6_process = subprocess.Popen(k6_command)
+        while k6_process.poll() is None:
+            if stop_event is None:
+                k6_process.wait()
+            elif stop_event.wait(1):
+                # k6 stops gracefully on SIGINT and still writes the summary
+                k6_process.send_signal(signal.SIGINT)
+                k6_process.wait()
+        return read_k6_summary(summary_path)
+
+
+def read_k6_summary(summary_path):
+    # Convert the k6 summary export to the same format as loadgen.LoadResult.summary()
+    if not os.path.isfile(summary_path):
+        return None
+    with open(summary_path, "r") as file:
+        metrics = json.load(file)["metrics"]
+
+    durations = metrics.get("http_req_duration", {})
+    requests = metrics.get("http_reqs", {})
+    failed = metrics.get("http_req_failed", {})
+    # Trends of the Server-Timing phases recorded by script.js
+    timings = {}
+    for name, metric in metrics.items():
+        if name.startswith("server_timing_"):
+            phase = name[len("server_timing_"):]
+            timings[f"timing_{phase}_p50"] = metric.get("med", 0)
+            timings[f"timing_{phase}_p99"] = metric.get("p(99)", 0)
+            timings[f"timing_{phase}_mean"] = metric.get("avg", 0)
+    return {
+        "p50": durations.get("med", 0),
+        "p90": durations.get("p(90)", 0),
+        "p99": durations.get("p(99)", 0),
+        "mean": durations.get("avg", 0),
+        "max": durations.get("max", 0),
+        "count": requests.get("count", 0),
+        "requests": requests.get("count", 0),
+        "errors": failed.get("passes", 0),
+        "error_rate": failed.get("value", 0),
+        "achieved_rps": requests.get("rate", 0),
+        **timings,
+    }
+
+
+def monitor_cpu_usage(container_id, duration, series_path=None, rps=None):
+    sampler = get_sampler(container_id)
+    start = time.time()
+    time.sleep(duration)
+    end = time.time()
 
-def monitor_cpu_usage(container_id, duration):
-    # Calculate the sleep durations for three intervals
-    # measurement_points = [duration / 3, duration / 2, 2 * duration / 3]
-    # Calculate the sleep durations for five intervals
-    # measurement_points = [duration / 6, duration / 3, duration / 2, 2 * duration / 3, 5 * duration / 6]
     # Wait 10 seconds for load to go up, considering the duration is 60 seconds
-    measurement_points = [(i + 2) * (duration / 12) for i in range(9)]
-    last_sleep_time = 0
-    cpu_usage_percentages = []
+    window_start = start + 2 * (duration / 12)
+    cpu_usage_percentages = sampler.cpu_usage(window_start, end)
+    log_to_file(f"CPU usage samples between {window_start - start:.1f}s and {end - start:.1f}s: "
+                f"{len(cpu_usage_percentages)}")
 
-    for point in measurement_points:
-        # Sleep only the difference to reach the next point, adjusting for any previous sleep
-        sleep_duration = point - last_sleep_time
-        time.sleep(sleep_duration)
-        last_sleep_time = point  # Update the last sleep time
-
-        # Measure and store the CPU usage
-        cpu_usage = get_cpu_usage(container_id)
-        cpu_usage_percentages.append(cpu_usage)
-        log_to_file(f"CPU usage at point {point}s: {cpu_usage}")
+    if series_path is not None:
+        sampler.save(series_path, start, end, extra={"rps": rps})
 
     return check_cpu_measurements(cpu_usage_percentages)
 
 
+def monitor_until_steady(container_id, steady_state_config, stop_event, load_result=None, series_path=None,
+                         rps=None):
+    # Run until the CPU (and, with the native load generator, the latency) series has settled,
+    # then stop the load generator. The warm-up is cut off with MSER-5 instead of a fixed fraction.
+    sampler = get_sampler(container_id)
+    min_duration = steady_state_config.get("min-duration", 20)
+    max_duration = steady_state_config.get("max-duration", 120)
+    check_interval = steady_state_config.get("check-interval", 5)
+    confidence = steady_state_config.get("confidence", 0.95)
+    relative_precision = steady_state_config.get("relative-precision", 0.05)
+
+    start = time.time()
+    while True:
+        time.sleep(check_interval)
+        elapsed = time.time() - start
+        cpu_usage_percentages = sampler.cpu_usage(start, time.time())
+        if elapsed < min_duration:
+            continue
+
+        settled = steady_state.is_steady(cpu_usage_percentages, confidence, relative_precision)
+        if settled and load_result is not None:
+            # The last second is still in progress, so leave it out
+            settled = steady_state.is_steady(load_result.latency_series()[:-1], confidence, relative_precision)
+
+        if settled or elapsed >= max_duration:
+            break
+
+    stop_event.set()
+    end = time.time()
+
+    warmup_samples = steady_state.mser_truncation(cpu_usage_percentages)
+    log_to_file(f"{'Steady state' if settled else 'No steady state'} after {end - start:.1f}s, "
+                f"discarding {warmup_samples} of {len(cpu_usage_percentages)} CPU samples as warm-up")
+
+    if series_path is not None:
+        sampler.save(series_path, start, end, extra={"rps": rps})
+
+    return check_cpu_measurements(cpu_usage_percentages[warmup_samples:])
+
+
 def check_cpu_measurements_old(measurements, threshold=80, required_percentage=50):
     # Check how many are over the threshold
     over_threshold_count = sum(measurement > threshold for measurement in measurements)
@@ -76,46 +205,190 @@ def check_cpu_measurements_old(measurements, threshold=80, required_percentage=5
 
 
 def check_cpu_measurements(measurements, threshold=75):
+    if not measurements:
+        log_to_file("No CPU usage samples were collected")
+        return False, 0
     average_cpu_usage = sum(measurements) / len(measurements)
     log_to_file(f"Average CPU Usage: {average_cpu_usage}")
     return average_cpu_usage > threshold, average_cpu_usage
 
 
-def calibrate(host, port, endpoint, container_id, max_rps, initial_rps, rps_increment, duration, timeunit="1s"):
-    rps = initial_rps
-    avg_cpu_usage = 0
-
+def build_url(host, port, endpoint):
     if endpoint == "queries":
-        url = f"http://{host}:{port}/{endpoint}?queries={QUERIES_ENDPOINT_CONFIG}"
-    elif endpoint == "updates":
-        url = f"http://{host}:{port}/{endpoint}?queries={UPDATES_ENDPOINT_CONFIG}"
+        return f"http://{host}:{port}/{endpoint}?queries={QUERIES_ENDPOINT_CONFIG}"
+    elif endpoint in ("updates", "updates-bulk"):
+        return f"http://{host}:{port}/{endpoint}?queries={UPDATES_ENDPOINT_CONFIG}"
+    return f"http://{host}:{port}/{endpoint}"
+
+
+def probe(rps, duration, url, container_id, timeunit="1s", series_path=None, load_generator=None,
+          steady_state_config=None, export_config=None, service=None):
+    if steady_state_config is not None:
+        # The run is ended by the steady-state detection, the duration is only an upper bound
+        duration = steady_state_config.get("max-duration", 120)
+
+    print(f"Testing with {rps} RPS for {duration} seconds, targeting {url}, on container {container_id}")
+    log_to_file(f"Testing with {rps} RPS for {duration} seconds, targeting {url}, on container {container_id}")
+
+    # Spans and bytes the service exports to the OTLP sink during the probe
+    finish_export = None
+    if export_config is not None and service is not None:
+        finish_export = export_stats.measure(export_config.get("url", export_stats.DEFAULT_URL), service,
+                                             export_config.get("settle", export_stats.DEFAULT_SETTLE))
+
+    # Run the load generator
+    load_results = {}
+    stop_event = threading.Event()
+    live_result = None
+    # The results of distributed workers are only available at the end, so their latency is not followed
+    if load_generator is not None and load_generator.get("type", "k6") == "native" and \
+            load_generator.get("workers", 1) <= 1:
+        live_result = loadgen.LoadResult()
+
+    def generate_load():
+        load_results["result"] = run_test(rps, duration, url, timeunit, load_generator, stop_event, live_result)
+
+    load_thread = threading.Thread(target=generate_load)
+    load_thread.start()
+
+    # Check CPU usage
+    if steady_state_config is not None:
+        exceeds_usage, avg_cpu_usage = monitor_until_steady(container_id, steady_state_config, stop_event,
+                                                            live_result, series_path, rps)
     else:
-        url = f"http://{host}:{port}/{endpoint}"
+        exceeds_usage, avg_cpu_usage = monitor_cpu_usage(container_id, duration, series_path, rps)
 
-    reached_target = False
-    while rps <= max_rps:
-        print(f"Testing with {rps} RPS for {duration} seconds, targeting {url}, on container {container_id}")
-        log_to_file(f"Testing with {rps} RPS for {duration} seconds, targeting {url}, on container {container_id}")
+    # Wait for the load generator to finish so the next probe does not overlap with this one
+    load_thread.join()
+    load_summary = load_results.get("result")
+    if load_summary is not None and finish_export is not None:
+        load_summary.update(finish_export(load_summary["requests"]))
+    if load_summary is not None:
+        log_to_file(f"Latency at {rps} RPS: {load_summary}")
 
-        # Run the K6 test
-        threading.Thread(target=run_test, args=(rps, duration, url, timeunit)).start()
+    return exceeds_usage, avg_cpu_usage, load_summary
 
-        # Check CPU usage
-        exceeds_usage, avg_cpu_usage = monitor_cpu_usage(container_id, duration)
 
-        # if max_cpu_usage >= target_cpu_usage:
-        if exceeds_usage:
-            log_to_file(f"Reached target CPU utilization with {rps} RPS\n")
-            reached_target = True
-            break
+def within_slo(load_summary, slo):
+    if load_summary is None:
+        log_to_file("No latency results from the load generator, counting the probe as an SLO violation")
+        return False
+
+    limits = [("p50", "p50-ms"), ("p99", "p99-ms"), ("error_rate", "error-rate")]
+    for metric, limit in limits:
+        if limit in slo and load_summary[metric] > slo[limit]:
+            log_to_file(f"SLO violated: {metric} {load_summary[metric]} > {slo[limit]}")
+            return False
+    return True
+
+
+def calibrate_linear(exceeds, max_rps, initial_rps, rps_increment):
+    # Returns whether the threshold was exceeded, the first RPS exceeding it and the last RPS below it
+    rps = initial_rps
+    below = None
+
+    while rps <= max_rps:
+        if exceeds(rps):
+            return True, rps, below
+        below = rps
+        rps += rps_increment
+
+    return False, rps, below
+
+
+def calibrate_search(exceeds, max_rps, initial_rps, rps_increment, tolerance=None):
+    # Search on the same grid the linear mode walks (initial_rps + k * rps_increment),
+    # so both modes end on the same targetRPS
+    if tolerance is None:
+        tolerance = rps_increment
+    tolerance_steps = max(1, int(tolerance // rps_increment))
+    max_step = (max_rps - initial_rps) // rps_increment
+    if max_step < 0:
+        return False, initial_rps, None
+
+    def to_rps(step):
+        return None if step is None else initial_rps + step * rps_increment
+
+    # Exponential probe: 0, 1, 2, 4, 8, ... steps until the threshold is exceeded
+    below, above = None, None
+    step = 0
+    probes = 0
+    while above is None:
+        probes += 1
+        if exceeds(to_rps(step)):
+            above = step
+        else:
+            below = step
+            if step == max_step:
+                break
+            step = min(max(1, step * 2), max_step)
+
+    if above is None:
+        return False, to_rps(max_step + 1), to_rps(below)
+
+    # Bisection between the last step below and the first step above the threshold
+    while below is not None and above - below > tolerance_steps:
+        probes += 1
+        mid = (below + above) // 2
+        if exceeds(to_rps(mid)):
+            above = mid
         else:
-            rps += rps_increment
+            below = mid
+
+    log_to_file(f"Search finished after {probes} probes")
+    return True, to_rps(above), to_rps(below)
 
-    if not reached_target:
+
+def calibrate(host, port, endpoint, container_id, max_rps, initial_rps, rps_increment, duration, timeunit="1s",
+              mode="linear", tolerance=None, series_path=None, load_generator=None, slo=None,
+              steady_state_config=None, probe_results=None, on_probe=None, export_config=None):
+    # `probe_results` can be seeded with earlier probes (e.g. from the journal when resuming),
+    # `on_probe` is called with every new probe as soon as it finishes
+    url = build_url(host, port, endpoint)
+    if probe_results is None:
+        probe_results = {}
+
+    def probe_rps(rps):
+        # The CPU and the SLO search share probes, so every RPS is only run once per scenario
+        if rps in probe_results:
+            log_to_file(f"Reusing earlier probe at {rps} RPS: {probe_results[rps]}")
+        else:
+            probe_results[rps] = probe(rps, duration, url, container_id, timeunit, series_path, load_generator,
+                                       steady_state_config, export_config, host)
+            if on_probe is not None:
+                on_probe(rps, *probe_results[rps])
+        return probe_results[rps]
+
+    def search(exceeds):
+        if mode == "search":
+            return calibrate_search(exceeds, max_rps, initial_rps, rps_increment, tolerance)
+        return calibrate_linear(exceeds, max_rps, initial_rps, rps_increment)
+
+    reached_target, rps, _ = search(lambda probed_rps: probe_rps(probed_rps)[0])
+
+    if reached_target:
+        avg_cpu_usage = probe_results[rps][1]
+        log_to_file(f"Reached target CPU utilization with {rps} RPS\n")
+    else:
+        avg_cpu_usage = probe_results[max(probe_results)][1] if probe_results else 0
         log_to_file(
             f"Did not reach target CPU Utilization for port {port} and endpoint {endpoint} and container_id {container_id}\n")
 
-    return reached_target, rps, avg_cpu_usage
+    slo_result = None
+    if slo is not None:
+        # The SLO-bound target is the highest probed RPS that still meets the SLO
+        violated, _, slo_rps = search(lambda probed_rps: not within_slo(probe_rps(probed_rps)[2], slo))
+        slo_result = {
+            "violated": violated,
+            "rps": slo_rps if slo_rps is not None else 0,
+            "latency": probe_results[slo_rps][2] if slo_rps is not None else None,
+        }
+        if violated:
+            log_to_file(f"Highest RPS within the SLO: {slo_result['rps']}\n")
+        else:
+            log_to_file(f"SLO was not violated up to {slo_result['rps']} RPS\n")
+
+    return reached_target, rps, avg_cpu_usage, slo_result
 
 
 def filter_configuration_by_lang(config):
@@ -130,6 +403,245 @@ def filter_configuration_by_lang(config):
         return {}
 
 
+def start_sampling_variants(configuration, sampling_config, port):
+    # One copy of the base configuration (e.g. python-otel) per head-sampling ratio, with a
+    # parent-based trace-ID ratio sampler set through the standard OpenTelemetry variables
+    base_config = sampling_config.get("base-configuration", "otel")
+    variant_configuration, variant_ratios, containers = {}, {}, []
+
+    for language in configuration:
+        base = variants.find_container(client, f"{language}-{base_config}")
+        if base is None:
+            log_to_file(f"No running {language}-{base_config} container, skipping the sampling ratios for {language}")
+            continue
+
+        for ratio in sampling_config.get("ratios", []):
+            variant = utils.sampling_configuration(base_config, ratio)
+            hostname = f"{language}-{variant}"
+            log_to_file(f"Starting {hostname} with sampling ratio {ratio}")
+            containers.append(variants.clone_container(client, base, hostname, {
+                "OTEL_SERVICE_NAME": hostname,
+                "OTEL_TRACES_SAMPLER": utils.SAMPLING_SAMPLER,
+                "OTEL_TRACES_SAMPLER_ARG": str(ratio),
+            }))
+            variant_configuration.setdefault(language, []).append(variant)
+            variant_ratios[variant] = ratio
+
+    for container in containers:
+        if not variants.wait_until_ready(build_url(container.name, port, "json")):
+            log_to_file(f"{container.name} did not become ready")
+
+    return variant_configuration, variant_ratios, containers
+
+
+def run_scenario(scenario, config, max_rps, duration, timeunit, port, slot=None, journal=None,
+                 journalled_probes=None, layout=None):
+    calibration_config = config.get("calibration", {})
+    calibration_mode = calibration_config.get("mode", "linear")
+    load_generator = config.get("load-generator", {"type": "k6"})
+    slo = config.get("slo")
+    if slo is not None and not slo.get("enabled", True):
+        slo = None
+    steady_state_config = config.get("steady-state")
+    if steady_state_config is not None and not steady_state_config.get("enabled", True):
+        steady_state_config = None
+    export_config = config.get("export-stats")
+    if export_config is not None and not export_config.get("enabled", True):
+        export_config = None
+    server_timing_config = config.get("server-timing")
+    if server_timing_config is not None and not server_timing_config.get("enabled", True):
+        server_timing_config = None
+
+    if slot is not None:
+        load_generator = {**load_generator, "cpus": slot.loadgen_cpus}
+        scenario.update(slot.describe())
+    elif layout is not None:
+        load_generator = {**load_generator, "cpus": layout.cpus_by_role["loadgen"]}
+
+    lang = scenario["language"]
+    endpoint = scenario["endpoint"]
+    initial_rps = config["frameworks"][lang]["endpoint-config"][endpoint]["initial-rps"]
+    rps_increment = config["frameworks"][lang]["endpoint-config"][endpoint]["rps-increment"]
+    tolerance = config["frameworks"][lang]["endpoint-config"][endpoint].get("tolerance",
+                                                                            calibration_config.get("tolerance"))
+    host = scenario["host"]
+
+    log_to_file(f"Scenario: {scenario}")
+    log_to_file(f"Initial RPS: {initial_rps}")
+    log_to_file(f"RPS Increment: {rps_increment}")
+    log_to_file(f"Calibration mode: {calibration_mode}")
+    log_to_file(f"Load generator: {load_generator}")
+    log_to_file(f"SLO: {slo}")
+    log_to_file(f"Steady-state detection: {steady_state_config}")
+    log_to_file(f"Export statistics: {export_config}")
+
+    series_name = f"{scenario['host']}_{endpoint}"
+    if scenario.get("collectorMode"):
+        series_name += f"_{scenario['collectorMode']}"
+    series_path = f"{series_dir}/{series_name}.csv"
+
+    key = scenario_key(scenario)
+    if journal is not None:
+        def on_probe(rps, exceeds_usage, avg_cpu_usage, load_summary):
+            journal.record_probe(key, rps, exceeds_usage, avg_cpu_usage, load_summary)
+    else:
+        on_probe = None
+    probe_results = dict(journalled_probes.get(key, {})) if journalled_probes else {}
+    if probe_results:
+        log_to_file(f"Resuming scenario from {len(probe_results)} journalled probes, last at {max(probe_results)} RPS")
+
+    log_to_file(f"=====Running scenario {scenario}=====")
+    reached_target, rps, avg_cpu_usage, slo_result = calibrate(host, port, scenario["endpoint"],
+                                                               scenario["container_id"], max_rps,
+                                                               initial_rps, rps_increment, duration, timeunit,
+                                                               calibration_mode, tolerance, series_path,
+                                                               load_generator, slo, steady_state_config,
+                                                               probe_results, on_probe, export_config)
+    # Add the target RPS if target was reached, otherwise add 0
+    if reached_target:
+        scenario["targetRPS"] = rps
+    else:
+        scenario["targetRPS"] = 0
+
+    # Add the CPU Usage
+    scenario["avgCPUUsage"] = avg_cpu_usage
+
+    # Add what the service exported per request at the target RPS (or the highest probed RPS)
+    if export_config is not None:
+        probed_rps = rps if reached_target else max(probe_results, default=None)
+        load_summary = (probe_results[probed_rps][2] if probed_rps is not None else None) or {}
+        scenario["exportedSpansPerRequest"] = load_summary.get("exported_spans_per_request", 0)
+        scenario["exportedBytesPerRequest"] = load_summary.get("exported_bytes_per_request", 0)
+        scenario["receivedSpansPerRequest"] = load_summary.get("received_spans_per_request", 0)
+        scenario["receivedBytesPerRequest"] = load_summary.get("received_bytes_per_request", 0)
+
+    # Where the time of a request went at the target RPS, from the Server-Timing headers of the service
+    if server_timing_config is not None:
+        probed_rps = rps if reached_target else max(probe_results, default=None)
+        load_summary = (probe_results[probed_rps][2] if probed_rps is not None else None) or {}
+        for phase in server_timing_config.get("phases", DEFAULT_TIMING_PHASES):
+            column = phase[0].upper() + phase[1:]
+            scenario[f"timing{column}Ms"] = load_summary.get(f"timing_{phase}_mean")
+            scenario[f"timing{column}P99Ms"] = load_summary.get(f"timing_{phase}_p99")
+
+    # Latency at the target RPS, to compare the collector modes
+    if "collectorMode" in scenario:
+        probed_rps = rps if reached_target else max(probe_results, default=None)
+        load_summary = (probe_results[probed_rps][2] if probed_rps is not None else None) or {}
+        scenario["targetP50"] = load_summary.get("p50", 0)
+        scenario["targetP99"] = load_summary.get("p99", 0)
+        scenario["targetErrorRate"] = load_summary.get("error_rate", 0)
+
+    # Add the highest RPS within the latency SLO and the latency measured at that RPS
+    if slo_result is not None:
+        latency = slo_result["latency"] or {}
+        scenario["sloTargetRPS"] = slo_result["rps"]
+        scenario["sloViolated"] = slo_result["violated"]
+        scenario["sloP50"] = latency.get("p50", 0)
+        scenario["sloP99"] = latency.get("p99", 0)
+        scenario["sloErrorRate"] = latency.get("error_rate", 0)
+
+    if journal is not None:
+        journal.record_scenario(key, scenario)
+
+
+def run_scenarios_parallel(scenarios, parallel_config, run_group):
+    shared_cpus, slots = scheduler.partition_cpus(
+        scheduler.available_cpus(parallel_config),
+        app_cpus=parallel_config.get("app-cpus", scheduler.DEFAULT_APP_CPUS),
+        loadgen_cpus=parallel_config.get("loadgen-cpus", scheduler.DEFAULT_LOADGEN_CPUS),
+        shared_cpus=parallel_config.get("shared-cpus", scheduler.DEFAULT_SHARED_CPUS),
+        max_slots=parallel_config.get("max-slots"))
+    shared_cpuset = scheduler.format_cpuset(shared_cpus)
+    log_to_file(f"Parallel calibration on {len(slots)} slots, shared CPUs {shared_cpuset}")
+    for slot in slots:
+        log_to_file(f"Slot {slot.describe()}")
+
+    # The database and the collectors are shared by all slots and get their own cores,
+    # as does the calibrator (the load generators re-pin themselves to their slot)
+    shared_hostnames = parallel_config.get("shared-containers", scheduler.DEFAULT_SHARED_CONTAINERS)
+    pinned_shared = scheduler.pin_shared_containers(client, shared_hostnames, shared_cpus)
+    own_cpus = os.sched_getaffinity(0)
+    os.sched_setaffinity(0, shared_cpus)
+    for scenario in scenarios:
+        scenario["sharedCpuset"] = shared_cpuset
+
+    # Endpoints of the same container cannot run concurrently, so they form one group. Concurrent DB endpoints
+    # would compete for the one shared database and skew each other's CPU threshold, so their groups run
+    # one after another once the other endpoints are done.
+    db_endpoints = set(parallel_config.get("db-endpoints", scheduler.DEFAULT_DB_ENDPOINTS))
+    groups, db_groups = {}, {}
+    for scenario in scenarios:
+        target = db_groups if scenario["endpoint"] in db_endpoints else groups
+        target.setdefault(scenario["container_id"], []).append(scenario)
+
+    def run_group_pinned(group, slot):
+        container_id = group[0]["container_id"]
+        previous_cpuset = scheduler.pin_container(client, container_id, slot.app_cpus)
+        log_to_file(f"Running {container_id} on slot {slot.describe()}")
+        try:
+            run_group(group, slot)
+        finally:
+            scheduler.unpin_container(client, container_id, previous_cpuset)
+
+    try:
+        scheduler.run_parallel(list(groups.values()), slots, run_group_pinned)
+        scheduler.run_parallel(list(db_groups.values()), slots[:1], run_group_pinned)
+    finally:
+        for container_id, previous_cpuset in pinned_shared.items():
+            scheduler.unpin_container(client, container_id, previous_cpuset)
+        os.sched_setaffinity(0, own_cpus)
+
+
+def start_isolation(isolation_config):
+    # Serial calibration on a fixed core layout: the database and the collectors are pinned for the whole
+    # calibration, the service under test per scenario and the load generator per probe
+    role_cpus = {role: isolation_config[f"{role}-cpus"] for role in scheduler.LAYOUT_ROLES
+                 if f"{role}-cpus" in isolation_config}
+    layout = scheduler.plan_layout(scheduler.available_cpus(isolation_config), role_cpus)
+    log_to_file(f"Core layout: {layout.describe()}")
+
+    expected, pinned = {}, {}
+    role_containers = [("db", isolation_config.get("db-containers", scheduler.DEFAULT_DB_CONTAINERS)),
+                       ("collector", isolation_config.get("collector-containers",
+                                                          scheduler.DEFAULT_COLLECTOR_CONTAINERS))]
+    for role, names in role_containers:
+        for container in scheduler.find_containers(client, names):
+            pinned[container.id] = scheduler.pin_container(client, container.id, layout.cpus_by_role[role])
+            expected[container.id] = layout.cpus_by_role[role]
+            log_to_file(f"Pinned {container.name} ({role}) to {scheduler.format_cpuset(layout.cpus_by_role[role])}")
+
+    # The load generator re-pins itself to its cores. The calibrator's own affinity is returned, so it can be
+    # restored after the calibration.
+    own_cpus = os.sched_getaffinity(0)
+    os.sched_setaffinity(0, layout.harness_cpus)
+    return layout, expected, pinned, own_cpus
+
+
+def verify_isolation(layout, expected):
+    # Check the layout in the cgroups before a scenario runs. Containers that lost their cpuset (e.g. after
+    # a restart) are pinned again. Returns whether every cpuset could be read.
+    mismatched, unknown = scheduler.verify_layout(client, expected)
+    if mismatched:
+        log_to_file(f"Cpusets differ from the layout, pinning again: {mismatched}")
+        for container_id in mismatched:
+            scheduler.pin_container(client, container_id, expected[container_id])
+        mismatched, unknown = scheduler.verify_layout(client, expected)
+        if mismatched:
+            raise RuntimeError(f"Cpusets still differ from the core layout: {mismatched}")
+
+    own_cpus = scheduler.own_cpuset()
+    if own_cpus is None:
+        unknown.append("calibrator")
+    elif not set(layout.cpus_by_role["loadgen"]) <= set(own_cpus):
+        raise RuntimeError(f"The load generator cores {scheduler.format_cpuset(layout.cpus_by_role['loadgen'])} "
+                           f"are outside the calibrator's cpuset {scheduler.format_cpuset(own_cpus)}")
+
+    if unknown:
+        log_to_file(f"Could not read the cpusets of {unknown} from the cgroups")
+    return not unknown
+
+
 def read_config(config_file):
     with open(config_file, 'r') as file:
         data = json.load(file)
@@ -140,9 +652,20 @@ current_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
 results_dir = "results"
 log_file_path = f"{results_dir}/cpu_utilization_log_{current_time}.txt"
 csv_file_path = f"{results_dir}/rps_calibration_results.csv"
+series_dir = f"{results_dir}/cpu_series_{current_time}"
+journal_file_path = f"{results_dir}/calibration_journal.jsonl"
+tier_losses_file_path = f"{results_dir}/tier_losses_{current_time}.csv"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Calibrate the target RPS of every scenario")
+    parser.add_argument("--resume", action="store_true", default=os.getenv("RESUME", "false") == "true",
+                        help="Skip scenarios finished in the journal and reuse the probes of interrupted ones")
+    return parser.parse_args()
 
 
 def main():
+    args = parse_args()
     print("Running calibrator...")
     if not os.path.isdir(results_dir):
         os.makedirs(results_dir)
@@ -154,49 +677,136 @@ def main():
     timeunit = "1s"
     port = 8080
 
-    # TODO: Read endpoints from the config.json file
-    # Generate scenarios
-    endpoints = ["json", "db", "updates", "queries"]
     exclude_configs = []
 
+    config = read_config(CONFIG_FILE)
+
+    # Generate scenarios for the endpoints configured per language, e.g. only Python serves /updates-bulk
+    endpoints = {language: list(framework["endpoint-config"]) for language, framework in config["frameworks"].items()}
+
     filtered_configuration = filter_configuration_by_lang(utils.configuration)
+
+    # Sampling ratios are calibrated on copies of the instrumented containers
+    sampling_config = config.get("sampling", {})
+    sampling_containers, sampling_ratios = [], {}
+    if sampling_config.get("enabled", False):
+        variant_configuration, sampling_ratios, sampling_containers = start_sampling_variants(
+            filtered_configuration, sampling_config, port)
+        filtered_configuration = {language: configs + variant_configuration.get(language, [])
+                                  for language, configs in filtered_configuration.items()}
     print("Configuration:", filtered_configuration)
 
     scenarios = utils.generate_scenarios(filtered_configuration, endpoints,
                                          exclude_configs=exclude_configs)
+    if sampling_ratios:
+        # Every row gets the column, the CSV header is taken from the first scenario
+        for scenario in scenarios:
+            scenario["samplingRatio"] = sampling_ratios.get(scenario["configuration"])
+
+    # The instrumented scenarios again, against a slow, lossy or unreachable collector (the OTLP sink)
+    collector_config = config.get("collector-modes", {})
+    collector_modes = []
+    if collector_config.get("enabled", False):
+        collector_modes = collector_config.get("modes", [])
+        mode_scenarios = utils.collector_mode_scenarios(scenarios, collector_config)
+        for scenario in scenarios:
+            scenario["collectorMode"] = None
+        scenarios += mode_scenarios
 
     # Shuffle the list so the order of scenarios won't impact results
     random.shuffle(scenarios)
 
-    config = read_config(CONFIG_FILE)
+    journal = Journal(journal_file_path)
+    finished, journalled_probes = {}, {}
+    if args.resume:
+        journalled_config, finished, journalled_probes = journal.load()
+        log_to_file(f"Resuming from {journal_file_path}: {len(finished)} finished scenarios, "
+                    f"{sum(len(probes) for probes in journalled_probes.values())} probes")
+        if journalled_config is not None and journalled_config != config:
+            log_to_file("Warning: the configuration changed since the journalled run")
+    else:
+        journal.archive()
+    journal.record_start(config)
 
-    print("Running scenarios:")
+    # Finished scenarios keep their journalled results and are not run again
+    pending = []
     for scenario in scenarios:
+        key = scenario_key(scenario)
+        if key in finished:
+            scenario.update(finished[key])
+            log_to_file(f"Skipping finished scenario {key}")
+        else:
+            pending.append(scenario)
+
+    print("Running scenarios:")
+    for scenario in pending:
         log_to_file(scenario)
 
-    for scenario in scenarios:
-        lang = scenario["language"]
-        endpoint = scenario["endpoint"]
-        initial_rps = config["frameworks"][lang]["endpoint-config"][endpoint]["initial-rps"]
-        rps_increment = config["frameworks"][lang]["endpoint-config"][endpoint]["rps-increment"]
-        host = scenario["host"]
-
-        log_to_file(f"Scenario: {scenario}")
-        log_to_file(f"Initial RPS: {initial_rps}")
-        log_to_file(f"RPS Increment: {rps_increment}")
-
-        log_to_file(f"=====Running scenario {scenario}=====")
-        reached_target, rps, avg_cpu_usage = calibrate(host, port, scenario["endpoint"],
-                                                       scenario["container_id"], max_rps,
-                                                       initial_rps, rps_increment, duration, timeunit)
-        # Add the target RPS if target was reached, otherwise add 0
-        if reached_target:
-            scenario["targetRPS"] = rps
+    # Serial calibrations get a core layout, parallel ones are isolated by their slots already
+    parallel_config = config.get("parallel", {})
+    isolation_config = config.get("isolation", {})
+    layout, layout_containers, pinned_layout, own_cpus = None, {}, {}, None
+    if isolation_config.get("enabled", False):
+        if parallel_config.get("enabled", False):
+            log_to_file("Ignoring the core layout, parallel calibration isolates the scenarios by slot")
+        else:
+            layout, layout_containers, pinned_layout, own_cpus = start_isolation(isolation_config)
+            # The layout is the same for every scenario, the CSV header is taken from the first one
+            for scenario in scenarios:
+                scenario.setdefault("layoutVerified", None)
+                for column, cpuset in layout.describe().items():
+                    scenario.setdefault(column, cpuset)
+
+    def run_isolated(scenario):
+        container_id = scenario["container_id"]
+        previous_cpuset = scheduler.pin_container(client, container_id, layout.cpus_by_role["service"])
+        try:
+            scenario["layoutVerified"] = verify_isolation(
+                layout, {**layout_containers, container_id: layout.cpus_by_role["service"]})
+            run_scenario(scenario, config, max_rps, duration, timeunit, port, journal=journal,
+                         journalled_probes=journalled_probes, layout=layout)
+        finally:
+            scheduler.unpin_container(client, container_id, previous_cpuset)
+
+    def run_group(group, slot=None):
+        for scenario in group:
+            if layout is not None:
+                run_isolated(scenario)
+            else:
+                run_scenario(scenario, config, max_rps, duration, timeunit, port, slot, journal, journalled_probes)
+
+    def run_pending(group):
+        if parallel_config.get("enabled", False):
+            run_scenarios_parallel(group, parallel_config, run_group)
+        else:
+            run_group(group)
+
+    try:
+        if collector_modes:
+            # The mode applies to the whole sink, so the scenarios run mode by mode
+            control_url = collector_config.get("control-url", export_stats.DEFAULT_URL)
+            try:
+                for collector_mode in [{"name": None}] + collector_modes:
+                    group = [scenario for scenario in pending
+                             if scenario["collectorMode"] == collector_mode["name"]]
+                    if not group:
+                        continue
+                    log_to_file(f"Collector mode {collector_mode['name']}: "
+                                f"{export_stats.set_mode(control_url, collector_mode)}")
+                    run_pending(group)
+            finally:
+                export_stats.set_mode(control_url, {})
         else:
-            scenario["targetRPS"] = 0
+            run_pending(pending)
+    finally:
+        # Containers without a cpuset before are restored to all host CPUs, not to the harness cores
+        for container_id, previous_cpuset in pinned_layout.items():
+            scheduler.unpin_container(client, container_id, previous_cpuset)
+        if own_cpus is not None:
+            os.sched_setaffinity(0, own_cpus)
 
-        # Add the CPU Usage
-        scenario["avgCPUUsage"] = avg_cpu_usage
+    stop_samplers()
+    variants.remove_containers(sampling_containers)
 
     log_to_file("\n\n=====FINAL RESULTS=====\n\n")
     for scenario in scenarios:
@@ -206,7 +816,16 @@ def main():
     # Write to experiment file
     utils.write_to_csv(scenarios, log_file_path, append=True)
     # Write to common CSV
-    utils.write_to_csv(scenarios, csv_file_path, append=True)
+    utils.write_to_csv(scenarios, csv_file_path, append=True, merge_headers=True)
+
+    # Throughput lost per tracing layer, for languages with all tracing tiers
+    losses = utils.tier_losses([scenario for scenario in scenarios if not scenario.get("collectorMode")])
+    if losses:
+        log_to_file("\n\n=====TRACING TIER LOSSES (% of standard targetRPS)=====\n\n")
+        for loss in losses:
+            print(loss)
+            log_to_file(loss)
+        utils.write_to_csv(losses, tier_losses_file_path, append=True)
 
 
 if __name__ == "__main__":
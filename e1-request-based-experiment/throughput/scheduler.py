@@ -0,0 +1,230 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_APP_CPUS = 2
+DEFAULT_LOADGEN_CPUS = 2
+DEFAULT_SHARED_CPUS = 4
+DEFAULT_SHARED_CONTAINERS = ["postgres", "otel-collector", "apm-server", "otlp-sink"]
+# Endpoints that query the shared database, they are calibrated one at a time
+DEFAULT_DB_ENDPOINTS = ["db", "queries", "updates", "updates-bulk"]
+
+# Roles of the core layout of a serial calibration, in the order their cores are taken
+LAYOUT_ROLES = ["service", "db", "collector", "loadgen"]
+DEFAULT_LAYOUT_CPUS = {"service": 2, "db": 2, "collector": 2, "loadgen": 2}
+DEFAULT_DB_CONTAINERS = ["postgres"]
+DEFAULT_COLLECTOR_CONTAINERS = ["otel-collector", "apm-server", "otlp-sink", "jaeger"]
+
+# The host's cgroup hierarchy, mounted into the calibrator to read the cpusets of other containers.
+# Paths for the systemd and cgroupfs drivers of Docker, on cgroup v2 and v1.
+HOST_CGROUP_ROOT = os.getenv("HOST_CGROUP_ROOT", "/host/sys/fs/cgroup")
+CGROUP_CPUSET_PATHS = [
+    "system.slice/docker-{id}.scope/cpuset.cpus.effective",
+    "docker/{id}/cpuset.cpus.effective",
+    "cpuset/system.slice/docker-{id}.scope/cpuset.effective_cpus",
+    "cpuset/docker/{id}/cpuset.effective_cpus",
+]
+OWN_CGROUP_CPUSET_PATHS = ["/sys/fs/cgroup/cpuset.cpus.effective", "/sys/fs/cgroup/cpuset/cpuset.effective_cpus"]
+
+
+def format_cpuset(cpus):
+    # Docker/taskset notation, e.g. [0, 1, 2, 5] -> "0-2,5"
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(f"{low}-{high}" if low != high else f"{low}" for low, high in ranges)
+
+
+def parse_cpuset(cpuset):
+    cpus = []
+    for part in cpuset.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            low, high = part.split("-")
+            cpus.extend(range(int(low), int(high) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+class CpuSlot:
+    # Disjoint set of cores for one app container and the load generator targeting it
+    def __init__(self, index, app_cpus, loadgen_cpus):
+        self.index = index
+        self.app_cpus = app_cpus
+        self.loadgen_cpus = loadgen_cpus
+
+    def describe(self):
+        return {"slot": self.index, "appCpuset": format_cpuset(self.app_cpus),
+                "loadgenCpuset": format_cpuset(self.loadgen_cpus)}
+
+
+def partition_cpus(cpus, app_cpus=DEFAULT_APP_CPUS, loadgen_cpus=DEFAULT_LOADGEN_CPUS,
+                   shared_cpus=DEFAULT_SHARED_CPUS, max_slots=None):
+    # The first `shared_cpus` cores are kept for the shared services (database, collectors) and the
+    # calibrator itself, the rest is cut into slots. Cores that do not fill a whole slot stay unused.
+    cpus = sorted(cpus)
+    shared, remaining = cpus[:shared_cpus], cpus[shared_cpus:]
+    slot_size = app_cpus + loadgen_cpus
+
+    slots = []
+    for start in range(0, len(remaining) - slot_size + 1, slot_size):
+        if max_slots is not None and len(slots) >= max_slots:
+            break
+        block = remaining[start:start + slot_size]
+        slots.append(CpuSlot(len(slots), block[:app_cpus], block[app_cpus:]))
+
+    if not slots:
+        raise ValueError(f"{len(cpus)} CPUs are not enough for {shared_cpus} shared CPUs and one slot of "
+                         f"{slot_size} CPUs")
+    return shared, slots
+
+
+def available_cpus(parallel_config):
+    if "cpus" in parallel_config:
+        return parse_cpuset(parallel_config["cpus"])
+    return sorted(os.sched_getaffinity(0))
+
+
+def pin_container(client, container_id, cpus):
+    # Returns the previous cpuset so it can be restored afterwards
+    container = client.containers.get(container_id)
+    previous = container.attrs["HostConfig"].get("CpusetCpus", "")
+    container.update(cpuset_cpus=format_cpuset(cpus))
+    return previous
+
+
+def host_cpus(client):
+    # All CPUs of the Docker host. Not the affinity of the calibrator, which may be narrowed to a few cores.
+    return list(range(client.info()["NCPU"]))
+
+
+def unpin_container(client, container_id, previous):
+    # An empty cpuset is rejected by the API, so reset to all CPUs of the host instead
+    if not previous:
+        previous = format_cpuset(host_cpus(client))
+    client.containers.get(container_id).update(cpuset_cpus=previous)
+
+
+def find_containers(client, names):
+    # By hostname or, for services without one (e.g. the collectors), by docker compose service name
+    return [container for container in client.containers.list()
+            if container.attrs["Config"]["Hostname"] in names
+            or container.labels.get("com.docker.compose.service") in names]
+
+
+def pin_shared_containers(client, hostnames, cpus):
+    pinned = {}
+    for container in find_containers(client, hostnames):
+        pinned[container.id] = pin_container(client, container.id, cpus)
+    return pinned
+
+
+class CoreLayout:
+    # Disjoint cores for the service under test, the database, the collectors and the load generator
+    # of a serial calibration. The other cores are left to the calibrator itself.
+    def __init__(self, cpus_by_role, harness_cpus):
+        self.cpus_by_role = cpus_by_role
+        self.harness_cpus = harness_cpus
+
+    def describe(self):
+        return {
+            "appCpuset": format_cpuset(self.cpus_by_role["service"]),
+            "dbCpuset": format_cpuset(self.cpus_by_role["db"]),
+            "collectorCpuset": format_cpuset(self.cpus_by_role["collector"]),
+            "loadgenCpuset": format_cpuset(self.cpus_by_role["loadgen"]),
+            "harnessCpuset": format_cpuset(self.harness_cpus),
+        }
+
+
+def plan_layout(cpus, role_cpus=None):
+    role_cpus = {**DEFAULT_LAYOUT_CPUS, **(role_cpus or {})}
+    cpus = sorted(cpus)
+    needed = sum(role_cpus[role] for role in LAYOUT_ROLES)
+    # The calibrator needs at least one core of its own for sampling and the Docker API
+    if needed >= len(cpus):
+        raise ValueError(f"{len(cpus)} CPUs are not enough for a layout of {needed} CPUs and the calibrator")
+
+    # As with the slots, the first cores are left to the calibrator
+    harness_cpus, start = cpus[:len(cpus) - needed], len(cpus) - needed
+    cpus_by_role = {}
+    for role in LAYOUT_ROLES:
+        cpus_by_role[role] = cpus[start:start + role_cpus[role]]
+        start += role_cpus[role]
+    return CoreLayout(cpus_by_role, harness_cpus)
+
+
+def read_cpuset_file(path):
+    if not os.path.isfile(path):
+        return None
+    with open(path) as file:
+        return parse_cpuset(file.read())
+
+
+def container_cpuset(client, container_id):
+    # The effective cpuset of a container from the host's cgroups or, without them, from inside the container
+    for path in CGROUP_CPUSET_PATHS:
+        cpus = read_cpuset_file(os.path.join(HOST_CGROUP_ROOT, path.format(id=container_id)))
+        if cpus is not None:
+            return cpus
+    for path in OWN_CGROUP_CPUSET_PATHS:
+        try:
+            exit_code, output = client.containers.get(container_id).exec_run(["cat", path])
+        except Exception:
+            # e.g. images without a shell or cat
+            return None
+        if exit_code == 0:
+            return parse_cpuset(output.decode())
+    return None
+
+
+def own_cpuset():
+    for path in OWN_CGROUP_CPUSET_PATHS:
+        cpus = read_cpuset_file(path)
+        if cpus is not None:
+            return cpus
+    return None
+
+
+def verify_layout(client, expected):
+    # `expected` maps container ids to their cores. Returns the containers whose effective cpuset differs
+    # and the ones that could not be read.
+    mismatched, unknown = {}, []
+    for container_id, cpus in expected.items():
+        actual = container_cpuset(client, container_id)
+        if actual is None:
+            unknown.append(container_id)
+        elif sorted(actual) != sorted(cpus):
+            mismatched[container_id] = format_cpuset(actual)
+    return mismatched, unknown
+
+
+def run_parallel(groups, slots, run_group):
+    # Each group (all scenarios of one app container) runs on a free slot; a group holds its slot
+    # until it is done, so no two concurrent groups share a core
+    free_slots = queue.Queue()
+    for slot in slots:
+        free_slots.put(slot)
+    errors = []
+    errors_lock = threading.Lock()
+
+    def run_on_slot(group):
+        slot = free_slots.get()
+        try:
+            run_group(group, slot)
+        except Exception as e:
+            with errors_lock:
+                errors.append(e)
+        finally:
+            free_slots.put(slot)
+
+    with ThreadPoolExecutor(max_workers=len(slots)) as executor:
+        list(executor.map(run_on_slot, groups))
+
+    if errors:
+        raise errors[0]
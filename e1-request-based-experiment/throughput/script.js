@@ -1,5 +1,13 @@
 import http from 'k6/http';
 import { check } from 'k6';
+import { Trend } from 'k6/metrics';
+
+// Phases of the Server-Timing header of the services, see python/flask/server_timing.py
+const phases = ['handler', 'span', 'export', 'total'];
+const serverTiming = {};
+phases.forEach(phase => {
+    serverTiming[phase] = new Trend(`server_timing_${phase}`, true);
+});
 
 export const options = {
   scenarios: {
@@ -20,4 +28,15 @@ export default function () {
     check(response, {
         'is status 200': (r) => r.status === 200,
     });
+
+    const header = response.headers['Server-Timing'];
+    if (header) {
+        header.split(',').forEach(metric => {
+            const [name, ...params] = metric.trim().split(';');
+            const duration = params.find(param => param.trim().startsWith('dur='));
+            if (serverTiming[name] && duration) {
+                serverTiming[name].add(parseFloat(duration.trim().substring(4)));
+            }
+        });
+    }
 }
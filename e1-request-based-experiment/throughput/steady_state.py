@@ -0,0 +1,51 @@
+import math
+from statistics import NormalDist
+
+DEFAULT_BATCH_SIZE = 5
+
+
+def batch_means(series, batch_size=DEFAULT_BATCH_SIZE):
+    usable = len(series) - len(series) % batch_size
+    return [sum(series[i:i + batch_size]) / batch_size for i in range(0, usable, batch_size)]
+
+
+def mser_truncation(series, batch_size=DEFAULT_BATCH_SIZE):
+    # MSER-5: choose the warm-up cut that minimises the squared standard error of the remaining batch means.
+    # Only cuts in the first half of the series are considered, as in the original heuristic.
+    batches = batch_means(series, batch_size)
+    if len(batches) < 2:
+        return 0
+
+    best_cut, best_statistic = 0, math.inf
+    for cut in range(len(batches) // 2 + 1):
+        remaining = batches[cut:]
+        mean = sum(remaining) / len(remaining)
+        statistic = sum((value - mean) ** 2 for value in remaining) / len(remaining) ** 2
+        if statistic < best_statistic:
+            best_cut, best_statistic = cut, statistic
+
+    return best_cut * batch_size
+
+
+def confidence_half_width(series, confidence=0.95, batch_size=DEFAULT_BATCH_SIZE):
+    # Half-width of the confidence interval of the mean, computed on batch means so that
+    # autocorrelated samples do not make the interval look tighter than it is
+    batches = batch_means(series, batch_size)
+    if len(batches) < 2:
+        return math.inf
+    mean = sum(batches) / len(batches)
+    variance = sum((value - mean) ** 2 for value in batches) / (len(batches) - 1)
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    return z * math.sqrt(variance / len(batches))
+
+
+def is_steady(series, confidence=0.95, relative_precision=0.05, min_batches=4, batch_size=DEFAULT_BATCH_SIZE):
+    # The series has settled once the warm-up is cut off and the mean of the rest is known
+    # within `relative_precision` at the given confidence
+    steady_part = series[mser_truncation(series, batch_size):]
+    if len(steady_part) < min_batches * batch_size:
+        return False
+    mean = sum(steady_part) / len(steady_part)
+    if mean == 0:
+        return True
+    return confidence_half_width(steady_part, confidence, batch_size) <= relative_precision * abs(mean)
@@ -7,6 +7,7 @@ import csv
 
 
 def generate_scenarios(configuration, endpoints, exclude_configs=None):
+    # `endpoints` maps each language to the endpoints its applications serve
     client = docker.from_env()
     all_containers = client.containers.list()  # Get all running containers
     scenarios = []
@@ -38,7 +39,7 @@ def generate_scenarios(configuration, endpoints, exclude_configs=None):
         # Ensure that the configuration is not in the excluded list before generating scenarios
         if config not in exclude_configs:
             # Generate scenarios for each endpoint
-            for endpoint in endpoints:
+            for endpoint in endpoints.get(language, []):
                 scenarios.append({
                     "language": language,
                     "configuration": config,
@@ -50,7 +51,7 @@ def generate_scenarios(configuration, endpoints, exclude_configs=None):
     return scenarios
 
 
-def write_to_csv(scenarios, filename, append=False, exclude_headers=None):
+def write_to_csv(scenarios, filename, append=False, exclude_headers=None, merge_headers=False):
     if exclude_headers is None:
         exclude_headers = []
     # Add a random "experiment_id" to the experiment
@@ -64,6 +65,10 @@ def write_to_csv(scenarios, filename, append=False, exclude_headers=None):
     if exclude_headers:
         headers = [h for h in headers if h not in exclude_headers]
 
+    # Optionally extend the header of an existing file with new columns, so older results stay readable
+    if merge_headers and append and os.path.isfile(filename):
+        headers = merge_csv_headers(filename, headers)
+
     if not os.path.isfile(filename):
         with open(filename, 'w') as file:
             writer = csv.DictWriter(file, fieldnames=headers)
@@ -78,9 +83,77 @@ def write_to_csv(scenarios, filename, append=False, exclude_headers=None):
             writer.writerow(row_filtered)
 
 
+def merge_csv_headers(filename, headers):
+    with open(filename, 'r', newline='') as file:
+        reader = csv.DictReader(file)
+        existing_headers = reader.fieldnames or []
+        rows = list(reader)
+
+    merged_headers = existing_headers + [h for h in headers if h not in existing_headers]
+    if merged_headers != existing_headers:
+        with open(filename, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=merged_headers)
+            writer.writeheader()
+            writer.writerows(rows)
+
+    return merged_headers
+
+
+# Tracing tiers in the order they add cost: no instrumentation, instrumentation on the no-op API,
+# SDK recording spans without export, and full export
+TRACING_TIERS = ["standard", "otel-noop", "otel-noexport", "otel"]
+TRACING_LAYERS = {"otel-noop": "api", "otel-noexport": "sdk", "otel": "export"}
+
+
+def tier_losses(scenarios):
+    # Throughput lost by each tracing layer, in percent of the uninstrumented (standard) target RPS,
+    # so the losses of the layers add up to the total loss of full OpenTelemetry export
+    target_rps = {}
+    for scenario in scenarios:
+        target_rps[(scenario["language"], scenario["endpoint"], scenario["configuration"])] = scenario.get("targetRPS")
+
+    losses = []
+    for language, endpoint in sorted({(language, endpoint) for language, endpoint, _ in target_rps}):
+        rps = [target_rps.get((language, endpoint, tier)) for tier in TRACING_TIERS]
+        # A tier that did not reach its target (0) has no throughput to compare, its loss would be bogus
+        if not all(rps):
+            continue
+
+        loss = {"language": language, "endpoint": endpoint, "standardRPS": rps[0]}
+        for layer, previous, current in zip(TRACING_LAYERS.values(), rps, rps[1:]):
+            loss[f"{layer}Loss"] = (previous - current) / rps[0] * 100
+        loss["totalLoss"] = (rps[0] - rps[-1]) / rps[0] * 100
+        losses.append(loss)
+
+    return losses
+
+
+def collector_mode_scenarios(scenarios, collector_config):
+    # Copies of the scenarios of the given configurations (by default the span processor variants),
+    # one per collector mode
+    configurations = collector_config.get("configurations", ["otel", "otel-simple", "otel-batch-tuned"])
+    copies = []
+    for mode in collector_config.get("modes", []):
+        for scenario in scenarios:
+            if scenario["configuration"] in configurations:
+                copies.append({**scenario, "collectorMode": mode["name"]})
+    return copies
+
+
+# Head sampling for the sampling-ratio scenarios, honoured by the SDKs of all languages
+SAMPLING_SAMPLER = "parentbased_traceidratio"
+
+
+def sampling_configuration(base_config, ratio):
+    # Configuration (and hostname) suffix for a sampling ratio, e.g. otel-sampling-0p01 for 0.01
+    return f"{base_config}-sampling-{format(ratio, 'g').replace('.', 'p')}"
+
+
 configuration = {
-    "python": ["standard", "otel", "elastic"],
-    "go": ["standard", "otel", "elastic"],
-    "java": ["standard", "otel", "elastic"],
-    "nodejs": ["standard", "otel", "elastic"],
+    "python": ["standard", "otel-noop", "otel-noexport", "otel", "otel-simple", "otel-batch-tuned", "elastic",
+               "gthread", "gthread-otel"],
+    "go": ["standard", "otel-noop", "otel-noexport", "otel", "otel-simple", "otel-batch-tuned", "elastic"],
+    # The Java agent and the Node.js SDK only configure the batch processor through the environment
+    "java": ["standard", "otel-noop", "otel-noexport", "otel", "otel-batch-tuned", "elastic"],
+    "nodejs": ["standard", "otel-noop", "otel-noexport", "otel", "otel-batch-tuned", "elastic"],
 }
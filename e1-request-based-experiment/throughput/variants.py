@@ -0,0 +1,65 @@
+import time
+
+import docker
+import requests
+
+READY_TIMEOUT = 120  # Seconds
+
+
+def find_container(client, hostname):
+    for container in client.containers.list():
+        if container.attrs['Config']['Hostname'] == hostname:
+            return container
+    return None
+
+
+def clone_container(client, base, hostname, environment):
+    # Start a copy of a running service with extra environment variables. The copy uses the image,
+    # command, CPU limit and networks of the base container and is reachable under `hostname`.
+    config = base.attrs['Config']
+    host_config = base.attrs['HostConfig']
+    networks = list(base.attrs['NetworkSettings']['Networks'])
+
+    # Environment variables of the base container, overridden by the variant's
+    base_environment = dict(variable.split('=', 1) for variable in config.get('Env') or [])
+    base_environment.update(environment)
+
+    # Left over from an earlier, interrupted run
+    try:
+        client.containers.get(hostname).remove(force=True)
+    except docker.errors.NotFound:
+        pass
+
+    container = client.containers.run(
+        base.image.id,
+        name=hostname,
+        hostname=hostname,
+        entrypoint=config.get('Entrypoint'),
+        command=config.get('Cmd'),
+        environment=base_environment,
+        nano_cpus=host_config.get('NanoCpus') or None,
+        cpuset_cpus=host_config.get('CpusetCpus') or None,
+        network=networks[0] if networks else None,
+        detach=True,
+    )
+    for network in networks[1:]:
+        client.networks.get(network).connect(container)
+
+    return container
+
+
+def wait_until_ready(url, timeout=READY_TIMEOUT):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url, timeout=5).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(1)
+    return False
+
+
+def remove_containers(containers):
+    for container in containers:
+        container.remove(force=True)
@@ -1,6 +1,7 @@
 import json
 import os
 import time
+import urllib.request
 from enum import Enum
 from multiprocessing.pool import ThreadPool
 from typing import List, TYPE_CHECKING
@@ -76,13 +77,51 @@ class PerfCost(Experiment):
         memory_sizes = settings["memory-sizes"]
         if len(memory_sizes) == 0:
             self.logging.info("Begin experiment")
-            self.run_configuration(settings, settings["repetitions"])
+            self.run_collector_modes(settings, "0" if settings.get("collector-modes") else "")
         for memory in memory_sizes:
             self.logging.info(f"Begin experiment on memory size {memory}")
             self._function.config.memory = memory
             self._deployment_client.update_function(self._function, self._benchmark)
             self._sebs_client.cache_client.update_function(self._function)
-            self.run_configuration(settings, settings["repetitions"], suffix=str(memory))
+            self.run_collector_modes(settings, str(memory))
+
+    def run_collector_modes(self, settings: dict, suffix: str):
+        """
+        Repeat the configuration for every collector mode of the OTLP sink
+        (e.g. a slow, lossy or unreachable tracing backend).
+        Results of a mode are stored with the mode name as the last part of the file name.
+        """
+        collector_modes = settings.get("collector-modes", [])
+        if len(collector_modes) == 0:
+            self.run_configuration(settings, settings["repetitions"], suffix=suffix)
+            return
+
+        control_url = settings["collector-control-url"]
+        try:
+            for mode in collector_modes:
+                self.logging.info(f"Begin experiment with collector mode {mode['name']}")
+                self._set_collector_mode(control_url, mode)
+                self.run_configuration(
+                    settings, settings["repetitions"], suffix=f"{suffix}_{mode['name']}"
+                )
+        finally:
+            self._set_collector_mode(control_url, {})
+
+    def _set_collector_mode(self, control_url: str, mode: dict):
+        # Fields that are not given are those of a healthy backend
+        fields = {
+            "delay-ms": "delay_ms",
+            "jitter-ms": "jitter_ms",
+            "error-rate": "error_rate",
+            "refuse": "refuse",
+        }
+        body = {"delay_ms": 0, "jitter_ms": 0, "error_rate": 0, "refuse": False}
+        body.update({field: mode[key] for key, field in fields.items() if key in mode})
+        request = urllib.request.Request(
+            f"{control_url}/mode", data=json.dumps(body).encode(), method="PUT"
+        )
+        with urllib.request.urlopen(request, timeout=30) as response:
+            self.logging.info(f"Collector mode: {response.read().decode()}")
 
     def compute_statistics(self, times: List[float]):
 
@@ -274,6 +313,7 @@ class PerfCost(Experiment):
             writer.writerow(
                 [
                     "memory",
+                    "collector_mode",
                     "type",
                     "is_cold",
                     "exec_time",
@@ -293,11 +333,16 @@ class PerfCost(Experiment):
                             sebs_client.cache_client,
                             sebs_client.generate_logging_handlers(logging_filename),
                         )
-                    fname = os.path.splitext(os.path.basename(f))[0].split("_")
+                    # The mode name may itself contain "_" and "-", so only the suffix is stripped
+                    fname = os.path.splitext(os.path.basename(f))[0]
+                    if fname.endswith("-processed"):
+                        fname = fname[: -len("-processed")]
+                    fname = fname.split("_")
                     if len(fname) > 2:
-                        memory = int(fname[2].split("-")[0])
+                        memory = int(fname[2])
                     else:
                         memory = 0
+                    collector_mode = "_".join(fname[3:])
                     exp_type = fname[0]
                 else:
 
@@ -312,6 +357,7 @@ class PerfCost(Experiment):
                         memory = int(fname[2])
                     else:
                         memory = 0
+                    collector_mode = "_".join(fname[3:])
                     exp_type = fname[0]
                     with open(f, "r") as in_f:
                         config = json.load(in_f)
@@ -359,6 +405,7 @@ class PerfCost(Experiment):
                         writer.writerow(
                             [
                                 memory,
+                                collector_mode,
                                 exp_type,
                                 invoc.stats.cold_start,
                                 invoc.times.benchmark,
@@ -0,0 +1,171 @@
+import os
+import re
+import sys
+
+# Attribution of profiled time to the categories of the experiment, directly on the function statistics
+# of a profile (pstats.Stats.stats) or on the stacks of a sampling profile (sampler.py). Functions are
+# classified by declarative rules; time spent in a function that matches no rule belongs to the category of
+# the innermost classified function that called it.
+
+CATEGORIES = ["configuration", "task", "export", "instrumentation"]
+
+# The first matching rule classifies a function. Patterns left out match anything; `module` is the dotted
+# module name derived from the file name, `filename` the path as recorded by the profiler.
+RULES = [
+    # Setting up the tracer provider, its processors and exporters, and looking up tracers
+    {"category": "configuration", "function": r"^configure_opentelemetry$"},
+    {"category": "configuration", "module": r"^opentelemetry\.(sdk\.)?trace$",
+     "function": r"^(get_tracer|get_tracer_provider|set_tracer_provider)$"},
+    # Ending a span hands it to the span processors, which export it (synchronously with the simple processor)
+    {"category": "export", "module": r"^opentelemetry\.sdk\.trace$", "function": r"^end$"},
+    # Only the exporting entry points, creating processors and exporters is part of the configuration
+    {"category": "export", "module": r"^opentelemetry\.(sdk\.trace\.export|exporter)(\.|$)",
+     "function": r"^(on_end|export|_export|force_flush)$"},
+    # Creating spans, recording data on them and propagating them
+    {"category": "instrumentation", "module": r"^opentelemetry\.(sdk\.)?trace(\.|$)",
+     "function": r"^(start_span|start_as_current_span|set_attribute|set_attributes|add_event|set_status|"
+                 r"update_name|record_exception|use_span|set_span_in_context|get_current_span)$"},
+    {"category": "instrumentation", "module": r"^opentelemetry\.(context|instrumentation)(\.|$)"},
+    # The benchmark workloads
+    {"category": "task", "module": r"(^|\.)(dynamic_html|graph_pagerank)\.main$", "function": r"^task$"},
+]
+
+_module_names = {}
+
+
+def module_name(filename):
+    # e.g. /usr/local/lib/python3.9/site-packages/opentelemetry/sdk/trace/__init__.py -> opentelemetry.sdk.trace
+    if filename not in _module_names:
+        name = ""
+        if filename.endswith(".py"):
+            for path in sorted((os.path.abspath(path) for path in sys.path if path), key=len, reverse=True):
+                if filename.startswith(path + os.sep):
+                    name = os.path.relpath(filename, path)[:-len(".py")].replace(os.sep, ".")
+                    if name.endswith(".__init__"):
+                        name = name[:-len(".__init__")]
+                    break
+        _module_names[filename] = name
+    return _module_names[filename]
+
+
+def compile_rules(rules):
+    return [(rule["category"], {field: re.compile(rule[field]) for field in ("module", "filename", "function")
+                                if field in rule})
+            for rule in rules]
+
+
+def classify(func, compiled_rules):
+    filename, _, function = func
+    fields = {"module": module_name(filename), "filename": filename, "function": function}
+    for category, patterns in compiled_rules:
+        if all(pattern.search(fields[field]) for field, pattern in patterns.items()):
+            return category
+    return None
+
+
+def code_key(code):
+    # The key of a code object in the profile statistics
+    return code.co_filename, code.co_firstlineno, code.co_name
+
+
+def function_key(function):
+    return code_key(function.__code__)
+
+
+def _edge_weight(edge):
+    # (cc, nc, tt, ct) of the calls from one caller; older Pythons only record the call count
+    if isinstance(edge, tuple):
+        return edge[3] or edge[1]
+    return edge
+
+
+def category_shares(stats, classes):
+    # For every function the share of its time per category: its own class, or the shares of its callers
+    # weighted by the time spent in it from each of them. Recursive calls are ignored, and so are the
+    # callers that are only reached again through a cycle. Functions without a classified ancestor get {}.
+    shares = {}
+    for start in stats:
+        if start in shares:
+            continue
+        # Iterative depth-first search over the callers, so deep call graphs do not hit the recursion limit
+        in_progress = {start}
+        stack = [(start, iter(stats[start][4]))]
+        while stack:
+            func, callers = stack[-1]
+            if classes.get(func) is not None:
+                shares[func] = {classes[func]: 1.0}
+                in_progress.discard(func)
+                stack.pop()
+                continue
+            for caller in callers:
+                if caller != func and caller in stats and caller not in shares and caller not in in_progress:
+                    in_progress.add(caller)
+                    stack.append((caller, iter(stats[caller][4])))
+                    break
+            else:
+                total, share = 0.0, {}
+                for caller, edge in stats[func][4].items():
+                    if caller == func:
+                        continue
+                    weight = _edge_weight(edge)
+                    total += weight
+                    for category, fraction in shares.get(caller, {}).items():
+                        share[category] = share.get(category, 0.0) + weight * fraction
+                shares[func] = {category: value / total for category, value in share.items()} if total else {}
+                in_progress.discard(func)
+                stack.pop()
+    return shares
+
+
+def attribute(stats, root, rules=None):
+    # Time in milliseconds per category for the call of `root` (a profile key, see function_key) and its
+    # callees. Time under the root that no rule claims is task time, so the categories add up to the total.
+    compiled_rules = _COMPILED_RULES if rules is None else compile_rules(rules)
+    classes = {func: classify(func, compiled_rules) for func in stats}
+    classes[root] = classes.get(root) or "task"
+    shares = category_shares(stats, classes)
+
+    times = {category: 0.0 for category in CATEGORIES}
+    for func, (_, _, tottime, _, _) in stats.items():
+        for category, fraction in shares.get(func, {}).items():
+            times[category] += tottime * fraction * 1_000
+
+    times["total"] = stats[root][3] * 1_000 if root in stats else sum(times.values())
+    times["task"] += times["total"] - sum(times[category] for category in CATEGORIES)
+    return times
+
+
+def attribute_samples(samples, root, duration, rules=None):
+    # Time in milliseconds per category for a call of the code object `root` that took `duration` ms, from
+    # the (weight, stack) samples taken during it. The stacks show exactly which classified function is the
+    # innermost, so no call graph is needed; the categories get their share of the sampled time.
+    compiled_rules = _COMPILED_RULES if rules is None else compile_rules(rules)
+    classes = _code_classes if rules is None else {}
+
+    weights = {category: 0.0 for category in CATEGORIES}
+    for weight, stack in samples:
+        # Frames above the root belong to the profiler, samples without the root were taken around the call
+        if root not in stack:
+            continue
+        root_index = len(stack) - 1 - stack[::-1].index(root)
+        category = "task"
+        for code in stack[:root_index + 1]:
+            if code not in classes:
+                classes[code] = classify(code_key(code), compiled_rules)
+            if classes[code] is not None:
+                category = classes[code]
+                break
+        weights[category] += weight
+
+    sampled = sum(weights.values())
+    if not sampled:
+        # Too short to be sampled
+        weights["task"] = sampled = 1.0
+    times = {category: weights[category] / sampled * duration for category in CATEGORIES}
+    times["total"] = duration
+    return times
+
+
+_COMPILED_RULES = compile_rules(RULES)
+# Classes of the code objects seen in samples, with the default rules
+_code_classes = {}
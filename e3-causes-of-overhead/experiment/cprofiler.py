@@ -1,12 +1,91 @@
 import cProfile
 import pstats
 import time
-from io import StringIO
 import os
 from functools import wraps
 
+from attribution import attribute, attribute_samples, function_key
+from monitor import Monitor
+from sampler import Sampler, DEFAULT_FREQUENCY
+
 PROFILE_DIR = "profiles"
 
+# "cprofile" traces every call, "sampling" samples the stacks SAMPLING_FREQUENCY times per second without a hook
+# on calls (see sampler.py), so the profiler does not inflate the time of the many small OpenTelemetry calls.
+# "monitoring" (Python 3.12+) only times the OpenTelemetry SDK and the task entry points (see monitor.py).
+PROFILER_MODES = ["cprofile", "sampling", "monitoring"]
+PROFILER_MODE = os.getenv("PROFILER_MODE", "cprofile")
+SAMPLING_FREQUENCY = int(os.getenv("SAMPLING_FREQUENCY", DEFAULT_FREQUENCY))
+# "real" (wall-clock) or "cpu"
+SAMPLING_TIMER = os.getenv("SAMPLING_TIMER", "real")
+
+_sampler = None
+_monitor = None
+
+
+def get_sampler():
+    # One sampler per process, created by the main thread (which installs the signal handler) when the
+    # decorators are applied and shared by all threads that handle requests
+    global _sampler
+    if _sampler is None:
+        _sampler = Sampler(SAMPLING_FREQUENCY, SAMPLING_TIMER)
+    return _sampler
+
+
+def get_monitor():
+    # One monitor per process, sys.monitoring tools are process-wide
+    global _monitor
+    if _monitor is None:
+        _monitor = Monitor()
+    return _monitor
+
+
+def run_profiled(func, args, kwargs):
+    # The result of the call, its time per category in milliseconds and, with the monitoring profiler, the calls
+    # and inclusive milliseconds per OpenTelemetry function
+    if PROFILER_MODE == "monitoring":
+        monitor = get_monitor()
+        monitor.start()
+        start_time = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            times, functions = monitor.stop((time.perf_counter() - start_time) * 1_000)
+        return result, times, functions
+
+    if PROFILER_MODE == "sampling":
+        sampler = get_sampler()
+        sampler.start()
+        start_time = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            duration = (time.perf_counter() - start_time) * 1_000
+            samples = sampler.stop()
+        return result, attribute_samples(samples, func.__code__, duration), None
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    result = func(*args, **kwargs)
+    profiler.disable()
+
+    ps = pstats.Stats(profiler)
+
+    # For debugging
+    # ps.sort_stats('cumulative').print_stats()
+
+    return result, attribute(ps.stats, function_key(func)), None
+
+
+def check_profiler_mode():
+    # Fails early, and creates the sampler in the main thread
+    if PROFILER_MODE not in PROFILER_MODES:
+        raise ValueError(f"Unknown profiler mode: {PROFILER_MODE}")
+    if PROFILER_MODE == "sampling":
+        get_sampler()
+    elif PROFILER_MODE == "monitoring":
+        get_monitor()
+
 
 # Convert pstats to microseconds
 def f8(x):
@@ -24,6 +103,7 @@ def filter_opentelemetry_stats(full_stats):
         "opentelemetry.",
         "otlp_exporter.",
         "SimpleSpanProcessor.",
+        "BatchSpanProcessor.",
         "ConsoleSpanExporter.",
         "TracerProvider."
     ]
@@ -43,98 +123,22 @@ def filter_opentelemetry_stats(full_stats):
     return filtered_stats
 
 
-def profile_function(times_dict_list, experiment_name, start_mode):
+def profile_function(times_dict_list, experiment_name, start_mode, function_stats_list=None):
+    # function_stats_list receives the calls and inclusive time per OpenTelemetry function of every run,
+    # only the monitoring profiler records them
     def decorator(func):
+        check_profiler_mode()
+
         def wrapper(*args, **kwargs):
-            profiler = cProfile.Profile()
-            profiler.enable()
+            result, func_times, function_stats = run_profiled(func, args, kwargs)
 
-            start_time = time.time()
-            result = func(*args, **kwargs)
-            end_time = time.time()
-
-            profiler.disable()
-
-            s = StringIO()
-            sortby = 'cumulative'
-            ps = pstats.Stats(profiler, stream=s).sort_stats(sortby)
-            ps.print_stats()
-            full_stats = s.getvalue()
-
-            # For debugging
-            # print(full_stats)
-
-            # Initialize the function times dictionary
-            func_times = {
-                "(configure_opentelemetry)": 0.0,
-                "(task)": 0.0,
-                "(end)": 0.0,
-                "(start_span)": 0.0,
-                "(workload)": 0.0,
-                "(add_event)": 0.0,
-                "(set_attribute)": 0.0,
-                "(set_span_in_context)": 0.0
-            }
-
-            start_span_calls = 0  # Count of how many times start_span was called
-            end_calls = 0  # Count of how many times end was called
-
-            # Extract times for each function of interest
-            for func_name in func_times.keys():
-                for line in full_stats.split('\n'):
-                    if func_name in line:
-                        parts = line.split()
-                        if len(parts) > 3:
-                            try:
-                                # Convert from microseconds to milliseconds
-                                func_times[func_name] = float(parts[3]) / 1_000  # Cumulative time column
-
-                                # If this is a "start_span" line, increment the counter
-                                if func_name == "(start_span)":
-                                    start_span_calls = int(parts[0])  # The number of calls is in the first column
-
-                                # If this is an "end" line, increment the counter
-                                if func_name == "(end)":
-                                    end_calls = int(parts[0])  # The number of calls is in the first column
-                            except ValueError:
-                                continue
-
-            # Calculate the adjusted time for the task function
-            task_time_adjusted = func_times["(task)"] - (
-                    func_times["(add_event)"] +
-                    func_times["(set_attribute)"] +
-                    func_times["(set_span_in_context)"]
-            )
-
-            # Deduct the time for n-1 start_span calls, only if more than 1 start_span was called
-            if start_span_calls > 1:
-                task_time_adjusted -= (start_span_calls - 1) * (func_times["(start_span)"] / start_span_calls)
-
-            # Deduct the time for n-1 end calls, only if more than 1 end was called
-            if end_calls > 1:
-                task_time_adjusted -= (end_calls - 1) * (func_times["(end)"] / end_calls)
-
-            # Calculate the total instrumentation time
-            instrumentation_time = (
-                    func_times.pop("(start_span)") +
-                    func_times["(add_event)"] +
-                    func_times["(set_attribute)"] +
-                    func_times["(set_span_in_context)"]
-            )
-
-            # Rename the functions in func_times dictionary and add the adjusted times
-            renamed_func_times = {
-                "configuration": func_times.pop("(configure_opentelemetry)"),
-                "task": task_time_adjusted,  # Adjusted task time
-                "export": func_times.pop("(end)"),
-                "instrumentation": instrumentation_time,  # Total instrumentation time
-                "total": func_times.pop("(workload)")
-            }
-
-            renamed_func_times = normalize_percentages(renamed_func_times)
+            # Configuration, task, export and instrumentation time of the workload, in milliseconds
+            func_times = normalize_percentages(func_times)
 
             # Append this run's function times to the list
-            times_dict_list.append(renamed_func_times)
+            times_dict_list.append(func_times)
+            if function_stats_list is not None and function_stats is not None:
+                function_stats_list.append(function_stats)
 
             return result
 
@@ -143,78 +147,21 @@ def profile_function(times_dict_list, experiment_name, start_mode):
     return decorator
 
 
-def profile_route(profiling_data_list, endpoint_name=""):
+def profile_route(profiling_data_list, endpoint_name="", function_stats_list=None):
+    # endpoint_name is kept for the call sites, the endpoint is identified by the decorated function itself
     def decorator(func2):
+        check_profiler_mode()
+
         @wraps(func2)
         def wrapper(*args, **kwargs):
-            profiler = cProfile.Profile()
-            profiler.enable()
-
-            start_time = time.time()
-            result = func2(*args, **kwargs)
-            end_time = time.time()
-
-            profiler.disable()
-
-            # Capture the profiling data
-            s = StringIO()
-            ps = pstats.Stats(profiler, stream=s)
-            ps.print_stats()
-
-            full_stats = s.getvalue()
-            # print(full_stats)
-
-            # Define the categories for OpenTelemetry-related functions
-            config_functions = ['configure_opentelemetry', 'get_tracer']
-            instrumentation_functions = ['start_span', 'set_attribute']
-            exporting_functions = ['end']
-            total_time_function = endpoint_name
-
-            # Initialize the time tracking
-            time_spent = {
-                'configuration': 0,
-                'task': 0,
-                'export': 0,
-                'instrumentation': 0,
-                'total': 0,
-            }
-
-            # Analyze the stats
-            for func, stat in ps.stats.items():
-                filename, line, funcname = func
-
-                # Convert from seconds to milliseconds
-                tottime = stat[2] * 1_000
-                cumtime = stat[3] * 1_000
-
-                # Determine the category
-                if any(fn == funcname for fn in config_functions):
-                    # The get_tracer line
-                    if line == 490:
-                        time_spent['configuration'] += cumtime
-                elif any(fn == funcname for fn in instrumentation_functions):
-                    time_spent['instrumentation'] += cumtime
-                elif any(fn == funcname for fn in exporting_functions):
-                    time_spent['export'] += cumtime
-                elif funcname == total_time_function:
-                    time_spent['total'] = cumtime
-
-                # Handle special case for specific functions
-                elif 'opentelemetry/instrumentation/sqlalchemy' in filename:
-                    time_spent['instrumentation'] += tottime
-                elif funcname == 'use_span':
-                    time_spent['instrumentation'] += tottime
-
-            # Calculate task time as total minus other categories
-            time_spent['task'] = (
-                    time_spent['total'] -
-                    (time_spent['configuration'] +
-                     time_spent['instrumentation'] +
-                     time_spent['export'])
-            )
+            # The same categories as for the workloads, the task is the endpoint minus the other categories
+            result, time_spent, function_stats = run_profiled(func2, args, kwargs)
+            time_spent = normalize_percentages(time_spent)
 
             # Append the results to the profiling data list
             profiling_data_list.append(time_spent)
+            if function_stats_list is not None and function_stats is not None:
+                function_stats_list.append(function_stats)
 
             return result
 
@@ -1,19 +1,25 @@
 from flask import Flask, jsonify, request, Response, current_app
 from flask_sqlalchemy import SQLAlchemy
 import random
+from sqlalchemy import case, update
 from sqlalchemy.sql.expression import func
 import os
 from cprofiler import profile_route
+from span_processors import create_span_processor
 
 from opentelemetry import trace
 from opentelemetry.instrumentation.flask import FlaskInstrumentor
 from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
 from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import SimpleSpanProcessor
 from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
 from opentelemetry.sdk.resources import Resource
 
 OTLP_ENDPOINT = os.getenv("OTLP_ENDPOINT", "http://localhost:4317")
+# "per-row": the update endpoints record spans per row or statement.
+# "aggregate": one span per request with the row counts as attributes instead.
+DB_SPAN_MODE = os.getenv("DB_SPAN_MODE", "per-row")
+# The per-statement spans of the SQLAlchemy instrumentation, for every endpoint and independent of DB_SPAN_MODE
+SQLALCHEMY_INSTRUMENTATION = os.getenv("SQLALCHEMY_INSTRUMENTATION", "true").lower() == "true"
 
 
 def configure_opentelemetry(app, db, service_name):
@@ -27,7 +33,7 @@ def configure_opentelemetry(app, db, service_name):
         endpoint=OTLP_ENDPOINT,
         insecure=True
     )
-    span_processor = SimpleSpanProcessor(otlp_exporter)
+    span_processor = create_span_processor(otlp_exporter)
     provider.add_span_processor(span_processor)
 
     trace.set_tracer_provider(provider)
@@ -36,14 +42,25 @@ def configure_opentelemetry(app, db, service_name):
     FlaskInstrumentor().instrument_app(app)
 
     # Instrument SQLAlchemy with OpenTelemetry
-    SQLAlchemyInstrumentor().instrument(engine=db.engine)
+    if SQLALCHEMY_INSTRUMENTATION:
+        SQLAlchemyInstrumentor().instrument(engine=db.engine)
 
     tracer = trace.get_tracer("function")
 
     return tracer
 
 
-def create_app(profiling_data):
+def set_db_span_attributes(span, statements, rows_read, rows_updated):
+    """
+    Attributes of the aggregated DB span, which stands in for the spans of all statements of a request.
+    """
+    span.set_attribute("db.system", "postgresql")
+    span.set_attribute("db.statement_count", statements)
+    span.set_attribute("db.rows_read", rows_read)
+    span.set_attribute("db.rows_updated", rows_updated)
+
+
+def create_app(profiling_data, function_stats=None):
     app = Flask(__name__)
 
     DB_HOST = os.getenv("DB_HOST", "localhost")
@@ -75,7 +92,7 @@ def create_app(profiling_data):
         return jsonify({"message": "Hello, World!"})
 
     @app.route("/db")
-    @profile_route(profiling_data, "single_db_query")
+    @profile_route(profiling_data, "single_db_query", function_stats)
     def single_db_query():
         tracer = trace.get_tracer("function")
         span = tracer.start_span("db-endpoint")
@@ -105,7 +122,7 @@ def create_app(profiling_data):
         return response
 
     @app.route('/updates', methods=['GET'])
-    @profile_route(profiling_data, "updates")
+    @profile_route(profiling_data, "updates", function_stats)
     def updates():
         tracer = trace.get_tracer("function")
         span = tracer.start_span("updates-endpoint")
@@ -116,22 +133,77 @@ def create_app(profiling_data):
 
         span.set_attribute("query_count", query_count)
 
-        for _ in range(query_count):
-            random_id = random.randint(1, 10000)
+        if DB_SPAN_MODE == "per-row":
+            for _ in range(query_count):
+                random_id = random.randint(1, 10000)
+
+                query_span = tracer.start_span("db-query")
+                world = World.query.filter_by(id=random_id).first()
+                query_span.set_attribute("random_id", random_id)
+                query_span.end()
+
+                update_span = tracer.start_span("db-update")
+                world.randomNumber = random.randint(1, 10000)
+                worlds.append(world.to_dict())
+                update_span.set_attribute("new_random_number", world.randomNumber)
+                update_span.end()
+        else:
+            db_span = tracer.start_span("db-updates")
+            for _ in range(query_count):
+                world = World.query.filter_by(id=random.randint(1, 10000)).first()
+                world.randomNumber = random.randint(1, 10000)
+                worlds.append(world.to_dict())
+            # Like the per-row branch this assigns the unmapped randomNumber attribute, so the commit issues
+            # no UPDATE and only the SELECTs run
+            set_db_span_attributes(db_span, statements=query_count, rows_read=len(worlds), rows_updated=0)
+            db_span.end()
+
+        db.session.commit()
+
+        span.end()
+        return jsonify(worlds)
 
-            query_span = tracer.start_span("db-query")
-            world = World.query.filter_by(id=random_id).first()
-            query_span.set_attribute("random_id", random_id)
+    @app.route('/updates-bulk', methods=['GET'])
+    @profile_route(profiling_data, "updates_bulk", function_stats)
+    def updates_bulk():
+        """
+        /updates with one SELECT ... IN for all ids and one UPDATE ... CASE for all new numbers.
+        """
+        tracer = trace.get_tracer("function")
+        span = tracer.start_span("updates-bulk-endpoint")
+        query_count = request.args.get('queries', 1, type=int)
+        query_count = min(max(query_count, 1), 500)
 
-            update_span = tracer.start_span("db-update")
-            world.randomNumber = random.randint(1, 10000)
-            worlds.append(world.to_dict())
-            update_span.set_attribute("new_random_number", world.randomNumber)
+        span.set_attribute("query_count", query_count)
 
+        random_ids = [random.randint(1, 10000) for _ in range(query_count)]
+        db_span = tracer.start_span("db-query" if DB_SPAN_MODE == "per-row" else "db-updates")
+        found_ids = {world.id for world in World.query.filter(World.id.in_(random_ids))}
+
+        # An id drawn twice is updated once
+        random_numbers = {world_id: random.randint(1, 10000) for world_id in found_ids}
+        if DB_SPAN_MODE == "per-row":
+            db_span.set_attribute("rows_read", len(found_ids))
+            db_span.end()
+            db_span = tracer.start_span("db-update")
+        if random_numbers:
+            db.session.execute(
+                update(World)
+                .where(World.id.in_(random_numbers))
+                .values(randomnumber=case(random_numbers, value=World.id))
+                .execution_options(synchronize_session=False)
+            )
+        if DB_SPAN_MODE == "per-row":
+            db_span.set_attribute("rows_updated", len(random_numbers))
+        else:
+            set_db_span_attributes(db_span, statements=2 if random_numbers else 1, rows_read=len(found_ids),
+                                   rows_updated=len(random_numbers))
+        db_span.end()
         db.session.commit()
 
         span.end()
-        return jsonify(worlds)
+        return jsonify([{'id': world_id, 'randomNumber': random_numbers[world_id]}
+                        for world_id in random_ids if world_id in random_numbers])
 
     return app, db
 
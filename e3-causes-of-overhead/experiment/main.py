@@ -1,27 +1,35 @@
 import os
 import multiprocessing
+import multiprocessing.connection
 
-from cprofiler import profile_function
+from cprofiler import profile_function, PROFILER_MODE
+from result_buffer import ResultBuffer
+from span_processors import create_span_processor
 from dynamic_html.main import task as dynamic_html_task
 from graph_pagerank.main import task as graph_pagerank_task
 
-from utils import save_aggregated_statistics, save_each_run_results, dynamic_html_event, graph_pagerank_event
+from utils import save_aggregated_statistics, save_each_run_results, dynamic_html_event, graph_pagerank_event, \
+    OTLP_SINK_URL, read_export_totals, save_export_statistics, save_function_statistics
 
 # OpenTelemetry Libraries
 from opentelemetry import trace
 from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import SimpleSpanProcessor
 from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
 from opentelemetry.sdk.resources import Resource
 
 OTLP_ENDPOINT = os.getenv("OTLP_ENDPOINT", "http://localhost:4317")
 EXPERIMENT_NAME_DYNAMIC_HTML = "dynamic-html"
 EXPERIMENT_NAME_GRAPH_PAGERANK = "graph-pagerank"
+SERVICE_NAME = "e3"
+# Iterations run one after another by default. With PARALLEL_RUNS > 1 that many run at a time in fresh
+# (spawned) processes, each pinned to its own core of RUN_CPUS (e.g. "0-3,6", default: all cores available).
+PARALLEL_RUNS = int(os.getenv("PARALLEL_RUNS", 1))
+RUN_CPUS = os.getenv("RUN_CPUS", "")
 
 tracer = None
 
 
-def run_single_workload(times_dict_list, _experiment_name, _start_mode):
+def run_single_workload(times_dict_list, _experiment_name, _start_mode, function_stats_list=None):
     _event = {}
     global tracer
     # Pre-configure OpenTelemetry for warm start
@@ -34,7 +42,7 @@ def run_single_workload(times_dict_list, _experiment_name, _start_mode):
     if _experiment_name == EXPERIMENT_NAME_DYNAMIC_HTML:
         _event = dynamic_html_event
 
-        @profile_function(times_dict_list, _experiment_name, _start_mode)
+        @profile_function(times_dict_list, _experiment_name, _start_mode, function_stats_list)
         def workload(event):
             if tracer is None:
                 # Cold
@@ -48,7 +56,7 @@ def run_single_workload(times_dict_list, _experiment_name, _start_mode):
     elif _experiment_name == EXPERIMENT_NAME_GRAPH_PAGERANK:
         _event = graph_pagerank_event
 
-        @profile_function(times_dict_list, _experiment_name, _start_mode)
+        @profile_function(times_dict_list, _experiment_name, _start_mode, function_stats_list)
         def workload(event):
             if tracer is None:
                 # Cold
@@ -66,28 +74,99 @@ def run_single_workload(times_dict_list, _experiment_name, _start_mode):
 
     workload(_event)
 
+    # The process exits without running atexit handlers, so spans still queued in a batch
+    # processor are exported here, outside of the profiled workload
+    provider = trace.get_tracer_provider()
+    if hasattr(provider, "force_flush"):
+        provider.force_flush()
 
-def run_workloads_sequentially(num_runs, experiment_name, start_mode):
-    times_dict_list = multiprocessing.Manager().list()
+
+def run_workloads_sequentially(num_runs, experiment_name, start_mode, function_stats_list=None):
+    # Every run writes its times into its own slot of the shared buffer, which the caller releases
+    results = ResultBuffer(num_runs)
 
     for i in range(num_runs):
-        p = multiprocessing.Process(target=run_single_workload, args=(times_dict_list, experiment_name, start_mode))
+        p = multiprocessing.Process(target=run_single_workload,
+                                    args=(results.at_slot(i), experiment_name, start_mode, function_stats_list))
         p.start()
         p.join()  # Wait for the process to finish before starting the next one
         print("Finished iteration:", i+1)
 
-    return list(times_dict_list)
+    return results
+
+
+def parse_cpus(value):
+    # e.g. "0-3,6", empty for the cores this process may run on
+    if not value:
+        return sorted(os.sched_getaffinity(0))
+    cpus = []
+    for part in value.split(","):
+        start, _, end = part.partition("-")
+        cpus.extend(range(int(start), int(end or start) + 1))
+    return cpus
+
+
+def run_pooled_workload(connection, results, experiment_name, start_mode, cpu, record_function_stats):
+    # Entry point of a pool process, which writes its times into its slot of the shared buffer and sends the
+    # function statistics back once after the workload
+    os.sched_setaffinity(0, {cpu})
+    function_stats_list = [] if record_function_stats else None
+    run_single_workload(results, experiment_name, start_mode, function_stats_list)
+    connection.send(function_stats_list)
+    connection.close()
+
+
+def run_workloads_in_pool(num_runs, experiment_name, start_mode, workers, cpus, function_stats_list=None):
+    # Like run_workloads_sequentially, but `workers` iterations run at a time. The processes are spawned, so
+    # every iteration starts a fresh interpreter that inherits nothing from this process, i.e. a cold start.
+    if workers > len(cpus):
+        print(f"Only {len(cpus)} cores for {workers} parallel runs, running {len(cpus)} at a time")
+        workers = len(cpus)
+    context = multiprocessing.get_context("spawn")
+    free_cpus = list(cpus[:workers])
+    running = {}
+    results = ResultBuffer(num_runs)
+    started = finished = 0
+
+    while finished < num_runs:
+        while free_cpus and started < num_runs:
+            cpu = free_cpus.pop(0)
+            receiver, sender = context.Pipe(duplex=False)
+            p = context.Process(target=run_pooled_workload,
+                                args=(sender, results.at_slot(started), experiment_name, start_mode, cpu,
+                                      function_stats_list is not None))
+            p.start()
+            # Only the child holds the sending end, so a crashed child shows up as the end of the pipe
+            sender.close()
+            running[receiver] = (p, cpu)
+            started += 1
+
+        for receiver in multiprocessing.connection.wait(list(running)):
+            p, cpu = running.pop(receiver)
+            try:
+                run_function_stats = receiver.recv()
+                if function_stats_list is not None:
+                    function_stats_list.extend(run_function_stats)
+            except EOFError:
+                print(f"Iteration on core {cpu} did not return results")
+            receiver.close()
+            p.join()
+            free_cpus.append(cpu)
+            finished += 1
+            print("Finished iteration:", finished)
+
+    return results
 
 
 def configure_opentelemetry():
-    resource = Resource(attributes={"service.name": "e3"})
+    resource = Resource(attributes={"service.name": SERVICE_NAME})
     provider = TracerProvider(resource=resource)
 
     otlp_exporter = OTLPSpanExporter(
         endpoint=OTLP_ENDPOINT,
         insecure=True
     )
-    span_processor = SimpleSpanProcessor(otlp_exporter)
+    span_processor = create_span_processor(otlp_exporter)
     provider.add_span_processor(span_processor)
 
     trace.set_tracer_provider(provider)
@@ -105,13 +184,35 @@ if __name__ == "__main__":
     print("Experiment name: ", experiment_name)
     print("Start mode: ", start_mode)
 
-    # Run the workloads and get the execution times
-    _times_dict_list = run_workloads_sequentially(iterations, experiment_name, start_mode)
+    if OTLP_SINK_URL:
+        export_totals = read_export_totals(SERVICE_NAME)
+
+    # Run the workloads and get the execution times, and the calls and inclusive time per OpenTelemetry
+    # function that only the monitoring profiler records
+    if PARALLEL_RUNS > 1:
+        print("Parallel runs: ", PARALLEL_RUNS)
+        _function_stats_list = [] if PROFILER_MODE == "monitoring" else None
+        _results = run_workloads_in_pool(iterations, experiment_name, start_mode, PARALLEL_RUNS, parse_cpus(RUN_CPUS),
+                                         _function_stats_list)
+    else:
+        _function_stats_list = multiprocessing.Manager().list() if PROFILER_MODE == "monitoring" else None
+        _results = run_workloads_sequentially(iterations, experiment_name, start_mode, _function_stats_list)
+
+    # Spans and bytes received by the OTLP sink, every run flushes its spans before it exits
+    if OTLP_SINK_URL:
+        save_export_statistics(export_totals, read_export_totals(SERVICE_NAME), iterations,
+                               filename=f"output/{experiment_name}_{start_mode}_{iterations}_export_statistics.csv")
 
     # Save the results of each run to a CSV file
-    save_each_run_results(_times_dict_list,
+    save_each_run_results(_results,
                           filename=f"output/{experiment_name}_{start_mode}_{iterations}_each_run_results.csv")
 
     # Save the aggregated statistics to a different CSV file
-    save_aggregated_statistics(_times_dict_list,
+    save_aggregated_statistics(_results,
                                filename=f"output/{experiment_name}_{start_mode}_{iterations}_aggregated_statistics.csv")
+
+    if _function_stats_list is not None:
+        save_function_statistics(list(_function_stats_list),
+                                 filename=f"output/{experiment_name}_{start_mode}_{iterations}_function_statistics.csv")
+
+    _results.release()
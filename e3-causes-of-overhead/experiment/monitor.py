@@ -0,0 +1,131 @@
+import re
+import sys
+import threading
+import time
+
+from attribution import CATEGORIES, classify, code_key, compile_rules, module_name, RULES
+
+# Call accounting with PEP 669 (sys.monitoring, Python 3.12+): only the functions of the OpenTelemetry SDK and
+# exporter packages and the functions classified by the attribution rules (e.g. the task entry points) are
+# timed. Every other code object reports its first start or return once and is then disabled, so unlike with
+# cProfile the rest of the program runs without a hook. Gives exact call counts and inclusive times of the
+# monitored functions, and the time per category like the other profilers.
+
+TOOL_NAME = "e3-profiler"
+MONITORED_MODULES = re.compile(r"^opentelemetry\.(sdk|exporter)(\.|$)")
+
+
+class Session:
+    # The monitored frames of one thread during one profiled call
+
+    def __init__(self):
+        # [code, category, start, time in monitored callees]
+        self.stack = []
+        self.self_times = {category: 0.0 for category in CATEGORIES}
+        # code -> [calls, inclusive seconds], recursive calls are only counted once in the inclusive time
+        self.functions = {}
+        self.active = {}
+
+
+class Monitor:
+
+    def __init__(self, rules=None):
+        if not hasattr(sys, "monitoring"):
+            raise RuntimeError("PROFILER_MODE=monitoring requires Python 3.12 or newer")
+        self.rules = compile_rules(RULES if rules is None else rules)
+        # code -> category (None when monitored without one), or False when not monitored
+        self.classes = {}
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+        monitoring = sys.monitoring
+        self.tool = monitoring.PROFILER_ID
+        monitoring.use_tool_id(self.tool, TOOL_NAME)
+        events = monitoring.events
+        # A generator (e.g. the use_span context manager) is timed while it runs, not while it is suspended
+        for event, callback in [(events.PY_START, self._start), (events.PY_RESUME, self._resume),
+                                (events.PY_RETURN, self._return), (events.PY_YIELD, self._return),
+                                (events.PY_UNWIND, self._unwind)]:
+            monitoring.register_callback(self.tool, event, callback)
+        self.events = events.PY_START | events.PY_RESUME | events.PY_RETURN | events.PY_YIELD | events.PY_UNWIND
+
+    def _class(self, code):
+        if code not in self.classes:
+            category = classify(code_key(code), self.rules)
+            monitored = category is not None or MONITORED_MODULES.search(module_name(code.co_filename))
+            self.classes[code] = category if monitored else False
+        return self.classes[code]
+
+    def _enter(self, code, call):
+        category = self._class(code)
+        if category is False:
+            return sys.monitoring.DISABLE
+        session = self.sessions.get(threading.get_ident())
+        if session is None:
+            return None
+        stack = session.stack
+        stack.append([code, category or (stack[-1][1] if stack else "task"), time.perf_counter(), 0.0])
+        function = session.functions.setdefault(code, [0, 0.0])
+        if call:
+            function[0] += 1
+        session.active[code] = session.active.get(code, 0) + 1
+        return None
+
+    def _leave(self, code):
+        now = time.perf_counter()
+        session = self.sessions.get(threading.get_ident())
+        # Frames entered before the session started are not on the stack
+        if session is None or not session.stack or session.stack[-1][0] is not code:
+            return
+        _, category, start, callee_time = session.stack.pop()
+        elapsed = now - start
+        session.self_times[category] += elapsed - callee_time
+        if session.stack:
+            session.stack[-1][3] += elapsed
+        session.active[code] -= 1
+        if not session.active[code]:
+            session.functions[code][1] += elapsed
+
+    def _start(self, code, offset):
+        return self._enter(code, call=True)
+
+    def _resume(self, code, offset):
+        return self._enter(code, call=False)
+
+    def _return(self, code, offset, value):
+        if self._class(code) is False:
+            return sys.monitoring.DISABLE
+        self._leave(code)
+        return None
+
+    def _unwind(self, code, offset, exception):
+        # Cannot be disabled, raised exceptions are rare in the monitored code
+        if self.classes.get(code, False) is not False:
+            self._leave(code)
+
+    def start(self):
+        # Monitor the calling thread until it calls stop
+        with self.lock:
+            self.sessions[threading.get_ident()] = Session()
+            if len(self.sessions) == 1:
+                sys.monitoring.set_events(self.tool, self.events)
+
+    def stop(self, duration):
+        # Time per category in milliseconds of a call that took `duration` ms, and the calls and inclusive
+        # milliseconds per monitored function, e.g. {"opentelemetry.sdk.trace:Tracer.start_span": [3, 0.12]}
+        with self.lock:
+            session = self.sessions.pop(threading.get_ident())
+            if not self.sessions:
+                sys.monitoring.set_events(self.tool, 0)
+
+        times = {category: session.self_times[category] * 1_000 for category in CATEGORIES}
+        # The task is what the other categories leave of the call, including the code that is not monitored
+        times["task"] = duration - sum(times[category] for category in CATEGORIES if category != "task")
+        times["total"] = duration
+        functions = {function_name(code): [calls, inclusive * 1_000]
+                     for code, (calls, inclusive) in session.functions.items()}
+        return times, functions
+
+
+def function_name(code):
+    return f"{module_name(code.co_filename) or code.co_filename}:{getattr(code, 'co_qualname', code.co_name)}"
@@ -3,31 +3,36 @@ import os
 import requests
 import multiprocessing
 import time
+from cprofiler import PROFILER_MODE
 from flask_app.app import configure_opentelemetry, create_app
 from multiprocessing import Manager
-from utils import save_aggregated_statistics, save_each_run_results
+from result_buffer import ResultBuffer
+from utils import save_aggregated_statistics, save_each_run_results, OTLP_SINK_URL, read_export_totals, \
+    save_export_statistics, save_function_statistics
 
+SERVICE_NAME = "e3-request-based-flask"
 
-def run_flask_app(profiling_data, port):
+
+def run_flask_app(profiling_data, port, function_stats=None):
     # Create a Flask app instance
-    app, db = create_app(profiling_data)
+    app, db = create_app(profiling_data, function_stats)
 
     # Configure OpenTelemetry within the application context
     with app.app_context():
-        configure_opentelemetry(app, db, "e3-request-based-flask")
+        configure_opentelemetry(app, db, SERVICE_NAME)
 
     app.run(host="0.0.0.0", port=port, debug=False)
 
 
-def run_experiment(endpoint="updates", iterations=100000, port=5000):
+def run_experiment(endpoint="updates", iterations=100000, port=5000, function_stats=None):
     url = f"http://localhost:{port}/{endpoint}"
 
     params = {}
-    if endpoint == "updates":
+    if endpoint in ("updates", "updates-bulk"):
         params = {"queries": 10}
 
     # Start Flask app in a separate process
-    flask_process = multiprocessing.Process(target=run_flask_app, args=(profiling_data, port))
+    flask_process = multiprocessing.Process(target=run_flask_app, args=(profiling_data, port, function_stats))
     flask_process.start()
 
     # Wait a moment for the Flask app to start
@@ -46,25 +51,36 @@ def run_experiment(endpoint="updates", iterations=100000, port=5000):
 
 
 if __name__ == "__main__":
-    # Create a Manager for the shared list
-    manager = Manager()
-    profiling_data = manager.list()
-
     _endpoint = os.getenv("EXPERIMENT_ENDPOINT", "db")
     _iterations = int(os.getenv("EXPERIMENT_ITERATIONS", 1))
+
+    # One slot per request in shared memory, which the Flask process writes without a round trip to this one
+    profiling_data = ResultBuffer(_iterations)
+    # Calls and inclusive time per OpenTelemetry function, only recorded by the monitoring profiler
+    function_stats = Manager().list() if PROFILER_MODE == "monitoring" else None
     _port = int(os.getenv("EXPERIMENT_PORT", 5001))
     print("Running experiment {} with {} iterations".format(_endpoint, _iterations))
 
-    # Run the experiment and collect profiling data
-    run_experiment(endpoint=_endpoint, iterations=_iterations, port=_port)
+    if OTLP_SINK_URL:
+        export_totals = read_export_totals(SERVICE_NAME)
 
-    # Convert the manager's list to a regular list for processing
-    profiling_data_list = list(profiling_data)
+    # Run the experiment and collect profiling data
+    run_experiment(endpoint=_endpoint, iterations=_iterations, port=_port, function_stats=function_stats)
 
     # Save each run's results to a CSV file
-    save_each_run_results(times_dict_list=profiling_data_list,
+    save_each_run_results(times_dict_list=profiling_data,
                           filename=f"output/{_endpoint}_{_iterations}_each_run_results.csv")
 
     # Save aggregated statistics to a CSV file
-    save_aggregated_statistics(times_dict_list=profiling_data_list,
-                               filename=f"output/{_endpoint}_{_iterations}_aggregated_statistics.csv")
\ No newline at end of file
+    save_aggregated_statistics(times_dict_list=profiling_data,
+                               filename=f"output/{_endpoint}_{_iterations}_aggregated_statistics.csv")
+
+    if function_stats is not None:
+        save_function_statistics(list(function_stats),
+                                 filename=f"output/{_endpoint}_{_iterations}_function_statistics.csv")
+
+    if OTLP_SINK_URL:
+        save_export_statistics(export_totals, read_export_totals(SERVICE_NAME), _iterations,
+                               filename=f"output/{_endpoint}_{_iterations}_export_statistics.csv")
+
+    profiling_data.release()
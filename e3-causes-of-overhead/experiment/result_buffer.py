@@ -0,0 +1,72 @@
+import itertools
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# The times of every run in shared memory, one row (slot) per run with a fixed column per category, instead of
+# a Manager list where every append is a round trip to the manager process. A run writes its own slot, so
+# writers need no lock; slots that were never written (e.g. of a crashed run) stay NaN and are skipped.
+
+FIELDS = ["configuration", "task", "export", "instrumentation", "total"]
+
+
+class ResultBuffer:
+
+    def __init__(self, capacity, name=None):
+        # Creates the shared memory, or attaches to the buffer of another process by name
+        self.capacity = capacity
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=max(1, capacity) * len(FIELDS) * 8)
+            self.owner = True
+            self._array()[:] = np.nan
+        else:
+            # The runners' child processes share the resource tracker of the creator, so attaching here does
+            # not remove the memory when a child exits
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.first_slot = 0
+        self._slots = itertools.count()
+
+    def __getstate__(self):
+        # Spawned processes attach by name and write from the first slot of the writer on
+        return {"capacity": self.capacity, "name": self.shm.name, "first_slot": self.first_slot}
+
+    def __setstate__(self, state):
+        self.__init__(state["capacity"], state["name"])
+        self.first_slot = state["first_slot"]
+        self._slots = itertools.count(self.first_slot)
+
+    def _array(self):
+        # A view for the duration of one read or write, a view kept alive prevents closing the memory
+        return np.ndarray((self.capacity, len(FIELDS)), dtype=np.float64, buffer=self.shm.buf)
+
+    def at_slot(self, slot):
+        # A writer for the same memory that fills the slots from `slot` on, e.g. the slot of one run
+        writer = ResultBuffer.__new__(ResultBuffer)
+        writer.__dict__.update(self.__dict__)
+        writer.owner = False
+        writer.first_slot = slot
+        writer._slots = itertools.count(slot)
+        return writer
+
+    def append(self, times_dict):
+        # Same interface as the list the profilers append to; next() on a counter is atomic, so threads that
+        # handle requests concurrently get different slots
+        slot = next(self._slots)
+        if slot >= self.capacity:
+            print(f"Result buffer full, dropping the result of run {slot + 1}")
+            return
+        self._array()[slot] = [times_dict[field] for field in FIELDS]
+
+    def rows(self):
+        # A copy of the written slots in run order, one column per field
+        array = self._array()
+        return array[~np.isnan(array).any(axis=1)].copy()
+
+    def __len__(self):
+        return int((~np.isnan(self._array()).any(axis=1)).sum())
+
+    def release(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
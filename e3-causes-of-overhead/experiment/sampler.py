@@ -0,0 +1,60 @@
+import signal
+import sys
+import threading
+import time
+
+# Statistical profiler: an interval timer interrupts the process at a fixed frequency and the signal handler
+# records the stack of every thread that is being profiled. There is no hook on function calls like in
+# cProfile, so the profiled code runs at (almost) its normal speed.
+# Python runs signal handlers in the main thread between bytecodes. A handler delayed by a long call in C
+# catches up with one sample weighted by the time since the previous one, so the weights add up to wall time.
+
+DEFAULT_FREQUENCY = 1000  # Samples per second
+# "real" samples wall-clock time like cProfile measures it, "cpu" only the time the process is on the CPU
+TIMERS = {
+    "real": (signal.ITIMER_REAL, signal.SIGALRM),
+    "cpu": (signal.ITIMER_PROF, signal.SIGPROF),
+}
+
+
+class Sampler:
+
+    def __init__(self, frequency=DEFAULT_FREQUENCY, timer="real"):
+        if timer not in TIMERS:
+            raise ValueError(f"Unknown sampling timer: {timer}")
+        self.interval = 1 / frequency
+        self.timer, self.signum = TIMERS[timer]
+        # Thread id -> (time of the previous sample, [(weight in seconds, stack of code objects, innermost first)])
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.main_thread = threading.main_thread().ident
+        # Raises ValueError outside of the main thread
+        signal.signal(self.signum, self._sample)
+
+    def _sample(self, signum, frame):
+        now = time.perf_counter()
+        current_frames = sys._current_frames()
+        for thread_id, session in list(self.sessions.items()):
+            # In the main thread the handler itself is on top of the stack, the interrupted frame is passed in
+            thread_frame = frame if thread_id == self.main_thread else current_frames.get(thread_id)
+            stack = []
+            while thread_frame is not None:
+                stack.append(thread_frame.f_code)
+                thread_frame = thread_frame.f_back
+            session[1].append((now - session[0], stack))
+            session[0] = now
+
+    def start(self):
+        # Profile the calling thread until it calls stop
+        with self.lock:
+            self.sessions[threading.get_ident()] = [time.perf_counter(), []]
+            if len(self.sessions) == 1:
+                signal.setitimer(self.timer, self.interval, self.interval)
+
+    def stop(self):
+        # The samples of the calling thread since it called start
+        with self.lock:
+            _, samples = self.sessions.pop(threading.get_ident())
+            if not self.sessions:
+                signal.setitimer(self.timer, 0)
+        return samples
@@ -0,0 +1,15 @@
+import os
+
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor, BatchSpanProcessor
+
+# "simple" exports every span synchronously in span.end(), "batch" exports from a background thread.
+# The batch processor reads its queue size, batch size and schedule delay from the OTEL_BSP_* variables.
+SPAN_PROCESSOR = os.getenv("OTEL_SPAN_PROCESSOR", "simple")
+
+
+def create_span_processor(exporter):
+    if SPAN_PROCESSOR == "batch":
+        return BatchSpanProcessor(exporter)
+    if SPAN_PROCESSOR == "simple":
+        return SimpleSpanProcessor(exporter)
+    raise ValueError(f"Unknown span processor: {SPAN_PROCESSOR}")
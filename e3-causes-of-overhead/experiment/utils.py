@@ -1,6 +1,13 @@
 import numpy as np
 import csv
+import json
 import os.path
+import urllib.request
+
+from result_buffer import ResultBuffer, FIELDS as RESULT_FIELDS
+
+# Stats endpoint of the OTLP sink (e.g. http://otlp-sink:4319), exports are only recorded when it is set
+OTLP_SINK_URL = os.getenv("OTLP_SINK_URL", "")
 
 
 dynamic_html_size_generators = {
@@ -23,41 +30,49 @@ graph_pagerank_event = {
     'size': graph_pagerank_size_generators['large']
 }
 
+def run_times(times_dict_list):
+    # The names and a (runs x names) array of the times, from a ResultBuffer or a list of dicts with the same keys
+    if isinstance(times_dict_list, ResultBuffer):
+        return list(RESULT_FIELDS), times_dict_list.rows()
+    names = list(times_dict_list[0].keys())
+    return names, np.array([[times_dict[name] for name in names] for times_dict in times_dict_list], dtype=float)
+
+
 def save_each_run_results(times_dict_list, filename="each_run_results.csv"):
     if not os.path.exists(filename):
         os.makedirs(os.path.dirname(filename), exist_ok=True)
 
+    names, times = run_times(times_dict_list)
+    percentages = times / times[:, [names.index("total")]] * 100
+
     with open(filename, mode='w', newline='') as file:
         writer = csv.writer(file)
 
         # Write the header row
-        header = ["Run"] + [f"{key} Time (ms)" for key in times_dict_list[0].keys()] + [f"{key} % of Total" for key in
-                                                                                        times_dict_list[0].keys()]
+        header = ["Run"] + [f"{key} Time (ms)" for key in names] + [f"{key} % of Total" for key in names]
         writer.writerow(header)
 
         # Write each run's results
-        for i, times_dict in enumerate(times_dict_list):
-            total_time = times_dict["total"]
-            row = [i + 1] + [f"{time:.6f}" for time in times_dict.values()] + [f"{(time / total_time) * 100:.2f}" for
-                                                                               time in times_dict.values()]
+        for i, (run, run_percentages) in enumerate(zip(times, percentages)):
+            row = [i + 1] + [f"{time:.6f}" for time in run] + [f"{percentage:.2f}" for percentage in run_percentages]
             writer.writerow(row)
 
     print(f"Results of each run saved to {filename}")
 
 
 def save_aggregated_statistics(times_dict_list, filename="aggregated_statistics.csv"):
-    aggregated_times = {key: [] for key in times_dict_list[0]}
-    percentage_of_total = {key: [] for key in times_dict_list[0]}
-
-    for times_dict in times_dict_list:
-        total_time = times_dict["total"]
-        for key, value in times_dict.items():
-            aggregated_times[key].append(value)
-            percentage_of_total[key].append((value / total_time) * 100)
+    names, times = run_times(times_dict_list)
+    percentage_of_total = times / times[:, [names.index("total")]] * 100
 
     if not os.path.exists(filename):
         os.makedirs(os.path.dirname(filename), exist_ok=True)
 
+    avg_times = np.mean(times, axis=0)
+    med_times = np.median(times, axis=0)
+    percentiles_95 = np.percentile(times, 95, axis=0)
+    percentiles_99 = np.percentile(times, 99, axis=0)
+    avg_percentages = np.mean(percentage_of_total, axis=0)
+
     with open(filename, mode='w', newline='') as file:
         writer = csv.writer(file)
 
@@ -67,21 +82,85 @@ def save_aggregated_statistics(times_dict_list, filename="aggregated_statistics.
              "Average % of Total Time"])
 
         # Write the aggregated statistics for each function
-        for func_name, times in aggregated_times.items():
-            times_array = np.array(times)
-            avg_time = np.mean(times_array)
-            med_time = np.median(times_array)
-            percentile_95 = np.percentile(times_array, 95)
-            percentile_99 = np.percentile(times_array, 99)
-            avg_percentage = np.mean(percentage_of_total[func_name])
-
+        for i, func_name in enumerate(names):
             writer.writerow([
                 func_name,
-                f"{avg_time:.6f}",
-                f"{med_time:.6f}",
-                f"{percentile_95:.6f}",
-                f"{percentile_99:.6f}",
-                f"{avg_percentage:.2f}"
+                f"{avg_times[i]:.6f}",
+                f"{med_times[i]:.6f}",
+                f"{percentiles_95[i]:.6f}",
+                f"{percentiles_99[i]:.6f}",
+                f"{avg_percentages[i]:.2f}"
             ])
 
     print(f"Aggregated statistics saved to {filename}")
+
+
+def save_function_statistics(function_stats_list, filename="function_statistics.csv"):
+    # Calls and inclusive time of the monitored OpenTelemetry functions (PROFILER_MODE=monitoring), per run
+    # over all runs, including the runs that did not call a function
+    runs = len(function_stats_list)
+    totals = {}
+    for function_stats in function_stats_list:
+        for name, (calls, inclusive_time) in function_stats.items():
+            total = totals.setdefault(name, [0, 0, 0.0])
+            total[0] += 1
+            total[1] += calls
+            total[2] += inclusive_time
+
+    if not os.path.exists(filename):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    with open(filename, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(["Function", "Runs", "Calls", "Calls per Run", "Inclusive Time per Run (ms)",
+                         "Inclusive Time per Call (us)"])
+        for name, (called_runs, calls, inclusive_time) in sorted(totals.items(), key=lambda item: -item[1][2]):
+            writer.writerow([
+                name,
+                called_runs,
+                calls,
+                f"{calls / runs:.2f}",
+                f"{inclusive_time / runs:.6f}",
+                f"{inclusive_time / calls * 1_000 if calls else 0:.3f}"
+            ])
+
+    print(f"Function statistics saved to {filename}")
+
+
+def read_export_totals(service):
+    # Spans and bytes the OTLP sink received from `service` since it started, and those it acknowledged
+    totals = {"exports": 0, "spans": 0, "bytes": 0, "acked_spans": 0, "acked_bytes": 0, "decode_ns": 0, "rejected": 0}
+    with urllib.request.urlopen(f"{OTLP_SINK_URL}/stats", timeout=5) as response:
+        totals.update(json.load(response).get(service, {}))
+    return totals
+
+
+def save_export_statistics(before, after, invocations, filename="export_statistics.csv"):
+    if not os.path.exists(filename):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    exports = after["exports"] - before["exports"]
+    # Rejected exports are retried, so only the acknowledged ones count as exported, like in E1
+    spans = after["acked_spans"] - before["acked_spans"]
+    payload_bytes = after["acked_bytes"] - before["acked_bytes"]
+    received_spans = after["spans"] - before["spans"]
+    received_bytes = after["bytes"] - before["bytes"]
+    decode_ns = after["decode_ns"] - before["decode_ns"]
+
+    with open(filename, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(["Invocations", "Exports", "Spans", "Bytes", "Spans per Invocation", "Bytes per Invocation",
+                         "Received Spans", "Received Bytes", "Decode Time per Export (us)"])
+        writer.writerow([
+            invocations,
+            exports,
+            spans,
+            payload_bytes,
+            f"{spans / invocations:.2f}",
+            f"{payload_bytes / invocations:.2f}",
+            received_spans,
+            received_bytes,
+            f"{decode_ns / exports / 1000 if exports else 0:.2f}"
+        ])
+
+    print(f"Export statistics saved to {filename}")